@@ -4,9 +4,22 @@
 """
   
 import os
-from flask_admin import Admin
+from flask import request
+from flask_admin import Admin, BaseView, expose
 from .models import db, User
 from flask_admin.contrib.sqla import ModelView
+from .utils.slow_query import SLOW_QUERY_THRESHOLD_MS, recent_slow_queries, slow_query_report
+
+class SlowQueryView(BaseView):
+    """慢查询日志：最近的记录和按语句形状汇总的Top N"""
+
+    @expose('/')
+    def index(self):
+        mode = request.args.get('mode', 'recent')
+        items = slow_query_report(top=50) if mode == 'top' else recent_slow_queries(limit=200)
+        return self.render(
+            'admin/slow_queries.html', mode=mode, items=items, threshold=f'{SLOW_QUERY_THRESHOLD_MS:g}'
+        )
 
 def setup_admin(app):
     """
@@ -23,6 +36,7 @@ def setup_admin(app):
     # 添加模型视图
     # 这里展示了如何添加User模型到管理界面
     admin.add_view(ModelView(User, db.session))
+    admin.add_view(SlowQueryView(name='慢查询', endpoint='slow_queries'))
 
     # 您可以通过复制上面的代码行来添加新的模型
     # 例如: admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
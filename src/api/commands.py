@@ -7,8 +7,20 @@
 这些命令可用于执行定时任务或在API之外但仍需要与数据库集成的任务
 """
 
+import json
 import click
-from api.models import db, User
+from api.models import db, User, Order, OrderSeqCounter, ProjectPriceConfig, ProjectProfitDaily
+from api.utils import build_upsert
+from api.utils.partition import (
+    GRANULARITY_MONTH, GRANULARITY_YEAR, partition_order_table, add_future_partitions, list_partitions
+)
+from api.utils.archive import ARCHIVE_RULES, archive_table, restore_rows, table_sizes, optimize_tables
+from api.utils.profit_summary import order_days, refresh_profit_days
+from api.utils.region import load_regions, backfill_region_ids
+from api.utils.carrier import backfill_carrier_ids
+from api.utils.import_ledger import purge_import_ledger
+from api.utils.slow_query import slow_query_report
+from api.utils.schema_upgrade import PRICE_CONFIG_KEY_COLUMNS, upgrade_price_config_key
 
 def setup_commands(app):
     """
@@ -42,4 +54,237 @@ def setup_commands(app):
         插入测试数据
         此函数预留用于插入其他类型的测试数据
         """
-        pass
\ No newline at end of file
+        pass
+
+    @app.cli.command("backfill-order-seq")
+    @click.option("--batch-size", default=1000, help="每批写入的订单号数量")
+    def backfill_order_seq(batch_size):
+        """
+        回填子订单序号计数表
+        使用方法: $ flask backfill-order-seq
+        按订单号统计订单表中已使用的最大子订单序号（包含已删除的订单，避免子订单号重复），
+        写入 order_seq_counter；计数表中已有更大的值时保持不变，可重复执行。
+        导入时缺少的计数行会自动按订单表创建，此命令用于上线时一次性预建计数行
+        """
+        table = OrderSeqCounter.__table__
+        rows = db.session.query(
+            Order.order_number,
+            db.func.max(Order.seq).label('max_seq')
+        ).group_by(Order.order_number).all()
+        print(f"共找到{len(rows)}个订单号")
+
+        for start in range(0, len(rows), batch_size):
+            batch = [
+                {'order_number': order_number, 'last_seq': max_seq or 0}
+                for order_number, max_seq in rows[start:start + batch_size]
+            ]
+            db.session.execute(build_upsert(
+                table, batch, ['order_number'],
+                lambda new: {'last_seq': db.case(
+                    (new.last_seq > table.c.last_seq, new.last_seq),
+                    else_=table.c.last_seq
+                )}
+            ))
+            db.session.commit()
+            print(f"已回填{min(start + batch_size, len(rows))}/{len(rows)}")
+
+        print("子订单序号计数表回填完成")
+
+    @app.cli.command("archive-deleted")
+    @click.option("--table", "tables", multiple=True, type=click.Choice(list(ARCHIVE_RULES)), help="只归档指定的表，可重复指定")
+    @click.option("--batch-size", default=1000, help="每批移动的行数")
+    @click.option("--max-batches", default=None, type=int, help="每张表最多执行的批数，用于限制单次运行时长")
+    @click.option("--optimize", is_flag=True, help="归档后执行OPTIMIZE TABLE回收空间（MySQL，会重建表）")
+    def archive_deleted(tables, batch_size, max_batches, optimize):
+        """
+        归档已删除数据
+        使用方法: $ flask archive-deleted --batch-size 1000 --optimize
+        把 is_deleted > 0 的订单、价格配置、项目、用户以及 status > 0 的送货记录
+        分批移动到对应的 *_archive 表，可通过定时任务（如crontab）定期执行
+        """
+        table_names = list(tables) or list(ARCHIVE_RULES)
+        sizes_before = table_sizes(table_names)
+
+        moved = {}
+        for name in table_names:
+            moved[name] = archive_table(name, batch_size, max_batches)
+            print(f"{name}: 归档{moved[name]}行")
+
+        if optimize:
+            optimize_tables(table_names)
+        sizes_after = table_sizes(table_names)
+
+        print("归档报告")
+        for name in table_names:
+            line = f"  {name}: 移动{moved[name]}行"
+            if sizes_before is not None and name in sizes_before and name in sizes_after:
+                data_before, index_before = sizes_before[name]
+                data_after, index_after = sizes_after[name]
+                line += (f"，数据空间回收{(data_before - data_after) / 1024 / 1024:.2f}MB"
+                         f"，索引空间回收{(index_before - index_after) / 1024 / 1024:.2f}MB")
+            print(line)
+        if sizes_before is None:
+            print("  当前数据库不支持统计表空间")
+        elif not optimize:
+            print("  提示：InnoDB需执行 --optimize 后才会释放表空间")
+
+    @app.cli.command("restore-archived")
+    @click.argument("table", type=click.Choice(list(ARCHIVE_RULES)))
+    @click.argument("ids")
+    def restore_archived(table, ids):
+        """
+        从归档表恢复数据
+        使用方法: $ flask restore-archived order 101,102,103
+        恢复后的数据保持原删除标记/状态，需要时再在业务中取消删除
+        """
+        id_list = [int(item) for item in ids.split(',') if item.strip()]
+        restored = restore_rows(table, id_list)
+        print(f"{table}: 恢复{restored}行")
+
+    @app.cli.command("partition-order-table")
+    @click.option("--granularity", default=GRANULARITY_MONTH, type=click.Choice([GRANULARITY_MONTH, GRANULARITY_YEAR]), help="按月或按年分区")
+    @click.option("--ahead", default=3, help="预建的未来分区数量")
+    def partition_order_table_command(granularity, ahead):
+        """
+        对订单表按下单日期做范围分区（仅MySQL）
+        使用方法: $ flask partition-order-table --granularity month --ahead 3
+        会重建 order 表，数据量大时请在维护窗口执行。
+        分区后主键为 (id, order_date)，订单号/子订单号的唯一索引包含 order_date，
+        与模型中的单列唯一声明不同；子订单号的全局唯一只由序号分配保证
+        """
+        ranges = partition_order_table(granularity, ahead)
+        print(f"order 表已分区，共创建{len(ranges)}个分区：{ranges[0][0]} ~ {ranges[-1][0]}")
+
+    @app.cli.command("add-order-partitions")
+    @click.option("--granularity", default=GRANULARITY_MONTH, type=click.Choice([GRANULARITY_MONTH, GRANULARITY_YEAR]), help="与分区时一致")
+    @click.option("--ahead", default=3, help="保证当前日期之后至少有多少个未来分区")
+    def add_order_partitions(granularity, ahead):
+        """
+        追加订单表的未来分区（仅MySQL）
+        使用方法: $ flask add-order-partitions --ahead 3
+        建议通过定时任务每月执行一次
+        """
+        ranges = add_future_partitions(granularity, ahead)
+        if ranges:
+            print(f"新增{len(ranges)}个分区：{', '.join(name for name, _ in ranges)}")
+        else:
+            print("未来分区已足够，无需新增")
+
+    @app.cli.command("list-order-partitions")
+    def list_order_partitions():
+        """
+        查看订单表分区（仅MySQL）
+        使用方法: $ flask list-order-partitions
+        """
+        partitions = list_partitions()
+        if not partitions:
+            print("order 表未分区")
+        for name, description, rows in partitions:
+            print(f"{name:<10} < {description:<14} 约{rows}行")
+
+    @app.cli.command("rebuild-profit-daily")
+    @click.option("--project-id", type=int, default=None, help="只重建指定项目，默认全部项目")
+    def rebuild_profit_daily(project_id):
+        """
+        重建项目利润日汇总表
+        使用方法: $ flask rebuild-profit-daily [--project-id 1]
+        首次上线或汇总数据异常时，从订单表重新聚合；按项目分别提交，可重复执行
+        """
+        criteria = [Order.project_id == project_id] if project_id else []
+        days = order_days(*criteria)
+        project_ids = sorted({pid for pid, _ in days})
+        print(f"共{len(project_ids)}个项目、{len(days)}个项目日期需要重建")
+
+        for pid in project_ids:
+            # 同时清理该项目已无订单的日期
+            ProjectProfitDaily.query.filter_by(project_id=pid).delete(synchronize_session=False)
+            refresh_profit_days((key for key in days if key[0] == pid))
+            db.session.commit()
+            print(f"项目{pid}利润日汇总重建完成")
+
+        print("利润日汇总重建完成")
+
+    @app.cli.command("load-regions")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    def load_regions_command(path):
+        """
+        导入省市行政区划字典
+        使用方法: $ flask load-regions pc-code.json
+        文件格式为省市两级嵌套的JSON：[{"code": "32", "name": "江苏省", "children": [{"code": "3201", "name": "南京市"}]}]，
+        可重复执行，已存在的省市只补充行政区划代码
+        """
+        with open(path, encoding='utf-8') as f:
+            divisions = json.load(f)
+        province_count, city_count = load_regions(divisions)
+        db.session.commit()
+        print(f"地区字典导入完成：新增{province_count}个省、{city_count}个市")
+
+    @app.cli.command("backfill-region-ids")
+    @click.option("--batch-size", default=5000, help="每批回填的行数")
+    def backfill_region_ids_command(batch_size):
+        """
+        为历史订单和价格配置回填地区ID
+        使用方法: $ flask backfill-region-ids
+        建议先执行 load-regions 导入行政区划，字典中找不到的省市会按原名称新增
+        """
+        for model in (ProjectPriceConfig, Order):
+            filled = backfill_region_ids(model, batch_size)
+            print(f"{model.__tablename__}: 回填{filled}行")
+
+    @app.cli.command("upgrade-price-config-key")
+    def upgrade_price_config_key_command():
+        """
+        升级价格配置表的唯一键
+        使用方法: $ flask upgrade-price-config-key
+        idx_unique 增加 tonnage_lower_limit 后，已有数据库需执行一次，否则同一线路上传多个吨位档位时
+        MySQL 会按旧唯一键覆盖已有档位，SQLite / PostgreSQL 的UPSERT找不到匹配的唯一约束而报错。
+        SQLite 通过重建表完成，可重复执行
+        """
+        old_columns = upgrade_price_config_key()
+        if old_columns is None:
+            print("idx_unique 已包含 tonnage_lower_limit 或价格配置表尚未创建，无需升级")
+        else:
+            print(f"idx_unique 已由 ({', '.join(old_columns)}) 改为 ({', '.join(PRICE_CONFIG_KEY_COLUMNS)})")
+
+    @app.cli.command("backfill-carrier-ids")
+    @click.option("--batch-size", default=5000, help="每批回填的行数")
+    def backfill_carrier_ids_command(batch_size):
+        """
+        建立承运人维度并为历史订单和送货记录回填承运人ID
+        使用方法: $ flask backfill-carrier-ids
+        可重复执行，只处理尚未关联承运人的行
+        """
+        for table_name, filled in backfill_carrier_ids(batch_size).items():
+            print(f"{table_name}: 回填{filled}行")
+
+    @app.cli.command("purge-import-ledger")
+    @click.option("--days", default=7, help="保留最近几天的台账记录")
+    def purge_import_ledger_command(days):
+        """
+        清理导入台账
+        使用方法: $ flask purge-import-ledger --days 7
+        台账只在幂等窗口期内用于识别重复提交，可通过定时任务定期清理
+        """
+        print(f"删除台账记录{purge_import_ledger(days)}条")
+
+    @app.cli.command("slow-query-report")
+    @click.option("--top", default=20, help="输出总耗时最高的前N个语句形状")
+    @click.option("--since-hours", default=None, type=float, help="只统计最近若干小时的慢查询")
+    @click.option("--explain", is_flag=True, help="同时输出最慢一次的EXPLAIN结果")
+    def slow_query_report_command(top, since_hours, explain):
+        """
+        慢查询汇总报告
+        使用方法: $ flask slow-query-report --top 20 --since-hours 24
+        按语句形状（字面量和参数替换为 ?）聚合慢查询日志，按总耗时排序
+        """
+        report = slow_query_report(top, since_hours)
+        if not report:
+            print("没有慢查询记录")
+            return
+        for rank, item in enumerate(report, 1):
+            print(f"#{rank} 次数{item['count']}  总耗时{item['total_ms']}ms  平均{item['avg_ms']}ms  "
+                  f"最长{item['max_ms']}ms  指纹{item['fingerprint']}")
+            print(f"    端点: {', '.join(item['endpoints'])}")
+            print(f"    {item['statement']}")
+            if explain and item['explain']:
+                print(f"    EXPLAIN: {json.dumps(item['explain'], ensure_ascii=False, default=str)}")
@@ -7,7 +7,13 @@ class ErrorCode:
     UNAUTHORIZED = {'code': 401, 'message': '未授权'}
     FORBIDDEN = {'code': 403, 'message': '禁止访问'}
     NOT_FOUND = {'code': 404, 'message': '资源未找到'}
+    VERSION_CONFLICT = {'code': 409, 'message': '数据已被其他用户修改，请刷新后重试'}
+    PAYLOAD_TOO_LARGE = {'code': 413, 'message': '请求体过大'}
+    UNSUPPORTED_MEDIA_TYPE = {'code': 415, 'message': '不支持的请求体编码'}
+    TOO_MANY_REQUESTS = {'code': 429, 'message': '服务繁忙，请稍后重试'}
+    CLIENT_CLOSED_REQUEST = {'code': 499, 'message': '客户端已断开，查询已取消'}
     INTERNAL_SERVER_ERROR = {'code': 500, 'message': '服务器内部错误'}
+    QUERY_TIMEOUT = {'code': 504, 'message': '查询超时，请缩小查询范围后重试'}
     
     # 用户相关错误码 (2001-2999)
     USER_NOT_FOUND = {'code': 2001, 'message': '用户不存在'}
@@ -26,5 +32,9 @@ class ErrorCode:
     ORDER_NOT_FOUND = {'code': 5001, 'message': '订单不存在'}
     ORDER_NUMBER_DUPLICATE = {'code': 5002, 'message': '订单号重复'}
 
+    # 导入相关错误码 (6001-6999)
+    IMPORT_IN_PROGRESS = {'code': 6001, 'message': '相同的导入请求正在处理中，请稍后刷新查看结果'}
+    IDEMPOTENCY_KEY_REUSED = {'code': 6002, 'message': 'Idempotency-Key 已用于内容不同的导入请求'}
+
 
     # 可以继续添加其他错误码和描述
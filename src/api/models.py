@@ -2,7 +2,9 @@
 数据库模型定义模块
 包含所有数据库表的模型类定义
 """
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import mysql
 
 # 创建数据库实例
 db = SQLAlchemy()
@@ -43,11 +45,23 @@ class ProjectInfo(db.Model):
     start_date = db.Column(db.Date, nullable=False, comment='合作起始日期')
     end_date = db.Column(db.Date, nullable=False, comment='合作结束日期')
     project_description = db.Column(db.String(1000), nullable=True, default=None, comment='项目介绍')
+    order_column_mapping = db.Column(db.Text, nullable=True, default=None, comment='订单文件导入列映射(JSON)，{表头: 字段}')
     is_deleted = db.Column(db.BigInteger, nullable=False, default=0, comment='删除标记，0-未删除，>0-已删除(记录ID)')
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', comment='版本号，用于乐观锁')
+
+    # 乐观锁：更新时校验并自增版本号
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         """返回项目信息的字符串表示"""
         return f'<ProjectInfo {self.project_name}>'
+
+    def get_order_column_mapping(self):
+        """
+        获取订单文件导入列映射
+        :return: {表头: 字段}，未配置时返回None
+        """
+        return json.loads(self.order_column_mapping) if self.order_column_mapping else None
     
     def to_dict(self):
         """
@@ -60,7 +74,9 @@ class ProjectInfo(db.Model):
             'customer_name': self.customer_name,
             'start_date': self.start_date,
             'end_date': self.end_date,
-            'project_description': self.project_description
+            'project_description': self.project_description,
+            'order_column_mapping': self.get_order_column_mapping(),
+            'version': self.version
         }
     
 class ProjectPriceConfig(db.Model):
@@ -75,17 +91,24 @@ class ProjectPriceConfig(db.Model):
     departure_city = db.Column(db.String(20), nullable=False, comment='出发市')
     destination_province = db.Column(db.String(20), nullable=False, comment='到达省')
     destination_city = db.Column(db.String(20), nullable=False, comment='到达市')
-    tonnage_upper_limit = db.Column(db.Integer, nullable=False, comment='吨位上限')
-    tonnage_lower_limit = db.Column(db.Integer, nullable=False, comment='吨位下限')
+    departure_region_id = db.Column(db.Integer, nullable=True, comment='出发市地区ID，对应region表')
+    destination_region_id = db.Column(db.Integer, nullable=True, comment='到达市地区ID，对应region表')
+    tonnage_upper_limit = db.Column(db.Integer, nullable=False, comment='吨位上限（不含）')
+    tonnage_lower_limit = db.Column(db.Integer, nullable=False, comment='吨位下限（含）')
     unit_price = db.Column(db.Integer, nullable=False, comment='单价')
     project_id = db.Column(db.BigInteger, nullable=False, comment='项目ID')
     project_name = db.Column(db.String(255), nullable=False, comment='项目名称')
     is_deleted = db.Column(db.BigInteger, nullable=False, default=0, comment='删除标记，0-未删除，>0-已删除(记录ID)')
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', comment='版本号，用于乐观锁')
+
+    # 乐观锁：更新时校验并自增版本号
+    __mapper_args__ = {'version_id_col': version}
 
-    # 添加联合唯一约束
+    # 添加联合唯一约束，同一线路按吨位下限区分不同的价格档位
+    # 已有数据库的唯一键不含 tonnage_lower_limit，需执行 flask upgrade-price-config-key
     __table_args__ = (
         db.UniqueConstraint('project_id', 'departure_province', 'departure_city', 
-                          'destination_province', 'destination_city', 
+                          'destination_province', 'destination_city', 'tonnage_lower_limit',
                           name='idx_unique'),
     )
 
@@ -103,6 +126,10 @@ class Order(db.Model):
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, comment='自增ID')
     project_id = db.Column(db.BigInteger, nullable=False, comment='项目ID')
     project_name = db.Column(db.String(255), nullable=False, comment='项目名称')
+    # 未分区的表上订单号/子订单号为单列唯一索引；执行 flask partition-order-table 后主键变为 (id, order_date)，
+    # 两者改为包含 order_date 的联合唯一索引（uk_order_number / uk_sub_order_number），
+    # 数据库不再保证子订单号全局唯一，由 order_seq_counter 的序号分配保证，不能依赖唯一键冲突去重
+    # 这两个唯一键不参与迁移自动生成的比对（见 api.utils.partition.include_migration_object）
     order_number = db.Column(db.String(50), nullable=False, unique=True, comment='订单号')
     sub_order_number = db.Column(db.String(60), nullable=False, unique=True, comment='子订单号')
     seq = db.Column(db.Integer, nullable=False, default=0, comment='子订单序号')
@@ -115,6 +142,8 @@ class Order(db.Model):
     departure_city = db.Column(db.String(20), nullable=False, comment='出发市')
     destination_province = db.Column(db.String(20), nullable=False, comment='送达省')
     destination_city = db.Column(db.String(20), nullable=False, comment='送达市')
+    departure_region_id = db.Column(db.Integer, nullable=True, comment='出发市地区ID，对应region表')
+    destination_region_id = db.Column(db.Integer, nullable=True, index=True, comment='送达市地区ID，对应region表')
     destination_address = db.Column(db.String(500), nullable=True, comment='送达详细地址')
     remark = db.Column(db.String(500), nullable=True, comment='备注')
     amount = db.Column(db.Numeric(10, 2), nullable=False, comment='金额')
@@ -126,6 +155,15 @@ class Order(db.Model):
     carrier_plate = db.Column(db.String(20), nullable=True, comment='承运人车牌')
     carrier_phone = db.Column(db.String(20), nullable=True, comment='承运人联系方式')
     carrier_fee = db.Column(db.Numeric(10, 2), nullable=True, comment='运费')
+    carrier_id = db.Column(db.BigInteger, nullable=True, comment='承运人ID，对应carrier表')
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', comment='版本号，用于乐观锁')
+
+    # 乐观锁：更新时校验并自增版本号
+    __mapper_args__ = {'version_id_col': version}
+
+    __table_args__ = (
+        db.Index('idx_order_carrier', 'carrier_id', 'project_id'),
+    )
 
     def __repr__(self):
         return f'<Order {self.order_number}>'
@@ -154,9 +192,77 @@ class Order(db.Model):
             'carrier_name': self.carrier_name,
             'carrier_plate': self.carrier_plate,
             'carrier_phone': self.carrier_phone,
-            'carrier_fee': float(self.carrier_fee) if self.carrier_fee else 0
+            'carrier_fee': float(self.carrier_fee) if self.carrier_fee else 0,
+            'version': self.version
         }
     
+class Region(db.Model):
+    """
+    地区字典表
+    省、市两级行政区划，订单和价格配置通过整数ID引用市级地区
+    """
+    __tablename__ = 'region'
+
+    LEVEL_PROVINCE = 1
+    LEVEL_CITY = 2
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='自增主键')
+    parent_id = db.Column(db.Integer, nullable=False, default=0, comment='上级地区ID，省级为0')
+    level = db.Column(db.SmallInteger, nullable=False, comment='级别：1-省，2-市')
+    name = db.Column(db.String(20), nullable=False, comment='名称')
+    short_name = db.Column(db.String(20), nullable=False, comment='简称（去掉省、市、自治区等后缀）')
+    code = db.Column(db.String(12), nullable=True, comment='行政区划代码')
+
+    __table_args__ = (
+        db.UniqueConstraint('parent_id', 'name', name='idx_region_unique'),
+    )
+
+    def __repr__(self):
+        return f'<Region {self.name}>'
+
+class OrderSeqCounter(db.Model):
+    """
+    子订单序号计数表
+    按订单号记录已分配的最大子订单序号，导入订单时原子地分配序号区间
+    """
+    __tablename__ = 'order_seq_counter'
+
+    order_number = db.Column(db.String(50), primary_key=True, comment='订单号')
+    last_seq = db.Column(db.Integer, nullable=False, default=0, comment='已分配的最大子订单序号')
+
+    def __repr__(self):
+        return f'<OrderSeqCounter {self.order_number}:{self.last_seq}>'
+
+class Carrier(db.Model):
+    """
+    承运人维度表
+    按名称和联系方式唯一，由送货信息导入时写入；承运类型和车牌记录最近一次导入的值
+    """
+    __tablename__ = 'carrier'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, comment='自增主键')
+    carrier_type = db.Column(db.Integer, nullable=False, comment='承运类型：1-司机直送，2-承运商')
+    carrier_name = db.Column(db.String(50), nullable=False, comment='承运人名称')
+    carrier_phone = db.Column(db.String(20), nullable=False, comment='承运人联系方式')
+    carrier_plate = db.Column(db.String(20), nullable=True, comment='最近使用的车牌')
+
+    __table_args__ = (
+        db.UniqueConstraint('carrier_name', 'carrier_phone', name='idx_carrier_unique'),
+    )
+
+    def __repr__(self):
+        return f'<Carrier {self.carrier_name}>'
+
+class ProjectCarrier(db.Model):
+    """项目与承运人的关联，承运人列表按项目从这里查找"""
+    __tablename__ = 'project_carrier'
+
+    project_id = db.Column(db.BigInteger, primary_key=True, comment='项目ID')
+    carrier_id = db.Column(db.BigInteger, primary_key=True, comment='承运人ID')
+
+    def __repr__(self):
+        return f'<ProjectCarrier {self.project_id}-{self.carrier_id}>'
+
 class DeliveryImportRecord(db.Model):
     """送货导入记录表"""
     __tablename__ = 'delivery_import_record'
@@ -169,8 +275,100 @@ class DeliveryImportRecord(db.Model):
     carrier_phone = db.Column(db.String(20), nullable=False, comment='承运人联系方式')
     carrier_plate = db.Column(db.String(20), comment='承运人车牌')
     carrier_fee = db.Column(db.Numeric(10, 2), comment='运费')
+    carrier_id = db.Column(db.BigInteger, nullable=True, comment='承运人ID，对应carrier表')
     status = db.Column(db.Integer, nullable=False, default=0, comment='状态：0-最新，>0-历史记录(记录被更新时的ID)')
     create_time = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp(), comment='创建时间')
 
     def __repr__(self):
-        return f'<DeliveryImportRecord {self.batch_number}-{self.sub_order_number}>'
\ No newline at end of file
+        return f'<DeliveryImportRecord {self.batch_number}-{self.sub_order_number}>'
+
+class ImportLedger(db.Model):
+    """
+    导入台账表
+    记录导入请求的幂等键（Idempotency-Key 请求头或请求内容哈希）和处理结果，
+    窗口期内重复提交的导入直接返回原结果，不再校验和写入
+    """
+    __tablename__ = 'import_ledger'
+
+    STATUS_PROCESSING = 0
+    STATUS_DONE = 1
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, comment='自增主键')
+    import_type = db.Column(db.String(32), nullable=False, comment='导入类型')
+    request_key = db.Column(db.String(160), nullable=False, comment='幂等键：key:<Idempotency-Key> 或 hash:<内容哈希>')
+    payload_hash = db.Column(db.String(64), nullable=False, comment='请求内容SHA-256')
+    status = db.Column(db.SmallInteger, nullable=False, default=STATUS_PROCESSING, comment='状态：0-处理中，1-已完成')
+    response = db.Column(db.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True, comment='导入成功的响应内容(JSON)')
+    create_time = db.Column(db.DateTime, nullable=False, comment='开始处理时间')
+    finish_time = db.Column(db.DateTime, nullable=True, comment='处理完成时间')
+
+    __table_args__ = (
+        db.UniqueConstraint('import_type', 'request_key', name='idx_import_ledger_unique'),
+    )
+
+    def __repr__(self):
+        return f'<ImportLedger {self.import_type}:{self.request_key}>'
+
+class ProjectProfitDaily(db.Model):
+    """
+    项目利润日汇总表
+    按项目、下单日期、送达省市和承运人预聚合订单的重量、收入和支出，供利润时间序列查询使用
+    由订单导入、编辑、删除和送货信息导入在同一事务内按受影响的日期重新计算
+    """
+    __tablename__ = 'project_profit_daily'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True, comment='自增主键')
+    project_id = db.Column(db.BigInteger, nullable=False, comment='项目ID')
+    stat_date = db.Column(db.Date, nullable=False, comment='统计日期（下单日期）')
+    destination_province = db.Column(db.String(20), nullable=False, comment='送达省')
+    destination_city = db.Column(db.String(20), nullable=False, comment='送达市')
+    carrier_name = db.Column(db.String(50), nullable=False, default='', comment='承运人名称，空字符串表示未送货')
+    order_count = db.Column(db.Integer, nullable=False, default=0, comment='订单数')
+    weight = db.Column(db.DECIMAL(14, 3), nullable=False, default=0, comment='重量(吨)')
+    income = db.Column(db.Numeric(14, 2), nullable=False, default=0, comment='收入')
+    expense = db.Column(db.Numeric(14, 2), nullable=False, default=0, comment='支出')
+
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'stat_date', 'destination_province', 'destination_city',
+                            'carrier_name', name='idx_profit_daily_unique'),
+    )
+
+    def __repr__(self):
+        return f'<ProjectProfitDaily {self.project_id}-{self.stat_date}>'
+
+class TableChangeCounter(db.Model):
+    """
+    数据表变更计数表
+    每个提交了写操作的事务在提交前把涉及的表的计数加一，列表/报表接口据此生成ETag
+    """
+    __tablename__ = 'table_change_counter'
+
+    table_name = db.Column(db.String(64), primary_key=True, comment='表名')
+    version = db.Column(db.BigInteger, nullable=False, default=0, comment='变更计数')
+
+    def __repr__(self):
+        return f'<TableChangeCounter {self.table_name}:{self.version}>'
+
+
+def _archive_table(model):
+    """
+    根据业务表生成对应的归档表
+    复制全部列（不含唯一约束和自增），并增加归档时间列
+    :param model: 业务表模型
+    :return: 归档表对象，表名为"原表名_archive"
+    """
+    columns = [
+        db.Column(column.name, column.type.copy(), primary_key=column.primary_key,
+                  autoincrement=False, nullable=column.nullable, comment=column.comment)
+        for column in model.__table__.columns
+    ]
+    columns.append(db.Column('archived_at', db.DateTime, nullable=False,
+                             server_default=db.func.current_timestamp(), comment='归档时间'))
+    return db.Table(f'{model.__tablename__}_archive', *columns)
+
+# 归档表：存放从业务表移出的已删除数据和历史送货记录
+ARCHIVE_TABLES = {
+    model: _archive_table(model)
+    for model in (User, ProjectInfo, ProjectPriceConfig, Order, DeliveryImportRecord)
+}
+
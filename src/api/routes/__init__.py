@@ -11,6 +11,7 @@ api = Blueprint('api', __name__, url_prefix='/api')
 from .project import project
 from .order import order
 from .auth import auth
+from .system import system
 from . import base
 
 # 初始化所有路由的函数
@@ -19,9 +20,10 @@ def init_routes(app):
     app.register_blueprint(project, url_prefix='/api/project')
     app.register_blueprint(order, url_prefix='/api/order')
     app.register_blueprint(auth, url_prefix='/api/auth')
+    app.register_blueprint(system, url_prefix='/api/system')
 
 # 导出公共接口
-__all__ = ['api', 'init_routes', 'project', 'order', 'auth']
+__all__ = ['api', 'init_routes', 'project', 'order', 'auth', 'system']
 
 # 导出工具函数
 from api.utils import success_response, error_response, handle_exceptions
\ No newline at end of file
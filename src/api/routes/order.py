@@ -1,17 +1,48 @@
 from flask import request, jsonify, Blueprint
 from api.models import db, Order, ProjectInfo, ProjectPriceConfig, DeliveryImportRecord
 from api.enum.error_code import ErrorCode
-from api.utils import success_response, error_response, register_error_handlers
+from api.utils import (
+    success_response, error_response, register_error_handlers, allocate_sub_order_seqs,
+    mark_tables_changed, conditional_query
+)
+from api.utils.spreadsheet import (
+    DEFAULT_DELIVERY_COLUMNS, DEFAULT_ORDER_COLUMNS, SUPPORTED_EXTENSIONS, iter_chunks, iter_sheet_rows
+)
+from api.utils.xlsx_export import xlsx_response
+from api.utils.allocation import (
+    ALLOCATION_BASES, BASIS_WEIGHT, allocate_cents, allocation_bases, from_cents, to_cents
+)
+from api.utils.profit_summary import order_days, refresh_profit_days
+from api.utils.region import region_index, stored_region_id
+from api.utils.pricing import PriceTable
+from api.utils.order_validation import ORDER_FIELDS, validate_order_chunks, validate_orders
+from api.utils.import_ledger import idempotent_import
+from api.utils.admission import admission_controlled
+from api.utils.statement_timeout import check_query_scope, statement_timeout
+from api.utils.carrier import link_project_carriers, upsert_carriers
+from api.utils.dry_run import (
+    DRY_RUN_PREVIEW_LIMIT, READ_ONLY_ISOLATION_SQL, dry_run_response, dry_run_supported, is_dry_run,
+    validation_error_response
+)
 from datetime import datetime
+from collections import Counter
+from decimal import InvalidOperation
+import json
+import os
 from functools import wraps
-from sqlalchemy import text
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import bindparam, select, text
 
 def transactional(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
             # 设置事务隔离级别为REPEATABLE READ
-            db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+            if getattr(f, 'dry_run_supported', False) and is_dry_run():
+                # 预校验使用只读事务：一致性快照读，不加锁
+                db.session.execute(text(READ_ONLY_ISOLATION_SQL))
+            else:
+                db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
             
             # 执行函数
             result = f(*args, **kwargs)
@@ -19,6 +50,10 @@ def transactional(f):
             # 提交事务
             db.session.commit()
             return result
+        except StaleDataError:
+            # 乐观锁冲突：版本号已被其他事务修改
+            db.session.rollback()
+            return error_response(ErrorCode.VERSION_CONFLICT)
         except Exception as e:
             # 回滚事务
             db.session.rollback()
@@ -33,7 +68,28 @@ order = Blueprint('order', __name__)
 # 注册全局错误处理器
 register_error_handlers(order)
 
+# 文件导入时每次校验、写入的行数
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+
+def resolve_column_mapping(default_mapping):
+    """
+    解析文件导入的列映射：请求中的 column_mapping（JSON，{表头: 字段}）优先，否则使用默认映射
+    :param default_mapping: 默认列映射
+    :return: (列映射, 错误信息)
+    """
+    raw_mapping = request.form.get('column_mapping')
+    if not raw_mapping:
+        return default_mapping, None
+    try:
+        column_mapping = json.loads(raw_mapping)
+    except ValueError:
+        return None, '列映射必须是有效的JSON'
+    if not isinstance(column_mapping, dict):
+        return None, '列映射必须是"表头: 字段"形式的对象'
+    return column_mapping, None
+
 @order.route('/list', methods=['POST'])
+@conditional_query(Order)
 def get_orders():
     """获取订单列表，支持分页和搜索"""
     data = request.get_json()
@@ -89,7 +145,8 @@ def get_orders():
         'carrier_name': order.carrier_name,
         'carrier_phone': order.carrier_phone,
         'carrier_plate': order.carrier_plate,
-        'carrier_fee': float(order.carrier_fee) if order.carrier_fee else None
+        'carrier_fee': float(order.carrier_fee) if order.carrier_fee else None,
+        'version': order.version
     } for order in pagination.items]
     
     return success_response({
@@ -100,6 +157,8 @@ def get_orders():
     })
 
 @order.route('/export', methods=['POST'])
+@admission_controlled('export')
+@statement_timeout('export')
 def export_orders():
     """导出订单列表"""
     data = request.get_json()
@@ -128,6 +187,10 @@ def export_orders():
         query = query.filter(Order.destination_city.like(f"%{data['destination_city']}%"))
 
     query = query.order_by(Order.order_number.desc())
+
+    # 导出为Excel文件：服务端只写模式生成并流式返回
+    if data.get('format') == 'xlsx':
+        return export_orders_xlsx(query, data.get('with_summary', False))
     
     orders = query.all()
     
@@ -152,13 +215,174 @@ def export_orders():
         'items': orders_data
     })
 
+def load_price_table(project_id, regions):
+    """
+    一次性获取项目的所有价格配置并建立线路阶梯价格表
+    不新增地区：尚未回填地区ID的历史价格配置按名称在地区索引中查找，字典中没有的省市分配临时ID，
+    地区只在上传价格配置和 flask backfill-region-ids 时写入字典
+    :param project_id: 项目ID
+    :param regions: 地区索引副本（RegionIndex.preview_copy），临时ID加在副本中，不能传入缓存的索引
+    :return: PriceTable，线路为 (出发市地区ID, 到达市地区ID)
+    """
+    price_configs = ProjectPriceConfig.query.filter_by(project_id=project_id, is_deleted=0).all()
+
+    tiers = []
+    for config in price_configs:
+        departure_id = config.departure_region_id or (
+            regions.city_id(config.departure_province, config.departure_city) or
+            regions.add_placeholder(config.departure_province, config.departure_city))
+        destination_id = config.destination_region_id or (
+            regions.city_id(config.destination_province, config.destination_city) or
+            regions.add_placeholder(config.destination_province, config.destination_city))
+        tiers.append(((departure_id, destination_id), config.tonnage_lower_limit,
+                      config.tonnage_upper_limit, config.unit_price))
+    return PriceTable(tiers)
+
+def load_pricing(project_id):
+    """
+    加载项目的线路阶梯价格表和地区索引
+    订单的省市用同一个地区索引副本规范为地区ID，与历史价格配置的临时ID一致，预校验和正式导入结果相同
+    :return: (PriceTable, RegionIndex)
+    """
+    regions = region_index().preview_copy()
+    return load_price_table(project_id, regions), regions
+
+def build_orders(project, price_table, regions, indexed_rows, row_numbers=None):
+    """
+    校验订单数据并生成订单对象，子订单号由 assign_sub_order_numbers 统一分配
+    开启进程池且行数较多时分块并行校验，见 api.utils.order_validation
+    :param project: 项目对象
+    :param price_table: load_price_table 返回的线路阶梯价格表
+    :param regions: 地区索引，省市名称在这里规范为地区ID
+    :param indexed_rows: 可迭代的 (行号, 订单数据字典)
+    :param row_numbers: 可选的列表，按订单对象的顺序追加其所在行号
+    :return: (订单对象列表, 错误信息列表)
+    """
+    valid_rows, errors = validate_orders(project.id, project.project_name, price_table, regions, list(indexed_rows))
+    return orders_from_rows(valid_rows, row_numbers), errors
+
+def orders_from_rows(valid_rows, row_numbers=None):
+    """
+    由校验结果生成订单对象
+    :param valid_rows: 校验通过的 (行号, 按 ORDER_FIELDS 排列的字段值元组) 列表
+    :param row_numbers: 可选的列表，按订单对象的顺序追加其所在行号
+    :return: 订单对象列表
+    """
+    if row_numbers is not None:
+        row_numbers.extend(index for index, _ in valid_rows)
+    return [Order(**dict(zip(ORDER_FIELDS, values))) for _, values in valid_rows]
+
+def assign_sub_order_numbers(new_orders):
+    """
+    按订单号从计数表批量分配子订单序号区间，并生成子订单号
+    字典中没有的省市的临时地区ID不写入订单，留空由 flask backfill-region-ids 回填
+    :param new_orders: 订单对象列表
+    """
+    for new_order in new_orders:
+        new_order.departure_region_id = stored_region_id(new_order.departure_region_id)
+        new_order.destination_region_id = stored_region_id(new_order.destination_region_id)
+    seq_counts = Counter(new_order.order_number for new_order in new_orders)
+    next_seq_dict = allocate_sub_order_seqs(seq_counts)
+    for new_order in new_orders:
+        seq = next_seq_dict[new_order.order_number]
+        next_seq_dict[new_order.order_number] += 1
+        new_order.seq = seq
+        new_order.sub_order_number = f"{new_order.order_number}-{seq}"
+
+def order_preview(new_orders, row_numbers, price_table):
+    """
+    预校验的订单计算结果：每行命中的单价和金额
+    子订单号需要从计数表分配序号，预校验不分配
+    """
+    preview = []
+    for row_number, new_order in zip(row_numbers, new_orders):
+        weight = float(new_order.weight)
+        route = (new_order.departure_region_id, new_order.destination_region_id)
+        preview.append({
+            'row': row_number,
+            'order_number': new_order.order_number,
+            'route': f"{new_order.departure_province}{new_order.departure_city}-"
+                     f"{new_order.destination_province}{new_order.destination_city}",
+            'weight': weight,
+            'unit_price': float(price_table.unit_price(route, weight)),
+            'amount': round(float(new_order.amount), 2)
+        })
+    return preview
+
+# 订单导出Excel的列：(表头, 字段)，与JSON导出字段一致
+ORDER_EXPORT_COLUMNS = [
+    ('订单号', 'order_number'),
+    ('子订单号', 'sub_order_number'),
+    ('下单日期', 'order_date'),
+    ('送货日期', 'delivery_date'),
+    ('产品名称', 'product_name'),
+    ('数量', 'quantity'),
+    ('重量(吨)', 'weight'),
+    ('出发省', 'departure_province'),
+    ('出发市', 'departure_city'),
+    ('送达省', 'destination_province'),
+    ('送达市', 'destination_city'),
+    ('送达详细地址', 'destination_address'),
+    ('备注', 'remark'),
+    ('金额(元)', 'amount')
+]
+
+# 导出时每次从数据库游标读取的行数
+EXPORT_FETCH_SIZE = 1000
+
+def export_orders_xlsx(query, with_summary=False):
+    """
+    以只写模式生成订单Excel并流式返回，数据库结果按批读取
+    :param query: 已添加筛选和排序的订单查询
+    :param with_summary: 是否在末尾追加合计行（总重量、收入、支出、利润）
+    :return: Flask流式响应
+    """
+    columns = [getattr(Order, field) for _, field in ORDER_EXPORT_COLUMNS] + [Order.carrier_fee]
+    totals = {'weight': 0, 'income': 0, 'expense': 0}
+
+    def rows():
+        for item in query.with_entities(*columns).yield_per(EXPORT_FETCH_SIZE):
+            # 已缓冲的结果不再执行语句，逐行检查请求是否已取消或超时
+            check_query_scope()
+            row = dict(zip([field for _, field in ORDER_EXPORT_COLUMNS], item))
+            weight = float(row['weight']) if row['weight'] else 0
+            amount = float(row['amount']) if row['amount'] else 0
+            totals['weight'] += weight
+            totals['income'] += amount
+            totals['expense'] += float(item[-1]) if item[-1] else 0
+            row['weight'] = weight
+            row['amount'] = amount
+            row['order_date'] = row['order_date'].strftime('%Y-%m-%d')
+            row['delivery_date'] = row['delivery_date'].strftime('%Y-%m-%d')
+            yield [row[field] for _, field in ORDER_EXPORT_COLUMNS]
+
+    def summary():
+        return [
+            ['总重量(吨)', round(totals['weight'], 3)],
+            ['收入(元)', round(totals['income'], 2)],
+            ['支出(元)', round(totals['expense'], 2)],
+            ['利润(元)', round(totals['income'] - totals['expense'], 2)]
+        ]
+
+    return xlsx_response(
+        f"订单列表_{datetime.now().strftime('%Y-%m-%d')}.xlsx",
+        '订单列表',
+        [header for header, _ in ORDER_EXPORT_COLUMNS],
+        rows(),
+        summary if with_summary else None
+    )
+
 @order.route('/import', methods=['POST'])
+@idempotent_import('orders')
+@admission_controlled('import')
 @transactional
+@dry_run_supported
 def import_orders():
-    """导入订单"""
+    """导入订单，dry_run 为真时只校验并返回金额预览"""
     data = request.get_json()
     if not data or 'orders' not in data or 'project_id' not in data or 'project_name' not in data:
         return error_response(ErrorCode.BAD_REQUEST, '无效的请求数据')
+    dry_run = is_dry_run()
     
     try:
         print(f"[事务开始] 导入订单，数据量：{len(data['orders'])}")
@@ -171,106 +395,34 @@ def import_orders():
             return error_response(ErrorCode.BAD_REQUEST, '项目ID与项目名称不匹配')
 
         # 2. 一次性获取所有价格配置并建立索引
-        price_configs = ProjectPriceConfig.query.filter_by(project_id=project.id, is_deleted=0).all()
-        if not price_configs:
+        price_table, regions = load_pricing(project.id)
+        if not price_table:
             return error_response(ErrorCode.BAD_REQUEST, '项目未配置价格')
 
-        price_config_dict = {
-            f"{config.departure_province}-{config.departure_city}-{config.destination_province}-{config.destination_city}": config.unit_price
-            for config in price_configs
-        }
-
-        # 3. 一次性获取所有现有订单号的最大序号
-        order_numbers = {str(order_data['order_number']) for order_data in data['orders']}
-        
-        # 获取每个订单号的最大序号
-        existing_orders_query = db.session.query(
-            Order.order_number,
-            db.func.max(Order.seq).label('max_seq')
-        ).filter(
-            Order.order_number.in_(order_numbers),
-        ).group_by(
-            Order.order_number
-        ).with_for_update()
-
-        # 打印SQL语句用于调试
-        print(f"[DEBUG] SQL Query: {existing_orders_query}")
-
-        # 初始化最大序号字典
-        max_seq_dict = {
-            str(order_number): 0 for order_number in order_numbers
-        }
-        for order_number, max_seq in existing_orders_query.all():
-            max_seq_dict[order_number] = max_seq or 0
-
-        print(f"[DEBUG] 获取到的最大序号字典: {max_seq_dict}")  # 添加调试日志
-
-        # 4. 批量处理订单数据
-        new_orders = []
-        errors = []
-        
-        # 预处理：创建验证字段集合
-        required_fields = {'departure_province', 'departure_city', 'destination_province', 'destination_city'}
-        
-        for index, order_data in enumerate(data['orders'], 1):
-            # 快速验证必填字段
-            missing_fields = required_fields - set(filter(None, order_data.keys()))
-            if missing_fields:
-                errors.append(f"第{index}行：{', '.join(missing_fields)}不能为空")
-                continue
-
-            route_key = f"{order_data['departure_province']}-{order_data['departure_city']}-{order_data['destination_province']}-{order_data['destination_city']}"
-            
-            unit_price = price_config_dict.get(route_key)
-            if unit_price is None:
-                errors.append(f"第{index}行：出发地（{order_data['departure_province']}{order_data['departure_city']}）到达地（{order_data['destination_province']}{order_data['destination_city']}）的价格配置不存在")
-                continue
-
-            # 计算金额
-            try:
-                amount = float(order_data['weight']) * unit_price
-            except (ValueError, TypeError):
-                errors.append(f"第{index}行：重量必须是有效的数字")
-                continue
-
-            # 生成子订单号
-            order_number = str(order_data['order_number'])
-            max_seq_dict[order_number] += 1
-            seq = max_seq_dict[order_number]
-            sub_order_number = f"{order_number}-{seq}"
-
-            try:
-                new_order = Order(
-                    project_id=project.id,
-                    project_name=project.project_name,
-                    order_number=order_number,
-                    sub_order_number=sub_order_number,
-                    seq=seq,  # 添加seq字段
-                    order_date=datetime.strptime(order_data['order_date'], '%Y-%m-%d').date(),
-                    delivery_date=datetime.strptime(order_data['delivery_date'], '%Y-%m-%d').date(),
-                    product_name=order_data['product_name'],
-                    quantity=order_data['quantity'],
-                    weight=order_data['weight'],
-                    departure_province=order_data['departure_province'],
-                    departure_city=order_data['departure_city'],
-                    destination_province=order_data['destination_province'],
-                    destination_city=order_data['destination_city'],
-                    destination_address=order_data.get('destination_address'),
-                    remark=order_data.get('remark'),
-                    amount=amount
-                )
-                new_orders.append(new_order)
-            except (ValueError, TypeError) as e:
-                errors.append(f"第{index}行：数据格式错误 - {str(e)}")
-                continue
+        # 3. 批量处理订单数据
+        row_numbers = []
+        new_orders, errors = build_orders(project, price_table, regions, enumerate(data['orders'], 1), row_numbers)
 
+        if dry_run:
+            print(f"[预校验] 订单导入，有效{len(new_orders)}行，错误{len(errors)}条")
+            return dry_run_response(
+                errors, order_preview(new_orders, row_numbers, price_table),
+                total_weight=round(sum(float(o.weight) for o in new_orders), 3),
+                total_amount=round(sum(o.amount for o in new_orders), 2)
+            )
         if errors:
             return error_response(ErrorCode.BAD_REQUEST, '\n'.join(errors))
         
         if new_orders:
+            # 4. 按订单号从计数表批量分配子订单序号区间
+            assign_sub_order_numbers(new_orders)
+
             print(f"[事务处理] 准备保存{len(new_orders)}个新订单")
             # 5. 使用批量插入优化
             db.session.bulk_save_objects(new_orders)
+            mark_tables_changed(Order)
+            # 6. 更新涉及日期的利润日汇总
+            refresh_profit_days({(project.id, o.order_date) for o in new_orders})
             print("[事务完成] 订单导入成功")
             return success_response({'imported_count': len(new_orders)})
         else:
@@ -280,6 +432,93 @@ def import_orders():
         print(f"[事务回滚] 订单导入失败：{str(e)}")
         raise  # 让装饰器处理回滚
 
+@order.route('/import_file', methods=['POST'])
+@idempotent_import('order_file')
+@admission_controlled('import')
+@transactional
+@dry_run_supported
+def import_orders_file():
+    """上传 .xlsx / .csv 文件导入订单，服务端流式读取并分块校验、写入；dry_run 为真时只校验并返回金额预览"""
+    upload = request.files.get('file')
+    project_id = request.form.get('project_id', type=int)
+    project_name = request.form.get('project_name')
+    if not upload or not project_id or not project_name:
+        return error_response(ErrorCode.BAD_REQUEST, '无效的请求数据')
+    if not (upload.filename or '').lower().endswith(SUPPORTED_EXTENSIONS):
+        return error_response(ErrorCode.BAD_REQUEST, f"不支持的文件类型，仅支持{'、'.join(SUPPORTED_EXTENSIONS)}")
+
+    try:
+        print(f"[事务开始] 文件导入订单，文件名：{upload.filename}")
+
+        project = ProjectInfo.query.filter_by(id=project_id, is_deleted=0).first()
+        if not project:
+            return error_response(ErrorCode.BAD_REQUEST, '项目不存在')
+        if project.project_name != project_name:
+            return error_response(ErrorCode.BAD_REQUEST, '项目ID与项目名称不匹配')
+
+        dry_run = is_dry_run()
+        price_table, regions = load_pricing(project.id)
+        if not price_table:
+            return error_response(ErrorCode.BAD_REQUEST, '项目未配置价格')
+
+        column_mapping, mapping_error = resolve_column_mapping(project.get_order_column_mapping() or DEFAULT_ORDER_COLUMNS)
+        if mapping_error:
+            return error_response(ErrorCode.BAD_REQUEST, mapping_error)
+
+        # 分块校验；出现错误后只继续校验剩余数据，不再写入
+        errors = []
+        imported_count = 0
+        profit_days = set()
+        # 预校验只保留前若干行预览，其余只累计合计
+        preview = []
+        totals = {'count': 0, 'weight': 0, 'amount': 0}
+        # 按整个文件的行数决定是否在进程池中并行校验，结果仍按块的顺序逐块写入
+        validated_chunks = validate_order_chunks(
+            project.id, project.project_name, price_table, regions,
+            iter_chunks(iter_sheet_rows(upload, column_mapping), IMPORT_CHUNK_SIZE)
+        )
+        for valid_rows, chunk_errors in validated_chunks:
+            row_numbers = []
+            new_orders = orders_from_rows(valid_rows, row_numbers)
+            errors.extend(chunk_errors)
+            if dry_run:
+                if len(preview) < DRY_RUN_PREVIEW_LIMIT:
+                    preview.extend(order_preview(new_orders, row_numbers, price_table))
+                totals['count'] += len(new_orders)
+                totals['weight'] += sum(float(o.weight) for o in new_orders)
+                totals['amount'] += sum(o.amount for o in new_orders)
+                continue
+            if errors or not new_orders:
+                continue
+
+            assign_sub_order_numbers(new_orders)
+            db.session.bulk_save_objects(new_orders)
+            mark_tables_changed(Order)
+            imported_count += len(new_orders)
+            profit_days.update((project.id, o.order_date) for o in new_orders)
+            print(f"[事务处理] 已写入{imported_count}个新订单")
+
+        if dry_run:
+            print(f"[预校验] 文件导入订单，有效{totals['count']}行，错误{len(errors)}条")
+            return dry_run_response(
+                errors, preview, preview_total=totals['count'],
+                total_weight=round(totals['weight'], 3), total_amount=round(totals['amount'], 2)
+            )
+        if errors:
+            # 已写入的分块随事务一起回滚
+            db.session.rollback()
+            return error_response(ErrorCode.BAD_REQUEST, '\n'.join(errors))
+        if not imported_count:
+            return error_response(ErrorCode.BAD_REQUEST, '没有新的订单需要导入')
+
+        refresh_profit_days(profit_days)
+        print("[事务完成] 订单导入成功")
+        return success_response({'imported_count': imported_count})
+
+    except Exception as e:
+        print(f"[事务回滚] 文件导入订单失败：{str(e)}")
+        raise  # 让装饰器处理回滚
+
 @order.route('/delete', methods=['POST'])
 @transactional
 def delete_order():
@@ -332,12 +571,19 @@ def delete_order():
                     'carrier_name': None,
                     'carrier_phone': None,
                     'carrier_plate': None,
-                    'carrier_fee': None
+                    'carrier_fee': None,
+                    'carrier_id': None
                 }, synchronize_session=False)
 
         # 逻辑删除订单
         order.is_deleted = order.id
         db.session.add(order)
+
+        # 更新被删除订单及被重置订单所在日期的利润日汇总
+        profit_days = {(order.project_id, order.order_date)}
+        if existing_record and sub_order_numbers_to_reset:
+            profit_days |= order_days(Order.sub_order_number.in_(sub_order_numbers_to_reset))
+        refresh_profit_days(profit_days)
         print("[事务完成] 订单删除成功")
         return success_response()
     except Exception as e:
@@ -353,11 +599,18 @@ def edit_order():
         return error_response(ErrorCode.BAD_REQUEST, '无效的请求数据')
 
     try:
-        # 使用行锁查询订单
-        order = Order.query.filter_by(id=data['id'], is_deleted=0).with_for_update().first()
+        # 不再对订单加行锁，并发修改由版本号（乐观锁）在提交时检测
+        order = Order.query.filter_by(id=data['id'], is_deleted=0).first()
         if not order:
             return error_response(ErrorCode.BAD_REQUEST, '订单不存在')
 
+        # 客户端携带版本号时，校验编辑的是否为最新数据
+        if data.get('version') is not None and int(data['version']) != order.version:
+            return error_response(ErrorCode.VERSION_CONFLICT)
+
+        # 修改前所在日期，改期或改重量后新旧日期的利润汇总都需要更新
+        profit_days = {(order.project_id, order.order_date)}
+
         # 检查重量是否发生变化
         new_weight = data.get('weight')
         weight_changed = new_weight is not None and float(new_weight) != float(order.weight)
@@ -367,6 +620,7 @@ def edit_order():
             print(f"[事务处理] 订单重量发生变化，原重量：{order.weight}，新重量：{new_weight}")
             
             # 查找该子订单所在的status=0的批次记录
+            # 批次失效会重置其他订单的送货信息，这里仍需行锁防止与送货导入交错
             existing_record = DeliveryImportRecord.query.filter_by(
                 sub_order_number=order.sub_order_number,
                 status=0
@@ -397,6 +651,7 @@ def edit_order():
                 # 重置所有相关子订单的送货信息
                 if sub_order_numbers_to_reset:
                     print(f"[事务处理] 重置{len(sub_order_numbers_to_reset)}个关联订单的送货信息")
+                    profit_days |= order_days(Order.sub_order_number.in_(sub_order_numbers_to_reset))
                     Order.query.filter(
                         Order.sub_order_number.in_(sub_order_numbers_to_reset),
                         Order.is_deleted == 0
@@ -405,27 +660,29 @@ def edit_order():
                         'carrier_name': None,
                         'carrier_phone': None,
                         'carrier_plate': None,
-                        'carrier_fee': None
+                        'carrier_fee': None,
+                        'carrier_id': None
                     }, synchronize_session=False)
 
-        price_configs = ProjectPriceConfig.query.filter_by(project_id=order.project_id, is_deleted=0).all()
-        if not price_configs:
+        price_table, regions = load_pricing(order.project_id)
+        if not price_table:
             return error_response(ErrorCode.BAD_REQUEST, '项目未配置价格')
 
-        price_config_dict = {}
-        for config in price_configs:
-            key = f"{config.departure_province}-{config.departure_city}-{config.destination_province}-{config.destination_city}"
-            price_config_dict[key] = config.unit_price
-
         departure_province = data.get('departure_province', order.departure_province)
         departure_city = data.get('departure_city', order.departure_city)
         destination_province = data.get('destination_province', order.destination_province)
         destination_city = data.get('destination_city', order.destination_city)
-        route_key = f"{departure_province}-{departure_city}-{destination_province}-{destination_city}"
+        route_key = (regions.city_id(departure_province, departure_city),
+                     regions.city_id(destination_province, destination_city))
 
-        if route_key not in price_config_dict:
+        if route_key not in price_table:
             return error_response(ErrorCode.BAD_REQUEST, f"出发地（{departure_province}{departure_city}）到达地（{destination_province}{destination_city}）的价格配置不存在")
 
+        # 按编辑后的重量查找吨位区间单价
+        unit_price = price_table.unit_price(route_key, float(data.get('weight', order.weight)))
+        if unit_price is None:
+            return error_response(ErrorCode.BAD_REQUEST, f"重量{data.get('weight', order.weight)}吨不在出发地（{departure_province}{departure_city}）到达地（{destination_province}{destination_city}）已配置的吨位区间内")
+
         order.order_number = data.get('order_number', order.order_number)
         order.order_date = datetime.strptime(data.get('order_date'), '%Y-%m-%d').date() if data.get('order_date') else order.order_date
         order.product_name = data.get('product_name', order.product_name)
@@ -435,34 +692,358 @@ def edit_order():
         order.departure_city = departure_city
         order.destination_province = destination_province
         order.destination_city = destination_city
+        order.departure_region_id, order.destination_region_id = (stored_region_id(region_id) for region_id in route_key)
         order.destination_address = data.get('destination_address', order.destination_address)
         order.remark = data.get('remark', order.remark)
 
-        unit_price = price_config_dict[route_key]
         order.amount = float(order.weight) * unit_price
 
-        return success_response()
+        # 立即刷新，版本冲突时抛出StaleDataError由装饰器处理
+        db.session.flush()
+        profit_days.add((order.project_id, order.order_date))
+        refresh_profit_days(profit_days)
+        return success_response({'version': order.version})
     except Exception as e:
         print(f"[事务回滚] 订单编辑失败：{str(e)}")
         raise  # 让装饰器处理回滚
 
+# 批量编辑每次最多提交的订单数
+BATCH_EDIT_MAX_SIZE = int(os.getenv('BATCH_EDIT_MAX_SIZE', 5000))
+# 批量操作时 IN 查询、批量UPDATE每批的订单数
+ORDER_BATCH_QUERY_SIZE = 1000
+
+# 编辑接口可修改的订单字段
+ORDER_EDIT_FIELDS = (
+    'order_number', 'order_date', 'product_name', 'quantity', 'weight', 'departure_province', 'departure_city',
+    'destination_province', 'destination_city', 'destination_address', 'remark'
+)
+# 批量UPDATE写入的字段：可编辑字段和由其计算出的地区ID、金额
+ORDER_REPRICE_FIELDS = ORDER_EDIT_FIELDS + ('departure_region_id', 'destination_region_id', 'amount')
+
+def in_batches(values, size=ORDER_BATCH_QUERY_SIZE):
+    """把值列表按 IN 查询的大小分批"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def invalidate_delivery_batches(sub_order_numbers, skip_reset=None):
+    """
+    失效包含指定子订单的生效送货批次（status=0），并重置批次内订单的送货信息
+    全部为集合操作：锁定批次记录、查询利润日期、重置送货信息、标记失效各一条SQL，与订单数无关
+    :param sub_order_numbers: 触发失效的子订单号列表，或返回子订单号的 select
+    :param skip_reset: 可选的订单筛选条件，满足条件的订单不重置送货信息（如将被删除的订单）
+    :return: (失效的批次号集合, 重置送货信息的订单数, 被重置订单的 {(项目ID, 下单日期)})
+    """
+    affected_batches = select(DeliveryImportRecord.batch_number).where(
+        DeliveryImportRecord.sub_order_number.in_(sub_order_numbers),
+        DeliveryImportRecord.status == 0
+    )
+    # 批次失效会重置其他订单的送货信息，仍需行锁防止与送货导入交错
+    records = db.session.query(DeliveryImportRecord.id, DeliveryImportRecord.batch_number).filter(
+        DeliveryImportRecord.batch_number.in_(affected_batches),
+        DeliveryImportRecord.status == 0
+    ).with_for_update().all()
+    batch_numbers = {record.batch_number for record in records}
+    if not batch_numbers:
+        return set(), 0, set()
+
+    reset_criteria = [
+        Order.sub_order_number.in_(select(DeliveryImportRecord.sub_order_number).where(
+            DeliveryImportRecord.batch_number.in_(batch_numbers),
+            DeliveryImportRecord.status == 0
+        )),
+        Order.is_deleted == 0
+    ]
+    if skip_reset is not None:
+        reset_criteria.append(db.not_(skip_reset))
+    profit_days = order_days(*reset_criteria)
+    reset_count = Order.query.filter(*reset_criteria).update({
+        'carrier_type': None,
+        'carrier_name': None,
+        'carrier_phone': None,
+        'carrier_plate': None,
+        'carrier_fee': None,
+        'carrier_id': None
+    }, synchronize_session=False)
+
+    # 与送货导入更新记录一致，失效的记录状态标记为自身ID
+    DeliveryImportRecord.query.filter(
+        DeliveryImportRecord.batch_number.in_(batch_numbers),
+        DeliveryImportRecord.status == 0
+    ).update({'status': DeliveryImportRecord.id}, synchronize_session=False)
+    print(f"[事务处理] 失效{len(batch_numbers)}个送货批次，重置{reset_count}个关联订单的送货信息")
+    return batch_numbers, reset_count, profit_days
+
+@order.route('/batch_edit', methods=['POST'])
+@transactional
+def batch_edit_orders():
+    """
+    批量编辑订单
+    请求体：{"orders": [{"id": 订单ID, "version": 版本号（可选）, 其余字段同 /edit}, ...]}
+    价格配置按项目只加载一次，在内存中重新计价，全部校验通过后批量UPDATE；
+    重量变化的订单所在的送货批次一次失效。任一订单校验失败或版本冲突时不做任何修改
+    """
+    data = request.json
+    edits = data.get('orders') if isinstance(data, dict) else None
+    if not edits or not isinstance(edits, list) or not all(isinstance(edit, dict) and edit.get('id') for edit in edits):
+        return error_response(ErrorCode.BAD_REQUEST, '无效的请求数据')
+    if len(edits) > BATCH_EDIT_MAX_SIZE:
+        return error_response(ErrorCode.BAD_REQUEST, f'每次最多编辑{BATCH_EDIT_MAX_SIZE}个订单')
+    try:
+        ids = [int(edit['id']) for edit in edits]
+        versions = [None if edit.get('version') is None else int(edit['version']) for edit in edits]
+    except (TypeError, ValueError):
+        return error_response(ErrorCode.BAD_REQUEST, '订单ID和版本号必须为整数')
+    if len(set(ids)) != len(ids):
+        return error_response(ErrorCode.BAD_REQUEST, '同一订单不能重复编辑')
+
+    try:
+        print(f"[事务开始] 批量编辑{len(edits)}个订单")
+        # 不对订单加行锁，并发修改由UPDATE条件中的版本号检测
+        orders = {}
+        for batch in in_batches(ids):
+            for order in Order.query.filter(Order.id.in_(batch), Order.is_deleted == 0):
+                orders[order.id] = order
+
+        # 先加载所有涉及项目的价格表，再用地区索引规范订单的省市：
+        # 各项目的价格表共用一个地区索引副本，历史价格配置的临时地区ID加在副本中
+        regions = region_index().preview_copy()
+        price_tables = {
+            project_id: load_price_table(project_id, regions)
+            for project_id in sorted({order.project_id for order in orders.values()})
+        }
+        rows, errors, conflicts = [], [], []
+        weight_changed = []
+        # 修改前后所在日期的利润汇总都需要更新
+        profit_days = set()
+        for index, (edit, order_id, version) in enumerate(zip(edits, ids, versions), 1):
+            order = orders.get(order_id)
+            if order is None:
+                errors.append(f"第{index}条：订单{order_id}不存在")
+                continue
+            # 客户端携带版本号时，校验编辑的是否为最新数据
+            if version is not None and version != order.version:
+                conflicts.append(order.id)
+                continue
+
+            values = {field: edit.get(field, getattr(order, field)) for field in ORDER_EDIT_FIELDS}
+            try:
+                weight = float(values['weight'])
+                if edit.get('order_date'):
+                    values['order_date'] = datetime.strptime(edit['order_date'], '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                errors.append(f"第{index}条：重量必须为数字，下单日期格式必须为YYYY-MM-DD")
+                continue
+
+            price_table = price_tables[order.project_id]
+            if not price_table:
+                errors.append(f"第{index}条：项目未配置价格")
+                continue
+
+            route = (f"出发地（{values['departure_province']}{values['departure_city']}）"
+                     f"到达地（{values['destination_province']}{values['destination_city']}）")
+            route_key = (regions.city_id(values['departure_province'], values['departure_city']),
+                         regions.city_id(values['destination_province'], values['destination_city']))
+            if route_key not in price_table:
+                errors.append(f"第{index}条：{route}的价格配置不存在")
+                continue
+            # 按编辑后的重量查找吨位区间单价
+            unit_price = price_table.unit_price(route_key, weight)
+            if unit_price is None:
+                errors.append(f"第{index}条：重量{weight}吨不在{route}已配置的吨位区间内")
+                continue
+
+            if weight != float(order.weight):
+                weight_changed.append(order.sub_order_number)
+            values['departure_region_id'], values['destination_region_id'] = (stored_region_id(region_id) for region_id in route_key)
+            values['amount'] = weight * unit_price
+            rows.append({'b_id': order.id, 'b_version': order.version,
+                         **{f'new_{field}': values[field] for field in ORDER_REPRICE_FIELDS}})
+            profit_days.add((order.project_id, order.order_date))
+            profit_days.add((order.project_id, values['order_date']))
+
+        if conflicts:
+            return error_response(
+                ErrorCode.VERSION_CONFLICT,
+                f"订单{', '.join(str(id) for id in conflicts)}已被其他用户修改，请刷新后重试"
+            )
+        if errors:
+            return validation_error_response(errors)
+
+        invalidated_batches, reset_count, reset_days = invalidate_delivery_batches(weight_changed)
+        profit_days |= reset_days
+
+        # 按ID和读取时的版本号批量更新，版本号加一
+        table = Order.__table__
+        statement = table.update().where(
+            table.c.id == bindparam('b_id'),
+            table.c.version == bindparam('b_version')
+        ).values(
+            version=table.c.version + 1,
+            **{field: bindparam(f'new_{field}') for field in ORDER_REPRICE_FIELDS}
+        )
+        updated = 0
+        for batch in in_batches(rows):
+            updated += db.session.execute(statement, batch).rowcount
+        if db.session.get_bind().dialect.supports_sane_multi_rowcount and updated != len(rows):
+            # 读取后有订单被其他事务修改，由装饰器回滚并返回版本冲突
+            raise StaleDataError(f'批量编辑预期更新{len(rows)}个订单，实际更新{updated}个')
+
+        refresh_profit_days(profit_days)
+        print(f"[事务完成] 批量编辑{len(rows)}个订单")
+        return success_response({
+            'updated': len(rows),
+            'versions': {row['b_id']: row['b_version'] + 1 for row in rows},
+            'invalidated_batches': len(invalidated_batches),
+            'reset_count': reset_count
+        })
+    except Exception as e:
+        print(f"[事务回滚] 批量编辑订单失败：{str(e)}")
+        raise  # 让装饰器处理回滚
+
+# 批量删除每次最多删除的订单数
+BATCH_DELETE_MAX_SIZE = int(os.getenv('BATCH_DELETE_MAX_SIZE', 20000))
+
+@order.route('/batch_delete', methods=['POST'])
+@transactional
+def batch_delete_orders():
+    """
+    批量删除订单
+    请求体指定以下条件之一或组合（同时满足）：
+    - ids：订单ID列表
+    - order_number：订单号，删除其所有子订单
+    - batch_number：送货导入批次号，删除该批次中仍生效的所有子订单
+    - project_name：可选，限定项目
+    软删除、送货批次失效和送货信息重置均为集合操作，SQL条数与删除的订单数无关
+    """
+    data = request.json or {}
+    criteria = [Order.is_deleted == 0]
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            return error_response(ErrorCode.BAD_REQUEST, 'ids必须为非空列表')
+        criteria.append(Order.id.in_(ids))
+    if data.get('order_number'):
+        criteria.append(Order.order_number == data['order_number'])
+    if data.get('batch_number'):
+        criteria.append(Order.sub_order_number.in_(select(DeliveryImportRecord.sub_order_number).where(
+            DeliveryImportRecord.batch_number == data['batch_number'],
+            DeliveryImportRecord.status == 0
+        )))
+    if len(criteria) == 1:
+        return error_response(ErrorCode.BAD_REQUEST, '请指定要删除的订单ID、订单号或送货批次号')
+    if data.get('project_name'):
+        criteria.append(Order.project_name == data['project_name'])
+
+    try:
+        # 锁定要删除的订单，后续语句按ID集合操作（送货批次失效后按批次号筛选的条件不再成立）
+        targets = db.session.query(
+            Order.id, Order.sub_order_number, Order.project_id, Order.order_date
+        ).filter(*criteria).with_for_update().all()
+        if not targets:
+            return error_response(ErrorCode.ORDER_NOT_FOUND, '没有符合条件的订单')
+        if len(targets) > BATCH_DELETE_MAX_SIZE:
+            return error_response(ErrorCode.BAD_REQUEST,
+                                  f'符合条件的订单有{len(targets)}个，每次最多删除{BATCH_DELETE_MAX_SIZE}个，请缩小范围')
+        print(f"[事务开始] 批量删除{len(targets)}个订单")
+
+        target_ids = [target.id for target in targets]
+        # 删除的订单不重置送货信息，只重置同批次的其他订单
+        invalidated_batches, reset_count, profit_days = invalidate_delivery_batches(
+            [target.sub_order_number for target in targets],
+            skip_reset=Order.id.in_(target_ids)
+        )
+
+        # 逻辑删除，与单条删除一致 is_deleted 记为订单自身ID，并使客户端持有的版本号失效
+        Order.query.filter(Order.id.in_(target_ids)).update({
+            'is_deleted': Order.id,
+            'version': Order.version + 1
+        }, synchronize_session=False)
+
+        # 更新被删除订单及被重置订单所在日期的利润日汇总
+        profit_days |= {(target.project_id, target.order_date) for target in targets}
+        refresh_profit_days(profit_days)
+        print(f"[事务完成] 批量删除{len(targets)}个订单")
+        return success_response({
+            'deleted': len(targets),
+            'invalidated_batches': len(invalidated_batches),
+            'reset_count': reset_count
+        })
+    except Exception as e:
+        print(f"[事务回滚] 批量删除订单失败：{str(e)}")
+        raise  # 让装饰器处理回滚
+
 @order.route('/import_delivery', methods=['POST'])
+@idempotent_import('delivery')
+@admission_controlled('import')
 @transactional
+@dry_run_supported
 def import_delivery():
-    """导入送货信息"""
+    """导入送货信息，dry_run 为真时只校验并返回运费分摊预览"""
     data = request.get_json()
     if not data or 'deliveries' not in data:
         return error_response(ErrorCode.BAD_REQUEST, '无效的请求数据')
-    
+    return process_deliveries(data['deliveries'])
+
+@order.route('/import_delivery_file', methods=['POST'])
+@idempotent_import('delivery_file')
+@admission_controlled('import')
+@transactional
+@dry_run_supported
+def import_delivery_file():
+    """上传 .xlsx / .csv 文件导入送货信息，每行一个送货批次，子订单号以逗号分隔"""
+    upload = request.files.get('file')
+    if not upload:
+        return error_response(ErrorCode.BAD_REQUEST, '无效的请求数据')
+    if not (upload.filename or '').lower().endswith(SUPPORTED_EXTENSIONS):
+        return error_response(ErrorCode.BAD_REQUEST, f"不支持的文件类型，仅支持{'、'.join(SUPPORTED_EXTENSIONS)}")
+
+    column_mapping, mapping_error = resolve_column_mapping(DEFAULT_DELIVERY_COLUMNS)
+    if mapping_error:
+        return error_response(ErrorCode.BAD_REQUEST, mapping_error)
+
+    print(f"[事务开始] 文件导入送货信息，文件名：{upload.filename}")
+    deliveries = []
+    errors = []
+    for row_number, row in iter_sheet_rows(upload, column_mapping):
+        if not row.get('sub_order_numbers'):
+            errors.append(f"第{row_number}行：子订单号不能为空")
+            continue
+        row['sub_order_numbers'] = [
+            number.strip() for number in str(row['sub_order_numbers']).replace('，', ',').split(',')
+            if number.strip()
+        ]
+        try:
+            row['carrier_type'] = int(row['carrier_type']) if row.get('carrier_type') is not None else None
+        except (ValueError, TypeError):
+            errors.append(f"第{row_number}行：承运类型必须为1（司机直送）或2（承运商）")
+            continue
+        deliveries.append(row)
+
+    if errors:
+        return validation_error_response(errors)
+    if not deliveries:
+        return error_response(ErrorCode.BAD_REQUEST, '文件中没有送货信息')
+    return process_deliveries(deliveries)
+
+def process_deliveries(deliveries):
+    """
+    校验并写入送货信息：失效旧批次、按分摊依据分摊运费、更新订单承运信息并生成导入记录
+    预校验时不加锁读取送货记录，返回全部错误和运费分摊结果，不写入
+    :param deliveries: 送货信息列表，每项包含子订单号列表和承运信息
+    :return: 统一格式的响应
+    """
+    dry_run = is_dry_run()
     try:
-        print(f"[事务开始] 导入送货信息，数据量：{len(data['deliveries'])}")
+        print(f"[事务开始] 导入送货信息，数据量：{len(deliveries)}")
         errors = []
         batch_numbers_to_update = set()
         sub_order_numbers_to_reset = set()
+        profit_days = set()  # 需要更新利润日汇总的 (项目ID, 下单日期)
         
         # 预处理：收集所有子订单号
         all_sub_order_numbers = []
-        for delivery in data['deliveries']:
+        for delivery in deliveries:
             if 'sub_order_numbers' not in delivery:
                 errors.append('缺少子订单号列表')
                 continue
@@ -476,7 +1057,7 @@ def import_delivery():
         
         if duplicate_sub_orders:
             duplicate_details = [f"子订单号 {sub_order} 重复出现 {count} 次" for sub_order, count in duplicate_sub_orders.items()]
-            return error_response(ErrorCode.BAD_REQUEST, f"发现重复的子订单号：\n{chr(10).join(duplicate_details)}")
+            return validation_error_response([f"发现重复的子订单号：\n{chr(10).join(duplicate_details)}"])
             
         # 验证所有子订单号是否存在且属于同一个项目
         project_id = None
@@ -511,7 +1092,7 @@ def import_delivery():
         if invalid_orders:
             errors.append(f"订单必须属于同一个项目：\n{chr(10).join(invalid_orders)}")
         if errors:
-            return error_response(ErrorCode.BAD_REQUEST, '\n'.join(errors))
+            return validation_error_response(errors)
             
         # 验证项目是否存在
         project = ProjectInfo.query.filter_by(id=project_id, is_deleted=0).first()
@@ -523,11 +1104,12 @@ def import_delivery():
         # 第一步：验证所有数据的合法性并预处理数据
         delivery_data = {}  # 用于存储每组送货信息的处理结果
         
-        # 一次性查询所有status=0的送货记录
-        existing_records = DeliveryImportRecord.query.filter(
+        # 一次性查询所有status=0的送货记录，正式导入时加锁，预校验只做快照读
+        existing_query = DeliveryImportRecord.query.filter(
             DeliveryImportRecord.sub_order_number.in_(all_sub_order_numbers),
             DeliveryImportRecord.status == 0
-        ).with_for_update().all()
+        )
+        existing_records = (existing_query if dry_run else existing_query.with_for_update()).all()
         
         # 建立送货记录字典，方便快速查找
         record_dict = {record.sub_order_number: record for record in existing_records}
@@ -539,16 +1121,17 @@ def import_delivery():
         # 一次性查询所有批次下的子订单记录
         if existing_records:
             batch_numbers = {record.batch_number for record in existing_records}
-            all_suborders_of_batches = DeliveryImportRecord.query.filter(
+            batches_query = DeliveryImportRecord.query.filter(
                 DeliveryImportRecord.batch_number.in_(batch_numbers),
                 DeliveryImportRecord.status == 0
-            ).with_for_update().all()
+            )
+            all_suborders_of_batches = (batches_query if dry_run else batches_query.with_for_update()).all()
             
             # 收集需要重置的子订单号
             for suborder in all_suborders_of_batches:
                 sub_order_numbers_to_reset.add(suborder.sub_order_number)
         
-        for delivery in data['deliveries']:
+        for delivery in deliveries:
             # 验证必填字段
             if not delivery.get('carrier_name'):
                 errors.append('承运人名称不能为空')
@@ -563,10 +1146,22 @@ def import_delivery():
             carrier_type = delivery.get('carrier_type')
             if carrier_type not in [1, 2]:
                 errors.append(f'承运类型必须为1（司机直送）或2（承运商），当前值：{carrier_type}')
+
+            # 验证运费金额，统一换算为分参与分摊
+            fee_cents = None
+            if delivery.get('carrier_fee'):
+                try:
+                    fee_cents = to_cents(delivery['carrier_fee'])
+                except (InvalidOperation, ValueError, TypeError):
+                    errors.append(f"运费必须是有效的数字，当前值：{delivery['carrier_fee']}")
+
+            # 验证分摊依据，默认按重量分摊
+            allocation_basis = delivery.get('allocation_basis') or BASIS_WEIGHT
+            if allocation_basis not in ALLOCATION_BASES:
+                errors.append(f'分摊依据必须为weight（重量）、quantity（数量）或equal（平均），当前值：{allocation_basis}')
             
             # 收集订单信息和验证子订单号
             orders_info = []
-            total_weight = 0  # 修改为总重量
             for sub_order_number in delivery['sub_order_numbers']:
                 # 检查订单是否存在
                 order = order_dict.get(sub_order_number)
@@ -584,14 +1179,10 @@ def import_delivery():
                     errors.append(f'子订单号 {sub_order_number} 的重量无效')
                     continue
 
-                # 收集订单重量信息
-                orders_info.append({
-                    'order': order,
-                    'weight': float(order.weight)  # 使用重量而不是金额
-                })
-                total_weight += float(order.weight)
+                orders_info.append(order)
             
-            if orders_info:  # 只有在有有效订单时才保存处理结果
+            # 只有在有有效订单且运费、分摊依据有效时才保存处理结果（预校验据此计算分摊预览）
+            if orders_info and fee_cents is not None and allocation_basis in ALLOCATION_BASES:
                 # 生成批次号（使用毫秒时间戳）
                 timestamp_ms = int(datetime.now().timestamp() * 1000)
                 new_batch_number = f'DL{timestamp_ms}'
@@ -599,13 +1190,44 @@ def import_delivery():
                 delivery_data[id(delivery)] = {
                     'carrier_info': delivery,
                     'orders_info': orders_info,
-                    'total_weight': total_weight,  # 保存总重量
+                    'fee_cents': fee_cents,
+                    'allocation_basis': allocation_basis,
                     'batch_number': new_batch_number
                 }
 
-        if errors:
+        if errors and not dry_run:
             return error_response(ErrorCode.BAD_REQUEST, '\n'.join(errors))
 
+        # 一次性计算所有批次的运费分摊（以分为单位，最大余数法保证每批之和等于运费）
+        fee_totals = []
+        group_index = []
+        bases = []
+        for group, delivery_info in enumerate(delivery_data.values()):
+            fee_totals.append(delivery_info['fee_cents'])
+            group_index.extend([group] * len(delivery_info['orders_info']))
+            bases.extend(allocation_bases(delivery_info['orders_info'], delivery_info['allocation_basis']))
+        fee_shares = iter(allocate_cents(fee_totals, group_index, bases))
+
+        if dry_run:
+            preview = []
+            for delivery_info in delivery_data.values():
+                delivery = delivery_info['carrier_info']
+                for order in delivery_info['orders_info']:
+                    preview.append({
+                        'sub_order_number': order.sub_order_number,
+                        'carrier_name': delivery.get('carrier_name'),
+                        'allocation_basis': delivery_info['allocation_basis'],
+                        'weight': float(order.weight),
+                        'quantity': order.quantity,
+                        'carrier_fee': float(from_cents(next(fee_shares)))
+                    })
+            print(f"[预校验] 送货信息导入，分摊{len(preview)}个订单，错误{len(errors)}条")
+            return dry_run_response(
+                errors, preview,
+                invalidated_batches=sorted(batch_numbers_to_update),
+                reset_count=len(sub_order_numbers_to_reset - set(all_sub_order_numbers))
+            )
+
         # 第二步：更新旧记录的状态并重置对应订单的承运信息
         if batch_numbers_to_update:
             print(f"[事务处理] 更新{len(batch_numbers_to_update)}个批次的状态")
@@ -621,6 +1243,7 @@ def import_delivery():
             sub_order_numbers_to_reset = sub_order_numbers_to_reset - set(all_sub_order_numbers)
             if sub_order_numbers_to_reset:
                 print(f"[事务处理] 重置{len(sub_order_numbers_to_reset)}个订单的送货信息")
+                profit_days |= order_days(Order.sub_order_number.in_(sub_order_numbers_to_reset))
                 Order.query.filter(
                     Order.sub_order_number.in_(sub_order_numbers_to_reset),
                     Order.is_deleted == 0
@@ -629,37 +1252,40 @@ def import_delivery():
                     'carrier_name': None,
                     'carrier_phone': None,
                     'carrier_plate': None,
-                    'carrier_fee': None
+                    'carrier_fee': None,
+                    'carrier_id': None
                 }, synchronize_session=False)
 
         # 第三步：更新订单信息并创建新的导入记录
         updated_orders = []
         new_records = []
         batch_numbers = []  # 记录所有新生成的批次号
-        
+
+        # 写入承运人维度并登记到项目，订单和导入记录通过ID引用承运人
+        carrier_ids = upsert_carriers([info['carrier_info'] for info in delivery_data.values()])
+        link_project_carriers(project.id, set(carrier_ids.values()))
+
         # 收集所有需要更新的订单信息和新的导入记录
         for delivery_info in delivery_data.values():
             delivery = delivery_info['carrier_info']
-            total_weight = delivery_info['total_weight']  # 使用总重量
-            carrier_fee = float(delivery['carrier_fee'])
+            carrier_id = carrier_ids[(delivery['carrier_name'], delivery['carrier_phone'])]
             new_batch_number = delivery_info['batch_number']
             batch_numbers.append(new_batch_number)
 
-            for order_info in delivery_info['orders_info']:
-                order = order_info['order']
-                order_weight = order_info['weight']  # 使用订单重量
-                
-                # 计算该订单应分摊的运费（按重量比例分摊）
-                order_carrier_fee = round(order_weight / total_weight * carrier_fee, 2)
+            for order in delivery_info['orders_info']:
+                # 该订单分摊到的运费
+                order_carrier_fee = from_cents(next(fee_shares))
                 
                 # 收集需要更新的订单信息
                 updated_orders.append({
                     'id': order.id,
+                    'version': order.version,
                     'carrier_type': delivery['carrier_type'],
                     'carrier_name': delivery['carrier_name'],
                     'carrier_phone': delivery['carrier_phone'],
                     'carrier_plate': delivery.get('carrier_plate'),
-                    'carrier_fee': order_carrier_fee
+                    'carrier_fee': order_carrier_fee,
+                    'carrier_id': carrier_id
                 })
 
                 # 收集新的导入记录
@@ -671,6 +1297,7 @@ def import_delivery():
                     'carrier_phone': delivery['carrier_phone'],
                     'carrier_plate': delivery.get('carrier_plate'),
                     'carrier_fee': order_carrier_fee,
+                    'carrier_id': carrier_id,
                     'status': 0,
                     'create_time': datetime.now()
                 })
@@ -679,11 +1306,17 @@ def import_delivery():
         if updated_orders:
             print(f"[事务处理] 批量更新{len(updated_orders)}个订单的送货信息")
             db.session.bulk_update_mappings(Order, updated_orders)
+            mark_tables_changed(Order)
 
         # 批量插入新的导入记录
         if new_records:
             print(f"[事务处理] 批量创建{len(new_records)}条新的送货记录")
             db.session.bulk_insert_mappings(DeliveryImportRecord, new_records)
+            mark_tables_changed(DeliveryImportRecord)
+
+        # 更新涉及订单所在日期的利润日汇总
+        profit_days |= {(order.project_id, order.order_date) for order in order_dict.values()}
+        refresh_profit_days(profit_days)
         print("[事务完成] 送货信息导入成功")
 
         return success_response({
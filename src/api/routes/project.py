@@ -1,18 +1,35 @@
 from flask import request, jsonify, Blueprint
-from api.models import db, ProjectInfo, ProjectPriceConfig, Order
+from api.models import db, ProjectInfo, ProjectPriceConfig, Order, ProjectProfitDaily, Carrier
 from api.enum.error_code import ErrorCode
-from api.utils import success_response, error_response, register_error_handlers
+from api.utils import (
+    success_response, error_response, register_error_handlers, build_upsert,
+    mark_tables_changed, conditional_query
+)
 from datetime import datetime
-from sqlalchemy import or_, text
+import json
+from sqlalchemy import or_, text, tuple_
 from functools import wraps
+from sqlalchemy.orm.exc import StaleDataError
 from api.routes.auth import login_required
+from api.utils.xlsx_export import xlsx_response
+from api.utils.profit_summary import drop_project_profit, period_start
+from api.utils.region import ensure_region_ids, region_index
+from api.utils.pricing import parse_tonnage_limits, tier_errors
+from api.utils.carrier import order_carrier_name, project_carriers
+from api.utils.admission import admission_controlled
+from api.utils.statement_timeout import check_query_scope, is_query_interrupted, statement_timeout
+from api.utils.dry_run import READ_ONLY_ISOLATION_SQL, dry_run_response, dry_run_supported, is_dry_run
 
 def transactional(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
             # 设置事务隔离级别为REPEATABLE READ
-            db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+            if getattr(f, 'dry_run_supported', False) and is_dry_run():
+                # 预校验使用只读事务：一致性快照读，不加锁
+                db.session.execute(text(READ_ONLY_ISOLATION_SQL))
+            else:
+                db.session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
             
             # 执行函数
             result = f(*args, **kwargs)
@@ -20,6 +37,10 @@ def transactional(f):
             # 提交事务
             db.session.commit()
             return result
+        except StaleDataError:
+            # 乐观锁冲突：版本号已被其他事务修改
+            db.session.rollback()
+            return error_response(ErrorCode.VERSION_CONFLICT)
         except Exception as e:
             # 回滚事务
             db.session.rollback()
@@ -40,6 +61,7 @@ TRANSPORT_TYPES = ['整车运输', '零担运输']
 def validate_price_config(price_config):
     errors = []
     unique_keys = set()
+    route_tiers = {}
 
     for index, item in enumerate(price_config):
         # 校验必填字段
@@ -47,20 +69,178 @@ def validate_price_config(price_config):
            not item['destination_province'] or not item['destination_city']:
             errors.append(f"第 {index + 1} 行：出发地和到达地的省市信息不能为空")
 
-        # 校验唯一性
-        key = f"{item['departure_province']}-{item['departure_city']}-{item['destination_province']}-{item['destination_city']}"
+        # 校验吨位区间
+        lower, upper, limit_error = parse_tonnage_limits(item)
+        if limit_error:
+            errors.append(f"第 {index + 1} 行：{limit_error}")
+            continue
+
+        # 校验唯一性，同一线路可按吨位下限配置多个档位
+        route = f"{item['departure_province']}{item['departure_city']}-{item['destination_province']}{item['destination_city']}"
+        key = (route, lower)
         if key in unique_keys:
-            errors.append(f"第 {index + 1} 行：出发地-到达地组合重复")
+            errors.append(f"第 {index + 1} 行：出发地-到达地-吨位下限组合重复")
         unique_keys.add(key)
+        route_tiers.setdefault(route, []).append((index + 1, lower, upper))
 
         # 校验价格
         if not isinstance(item['price'], (int, float)) or item['price'] <= 0:
             errors.append(f"第 {index + 1} 行：价格必须是大于0的数字")
 
+    # 同一线路的吨位区间不能重叠或间断
+    errors.extend(tier_errors(route_tiers))
     return len(errors) == 0, errors
 
+# 查询项目名称时每条语句包含的名称数量
+PROJECT_NAME_QUERY_BATCH_SIZE = 1000
+
+def find_taken_project_names(base_names):
+    """
+    查询已被占用的项目名称：与给定名称相同，或形如"名称_数字"的后缀名称
+    :param base_names: 待上传的项目名称集合
+    :return: 已占用名称的集合
+    """
+    base_names = list(base_names)
+    taken_names = set()
+    for start in range(0, len(base_names), PROJECT_NAME_QUERY_BATCH_SIZE):
+        batch = base_names[start:start + PROJECT_NAME_QUERY_BATCH_SIZE]
+        conditions = [ProjectInfo.project_name.in_(batch)]
+        for name in batch:
+            escaped = name.replace('/', '//').replace('%', '/%').replace('_', '/_')
+            conditions.append(ProjectInfo.project_name.like(f"{escaped}/_%", escape='/'))
+        rows = db.session.query(ProjectInfo.project_name).filter(or_(*conditions)).all()
+        taken_names.update(row.project_name for row in rows)
+    return taken_names
+
+# 价格配置UPSERT每批行数
+PRICE_CONFIG_UPSERT_BATCH_SIZE = 500
+
+def upsert_price_configs(rows):
+    """
+    基于 idx_unique 唯一约束批量写入价格配置，已存在的线路档位更新单价和吨位上限，不存在的新增
+    依赖包含 tonnage_lower_limit 的 idx_unique（已有数据库见 flask upgrade-price-config-key）
+    已逻辑删除的同线路档位会被恢复
+    :param rows: 价格配置行字典列表，同一线路的同一吨位下限只能出现一次
+    :return: (新增条数, 更新条数)
+    """
+    table = ProjectPriceConfig.__table__
+    conflict_columns = ['project_id', 'departure_province', 'departure_city',
+                        'destination_province', 'destination_city', 'tonnage_lower_limit']
+    is_mysql = db.session.get_bind().dialect.name == 'mysql'
+    inserted_count = 0
+    updated_count = 0
+
+    for start in range(0, len(rows), PRICE_CONFIG_UPSERT_BATCH_SIZE):
+        batch = rows[start:start + PRICE_CONFIG_UPSERT_BATCH_SIZE]
+
+        if not is_mysql:
+            # 其他数据库的影响行数不区分新增和更新，先统计已存在的线路数
+            existing_count = db.session.query(db.func.count(ProjectPriceConfig.id)).filter(
+                tuple_(*[table.c[column] for column in conflict_columns]).in_(
+                    [tuple(row[column] for column in conflict_columns) for row in batch]
+                )
+            ).scalar()
+
+        result = db.session.execute(build_upsert(
+            table, batch, conflict_columns,
+            lambda new: {
+                'unit_price': new.unit_price,
+                'tonnage_upper_limit': new.tonnage_upper_limit,
+                'project_name': new.project_name,
+                'departure_region_id': new.departure_region_id,
+                'destination_region_id': new.destination_region_id,
+                'is_deleted': 0,
+                'version': table.c.version + 1
+            }
+        ))
+
+        if is_mysql:
+            # MySQL：新增的行影响行数为1，更新的行为2（版本号自增保证行一定变化）
+            batch_updated = result.rowcount - len(batch)
+        else:
+            batch_updated = existing_count
+        updated_count += batch_updated
+        inserted_count += len(batch) - batch_updated
+
+    return inserted_count, updated_count
+
+# 停用旧档位时每条语句包含的线路数量
+PRICE_ROUTE_QUERY_BATCH_SIZE = 500
+
+def retire_missing_tiers(rows):
+    """
+    上传的线路以本次上传的吨位档位为准，逻辑删除这些线路上本次没有上传的旧档位
+    :param rows: 待写入的价格配置行字典列表
+    :return: 逻辑删除的档位数量
+    """
+    route_columns = ['project_id', 'departure_province', 'departure_city',
+                     'destination_province', 'destination_city']
+    uploaded = {}
+    for row in rows:
+        uploaded.setdefault(tuple(row[column] for column in route_columns), set()).add(row['tonnage_lower_limit'])
+
+    routes = list(uploaded)
+    retired = 0
+    for start in range(0, len(routes), PRICE_ROUTE_QUERY_BATCH_SIZE):
+        batch = routes[start:start + PRICE_ROUTE_QUERY_BATCH_SIZE]
+        configs = ProjectPriceConfig.query.filter(
+            tuple_(*[getattr(ProjectPriceConfig, column) for column in route_columns]).in_(batch),
+            ProjectPriceConfig.is_deleted == 0
+        ).all()
+        for config in configs:
+            route = tuple(getattr(config, column) for column in route_columns)
+            if config.tonnage_lower_limit not in uploaded[route]:
+                config.is_deleted = config.id
+                retired += 1
+    db.session.flush()
+    return retired
+
+def preview_price_configs(rows):
+    """
+    预校验价格配置上传：按 idx_unique 查找已存在的档位，计算每行是新增还是更新以及将停用的旧档位，不写入
+    :param rows: 待写入的价格配置行字典列表
+    :return: (预览行列表, 新增条数, 更新条数, 停用条数)
+    """
+    route_columns = ['project_id', 'departure_province', 'departure_city',
+                     'destination_province', 'destination_city']
+    uploaded = {}
+    for row in rows:
+        uploaded.setdefault(tuple(row[column] for column in route_columns), set()).add(row['tonnage_lower_limit'])
+
+    # (线路, 吨位下限) -> 已存在的配置，包括会被UPSERT恢复的已删除档位
+    existing = {}
+    retired_count = 0
+    routes = list(uploaded)
+    for start in range(0, len(routes), PRICE_ROUTE_QUERY_BATCH_SIZE):
+        batch = routes[start:start + PRICE_ROUTE_QUERY_BATCH_SIZE]
+        configs = ProjectPriceConfig.query.filter(
+            tuple_(*[getattr(ProjectPriceConfig, column) for column in route_columns]).in_(batch)
+        ).all()
+        for config in configs:
+            route = tuple(getattr(config, column) for column in route_columns)
+            existing[(route, config.tonnage_lower_limit)] = config
+            if config.is_deleted == 0 and config.tonnage_lower_limit not in uploaded[route]:
+                retired_count += 1
+
+    preview = []
+    for row in rows:
+        config = existing.get((tuple(row[column] for column in route_columns), row['tonnage_lower_limit']))
+        preview.append({
+            'project_name': row['project_name'],
+            'route': f"{row['departure_province']}{row['departure_city']}-"
+                     f"{row['destination_province']}{row['destination_city']}",
+            'tonnage_lower_limit': row['tonnage_lower_limit'],
+            'tonnage_upper_limit': row['tonnage_upper_limit'],
+            'unit_price': float(row['unit_price']),
+            'action': 'update' if config is not None else 'insert',
+            'previous_unit_price': float(config.unit_price) if config is not None and config.is_deleted == 0 else None
+        })
+    inserted_count = sum(1 for item in preview if item['action'] == 'insert')
+    return preview, inserted_count, len(preview) - inserted_count, retired_count
+
 @project.route('/list', methods=['POST'])
 @login_required
+@conditional_query(ProjectInfo)
 def get_projects():
     """获取项目列表，支持分页和搜索"""
     data = request.get_json()
@@ -86,7 +266,8 @@ def get_projects():
             'customer_name': project.customer_name,
             'start_date': project.start_date.isoformat(),
             'end_date': project.end_date.isoformat(),
-            'project_description': project.project_description
+            'project_description': project.project_description,
+            'version': project.version
         }
         for project in projects
     ]
@@ -107,43 +288,36 @@ def bulk_add_projects():
     if (not projects_data) or (not projects_data.get('upload_list')):
         return error_response(ErrorCode.BAD_REQUEST)
 
+    upload_list = projects_data.get('upload_list')
+
+    # 一次查询出与上传名称同名或带数字后缀的已有项目名称（含已删除项目，项目名称全局唯一）
+    taken_names = find_taken_project_names({project['project_name'] for project in upload_list})
+
+    # 在内存中分配不冲突的名称，同一次上传内的重名同样追加后缀
+    next_suffix = {}
     new_projects = []
-    for project in projects_data.get('upload_list'):
-        existing_project = ProjectInfo.query.filter_by(
-            project_name=project['project_name'],
-            is_deleted=0
-        ).with_for_update().first()
-        
-        if not existing_project:
-            new_project = ProjectInfo(
-                project_name=project['project_name'],
-                customer_name=project['customer_name'],
-                start_date=project['start_date'],
-                end_date=project['end_date'],
-                project_description=project.get('project_description', '')
-            )
-            new_projects.append(new_project)
-        else:
-            suffix = 1
-            while True:
-                new_project_name = f"{project['project_name']}_{suffix}"
-                if not ProjectInfo.query.filter_by(
-                    project_name=new_project_name,
-                    is_deleted=0
-                ).first():
-                    new_project = ProjectInfo(
-                        project_name=new_project_name,
-                        customer_name=project['customer_name'],
-                        start_date=project['start_date'],
-                        end_date=project['end_date'],
-                        project_description=project.get('project_description', '')
-                    )
-                    new_projects.append(new_project)
-                    break
+    for project in upload_list:
+        base_name = project['project_name']
+        project_name = base_name
+        if project_name in taken_names:
+            suffix = next_suffix.get(base_name, 1)
+            while f"{base_name}_{suffix}" in taken_names:
                 suffix += 1
+            project_name = f"{base_name}_{suffix}"
+            next_suffix[base_name] = suffix + 1
+        taken_names.add(project_name)
+
+        new_projects.append({
+            'project_name': project_name,
+            'customer_name': project['customer_name'],
+            'start_date': project['start_date'],
+            'end_date': project['end_date'],
+            'project_description': project.get('project_description', '')
+        })
 
     if new_projects:
-        db.session.add_all(new_projects)
+        db.session.bulk_insert_mappings(ProjectInfo, new_projects)
+        mark_tables_changed(ProjectInfo)
         return success_response()
     else:
         return error_response(ErrorCode.PROJECTS_ALL_EXISTED)
@@ -155,16 +329,29 @@ def edit_project():
     """编辑项目信息"""
     data = request.json
     id = data.get('id')
-    project = ProjectInfo.query.filter_by(id=id, is_deleted=0).with_for_update().first()
+    # 不再对项目加行锁，并发修改由版本号（乐观锁）在提交时检测
+    project = ProjectInfo.query.filter_by(id=id, is_deleted=0).first()
     if not project:
         return error_response(ErrorCode.PROJECT_NOT_FOUND)
 
+    # 客户端携带版本号时，校验编辑的是否为最新数据
+    if data.get('version') is not None and int(data['version']) != project.version:
+        return error_response(ErrorCode.VERSION_CONFLICT)
+
     project.project_name = data.get('project_name', project.project_name)
     project.customer_name = data.get('customer_name', project.customer_name)
     project.start_date = datetime.strptime(data.get('start_date'), '%Y-%m-%d').date()
     project.end_date = datetime.strptime(data.get('end_date'), '%Y-%m-%d').date()
     project.project_description = data.get('project_description', project.project_description)
-
+    if 'order_column_mapping' in data:
+        # 订单文件导入列映射，{表头: 字段}，传空值恢复默认映射
+        mapping = data.get('order_column_mapping')
+        if mapping and not isinstance(mapping, dict):
+            return error_response(ErrorCode.BAD_REQUEST, '列映射必须是"表头: 字段"形式的对象')
+        project.order_column_mapping = json.dumps(mapping, ensure_ascii=False) if mapping else None
+
+    # 立即刷新，版本冲突时抛出StaleDataError由装饰器处理
+    db.session.flush()
     return success_response(project.to_dict())
 
 @project.route('/delete', methods=['POST'])
@@ -193,6 +380,9 @@ def delete_project():
             print(f"[事务处理] 设置订单{order.sub_order_number} is_deleted={order.id}")
             db.session.add(order)
         
+        # 删除项目的利润日汇总
+        drop_project_profit(project.id)
+
         # 逻辑删除项目
         project.is_deleted = project.id
         print(f"[事务处理] 设置项目is_deleted={project.id}")
@@ -279,8 +469,14 @@ def create_project():
         db.session.add(new_project)
         db.session.flush()
 
+        # 与上传价格配置一致，省市名称规范为地区ID，字典中没有的省市随价格配置一起新增
+        region_ids = ensure_region_ids(
+            [(config['departure_province'], config['departure_city']) for config in data['price_config']] +
+            [(config['destination_province'], config['destination_city']) for config in data['price_config']]
+        )
         price_configs = []
         for config in data['price_config']:
+            tonnage_lower_limit, tonnage_upper_limit, _ = parse_tonnage_limits(config)
             price_config = ProjectPriceConfig(
                 project_id=new_project.id,
                 project_name=new_project.project_name,
@@ -288,8 +484,10 @@ def create_project():
                 departure_city=config['departure_city'],
                 destination_province=config['destination_province'],
                 destination_city=config['destination_city'],
-                tonnage_upper_limit=999999,
-                tonnage_lower_limit=0,
+                departure_region_id=region_ids[(config['departure_province'], config['departure_city'])],
+                destination_region_id=region_ids[(config['destination_province'], config['destination_city'])],
+                tonnage_upper_limit=tonnage_upper_limit,
+                tonnage_lower_limit=tonnage_lower_limit,
                 unit_price=config['price']
             )
             price_configs.append(price_config)
@@ -306,6 +504,7 @@ def create_project():
 
 @project.route('/price_config/list', methods=['POST'])
 @login_required
+@conditional_query(ProjectInfo, ProjectPriceConfig)
 def query_project_price_config():
     """查询项目价格配置"""
     data = request.get_json()
@@ -357,7 +556,10 @@ def query_project_price_config():
             'departure_city': item.departure_city,
             'destination_province': item.destination_province,
             'destination_city': item.destination_city,
-            'unit_price': float(item.unit_price)
+            'tonnage_lower_limit': item.tonnage_lower_limit,
+            'tonnage_upper_limit': item.tonnage_upper_limit,
+            'unit_price': float(item.unit_price),
+            'version': item.version
         } for item in items]
 
         return success_response({
@@ -373,16 +575,20 @@ def query_project_price_config():
 
 @project.route('/price_config/upload', methods=['POST'])
 @login_required
+@admission_controlled('import')
 @transactional
+@dry_run_supported
 def upload_project_price_config():
-    """批量上传项目价格配置"""
+    """批量上传项目价格配置，dry_run 为真时只校验并返回新增/更新/停用预览"""
     price_data = request.get_json()
     if (not price_data) or (not price_data.get('upload_list')):
         return error_response(ErrorCode.BAD_REQUEST)
+    dry_run = is_dry_run()
 
-    new_prices = []
-    updated_prices = []
+    upsert_rows = []
     error_messages = []
+    unique_keys = set()
+    route_tiers = {}
 
     # 收集所有需要查询的项目ID和名称
     project_ids = set()
@@ -391,41 +597,17 @@ def upload_project_price_config():
         project_ids.add(price['project_id'])
         project_names.add(price['project_name'])
 
-    # 批量查询所有相关项目
-    projects = ProjectInfo.query.filter(
+    # 批量查询所有相关项目，共享锁防止上传期间项目被删除，不阻塞其他上传；预校验只做快照读
+    projects_query = ProjectInfo.query.filter(
         ProjectInfo.id.in_(list(project_ids)),
         ProjectInfo.project_name.in_(list(project_names)),
         ProjectInfo.is_deleted == 0
-    ).with_for_update().all()
+    )
+    projects = (projects_query if dry_run else projects_query.with_for_update(read=True)).all()
 
     # 创建项目查找字典 (project_id, project_name) -> project
     project_dict = {(p.id, p.project_name): p for p in projects}
 
-    # 收集所有价格配置的关键信息用于批量查询
-    price_keys = []
-    for price in price_data.get('upload_list'):
-        price_keys.append((
-            price['project_id'],
-            price['departure_province'],
-            price['departure_city'],
-            price['destination_province'],
-            price['destination_city']
-        ))
-
-    # 批量查询现有的价格配置
-    existing_prices = ProjectPriceConfig.query.filter(
-        db.and_(
-            ProjectPriceConfig.project_id.in_([pk[0] for pk in price_keys]),
-            ProjectPriceConfig.is_deleted == 0
-        )
-    ).with_for_update().all()
-
-    # 创建价格配置查找字典
-    price_config_dict = {
-        (p.project_id, p.departure_province, p.departure_city, p.destination_province, p.destination_city): p 
-        for p in existing_prices
-    }
-
     for index, price in enumerate(price_data.get('upload_list')):
         sheet_index = index + 2
         project_key = (price['project_id'], price['project_name'])
@@ -446,49 +628,82 @@ def upload_project_price_config():
             error_messages.append(f"第{sheet_index}行：出发地和到达地的省市信息不能为空")
             continue
 
-        # 使用字典查找现有价格配置
-        price_key = (price['project_id'], departure_province, departure_city, destination_province, destination_city)
-        existing_price = price_config_dict.get(price_key)
+        lower, upper, limit_error = parse_tonnage_limits(price)
+        if limit_error:
+            error_messages.append(f"第{sheet_index}行：{limit_error}")
+            continue
 
-        if existing_price:
-            # 更新已存在的价格配置
-            existing_price.unit_price = price['unit_price']
-            updated_prices.append(existing_price)
-        else:
-            # 创建新的价格配置
-            new_price = ProjectPriceConfig(
-                project_id=price['project_id'],
-                project_name=price['project_name'],
-                departure_province=departure_province,
-                departure_city=departure_city,
-                destination_province=destination_province,
-                destination_city=destination_city,
-                tonnage_upper_limit=999999,
-                tonnage_lower_limit=0,
-                unit_price=price['unit_price']
-            )
-            new_prices.append(new_price)
+        # 校验上传数据内的唯一性，同一线路档位在一条UPSERT语句中出现多次会导致计数失真
+        price_key = (price['project_id'], departure_province, departure_city, destination_province, destination_city, lower)
+        if price_key in unique_keys:
+            error_messages.append(f"第{sheet_index}行：出发地-到达地-吨位下限组合重复")
+            continue
+        unique_keys.add(price_key)
+        route_name = f"{project.project_name}：{departure_province}{departure_city}-{destination_province}{destination_city}"
+        route_tiers.setdefault(route_name, []).append((sheet_index, lower, upper))
+
+        upsert_rows.append({
+            'project_id': price['project_id'],
+            'project_name': price['project_name'],
+            'departure_province': departure_province,
+            'departure_city': departure_city,
+            'destination_province': destination_province,
+            'destination_city': destination_city,
+            'tonnage_upper_limit': upper,
+            'tonnage_lower_limit': lower,
+            'unit_price': price['unit_price']
+        })
+
+    # 同一线路上传的吨位区间不能重叠或间断
+    error_messages.extend(tier_errors(route_tiers))
 
     try:
+        if dry_run:
+            preview, inserted_count, updated_count, retired_count = preview_price_configs(upsert_rows)
+            # 字典中不存在的省市在正式上传时随价格配置一起新增
+            regions = region_index()
+            new_regions = sorted({
+                f"{province}{city}" for row in upsert_rows
+                for province, city in ((row['departure_province'], row['departure_city']),
+                                       (row['destination_province'], row['destination_city']))
+                if regions.city_id(province, city) is None
+            })
+            print(f"[预校验] 上传价格配置，有效{len(upsert_rows)}行，错误{len(error_messages)}条")
+            return dry_run_response(
+                error_messages, preview,
+                inserted_count=inserted_count,
+                updated_count=updated_count,
+                retired_count=retired_count,
+                new_regions=new_regions
+            )
+
         if error_messages:
             error_message = "\n".join(error_messages)
             return error_response(ErrorCode.BAD_REQUEST, error_message)
 
-        # 批量更新和新增
-        if updated_prices:
-            # 将更新列表转换为字典列表格式
-            update_mappings = [{
-                'id': price.id,
-                'unit_price': price.unit_price
-            } for price in updated_prices]
-            # 执行批量更新
-            db.session.bulk_update_mappings(ProjectPriceConfig, update_mappings)
-            
-        if new_prices:
-            db.session.add_all(new_prices)
+        # 省市名称规范为地区ID，字典中没有的省市随价格配置一起新增
+        region_ids = ensure_region_ids(
+            [(row['departure_province'], row['departure_city']) for row in upsert_rows] +
+            [(row['destination_province'], row['destination_city']) for row in upsert_rows]
+        )
+        for row in upsert_rows:
+            row['departure_region_id'] = region_ids[(row['departure_province'], row['departure_city'])]
+            row['destination_region_id'] = region_ids[(row['destination_province'], row['destination_city'])]
 
+        # 上传的线路以本次的吨位档位为准，停用未再上传的旧档位
+        retired_count = retire_missing_tiers(upsert_rows)
+
+        # 基于 idx_unique 唯一约束批量UPSERT，无需加载已有价格配置
+        inserted_count, updated_count = upsert_price_configs(upsert_rows)
+
+        message = f'成功更新{updated_count}条记录，新增{inserted_count}条记录'
+        if retired_count:
+            message += f'，停用{retired_count}个旧吨位档位'
         return success_response({
-            'message': f'成功更新{len(updated_prices)}条记录，新增{len(new_prices)}条记录'
+            'message': message,
+            'inserted_count': inserted_count,
+            'updated_count': updated_count,
+            'retired_count': retired_count
         })
     except Exception as e:
         print(f"[事务回滚] 上传价格配置失败：{str(e)}")
@@ -515,18 +730,13 @@ def get_carrier_list():
 
         print(f"找到项目，ID: {project.id}")
 
-        # 查询该项目下的所有不同承运人
-        carriers = db.session.query(
-            Order.carrier_name
-        ).filter(
-            Order.project_id == project.id,
-            Order.is_deleted == 0,
-            Order.carrier_name.isnot(None),  # 排除 null 值
-            Order.carrier_name != ''  # 排除空字符串
-        ).distinct().all()
+        # 从承运人维度表查询该项目下仍有订单的承运人
+        carriers = project_carriers(project.id)
         
-        # 转换为列表，过滤掉 None 值
-        carrier_list = [carrier[0] for carrier in carriers if carrier[0] is not None and carrier[0].strip() != '']
+        # 转换为名称列表，同名不同联系方式的承运人只保留一个
+        carrier_list = list(dict.fromkeys(
+            carrier.carrier_name for carrier in carriers if carrier.carrier_name.strip() != ''
+        ))
         
         print(f"找到承运人列表: {carrier_list}")
         
@@ -538,6 +748,9 @@ def get_carrier_list():
 
 @project.route('/profit/list', methods=['POST'])
 @login_required
+@conditional_query(ProjectInfo, Order, Carrier)
+@admission_controlled('report')
+@statement_timeout('report')
 def query_project_profit():
     """查询项目利润数据"""
     data = request.get_json()
@@ -572,9 +785,11 @@ def query_project_profit():
         else:
             select_fields.append(db.literal('全部').label('city'))
             
+        carrier_name = order_carrier_name()
         if 'carrier' in group_by:
-            select_fields.append(Order.carrier_name.label('carrier'))
-            group_by_fields.append(Order.carrier_name)
+            # 承运人名称取自承运人维度表，未回填 carrier_id 的订单取订单上的名称
+            select_fields.append(carrier_name.label('carrier'))
+            group_by_fields.append(carrier_name)
         else:
             select_fields.append(db.literal('全部').label('carrier'))
         
@@ -587,7 +802,9 @@ def query_project_profit():
         ])
 
         # 构建基础查询
-        query = db.session.query(*select_fields).filter(
+        query = db.session.query(*select_fields).select_from(Order).outerjoin(
+            Carrier, Carrier.id == Order.carrier_id
+        ).filter(
             Order.project_id == project.id,
             Order.carrier_type != None,
             Order.is_deleted == 0
@@ -599,7 +816,12 @@ def query_project_profit():
         if data.get('destination_city'):
             query = query.filter(Order.destination_city == data['destination_city'])
         if data.get('carriers'):
-            query = query.filter(Order.carrier_name.in_(data['carriers']))
+            query = query.filter(carrier_name.in_(data['carriers']))
+        # 按下单日期筛选，订单表分区后可裁剪到相关分区
+        if data.get('order_date_start'):
+            query = query.filter(Order.order_date >= datetime.strptime(data['order_date_start'], '%Y-%m-%d').date())
+        if data.get('order_date_end'):
+            query = query.filter(Order.order_date <= datetime.strptime(data['order_date_end'], '%Y-%m-%d').date())
 
         # 添加分组
         if group_by_fields:
@@ -635,9 +857,89 @@ def query_project_profit():
         })
 
     except Exception as e:
+        if is_query_interrupted(e):
+            raise
         print(f"查询项目利润数据失败：{str(e)}")
         return error_response(ErrorCode.INTERNAL_SERVER_ERROR, str(e))
 
+PROFIT_GRANULARITIES = ('day', 'week', 'month')
+
+@project.route('/profit/timeseries', methods=['POST'])
+@login_required
+@conditional_query(ProjectInfo, ProjectProfitDaily)
+@admission_controlled('report')
+@statement_timeout('report')
+def query_project_profit_timeseries():
+    """
+    按日/周/月查询项目利润走势
+    数据来自利润日汇总表 project_profit_daily，查询量与天数相关而与订单数无关
+    """
+    data = request.get_json() or {}
+
+    try:
+        project = ProjectInfo.query.filter_by(
+            project_name=data.get('project_name'),
+            is_deleted=0
+        ).first()
+        if not project:
+            return error_response(ErrorCode.PROJECT_NOT_FOUND)
+
+        granularity = data.get('granularity', 'day')
+        if granularity not in PROFIT_GRANULARITIES:
+            return error_response(ErrorCode.BAD_REQUEST, '统计粒度必须为 day、week 或 month')
+
+        daily = ProjectProfitDaily
+        query = db.session.query(
+            daily.stat_date,
+            db.func.sum(daily.order_count).label('order_count'),
+            db.func.sum(daily.weight).label('weight'),
+            db.func.sum(daily.income).label('income'),
+            db.func.sum(daily.expense).label('expense')
+        ).filter(daily.project_id == project.id)
+
+        # 与利润列表一致，默认只统计已送货（已有承运人）的订单
+        if not data.get('include_undelivered'):
+            query = query.filter(daily.carrier_name != '')
+        if data.get('date_start'):
+            query = query.filter(daily.stat_date >= datetime.strptime(data['date_start'], '%Y-%m-%d').date())
+        if data.get('date_end'):
+            query = query.filter(daily.stat_date <= datetime.strptime(data['date_end'], '%Y-%m-%d').date())
+        if data.get('destination_province'):
+            query = query.filter(daily.destination_province == data['destination_province'])
+        if data.get('destination_city'):
+            query = query.filter(daily.destination_city == data['destination_city'])
+        if data.get('carriers'):
+            query = query.filter(daily.carrier_name.in_(data['carriers']))
+
+        # 先按天聚合，再在内存中汇总到周/月，避免依赖数据库方言的日期函数
+        periods = {}
+        for row in query.group_by(daily.stat_date).order_by(daily.stat_date):
+            key = period_start(row.stat_date, granularity)
+            bucket = periods.setdefault(key, {'order_count': 0, 'weight': 0, 'income': 0, 'expense': 0})
+            bucket['order_count'] += int(row.order_count or 0)
+            bucket['weight'] += float(row.weight or 0)
+            bucket['income'] += float(row.income or 0)
+            bucket['expense'] += float(row.expense or 0)
+
+        items = [{
+            'period': key.strftime('%Y-%m-%d'),
+            'order_count': bucket['order_count'],
+            'weight': round(bucket['weight'], 3),
+            'income': round(bucket['income'], 2),
+            'expense': round(bucket['expense'], 2),
+            'profit': round(bucket['income'] - bucket['expense'], 2)
+        } for key, bucket in periods.items()]
+
+        return success_response({'granularity': granularity, 'items': items})
+
+    except ValueError:
+        return error_response(ErrorCode.BAD_REQUEST, '日期格式必须为YYYY-MM-DD')
+    except Exception as e:
+        if is_query_interrupted(e):
+            raise
+        print(f"查询项目利润走势失败：{str(e)}")
+        return error_response(ErrorCode.INTERNAL_SERVER_ERROR, str(e))
+
 @project.route('/price_config/delete', methods=['POST'])
 @login_required
 @transactional
@@ -647,14 +949,18 @@ def delete_price_config():
     id = data.get('id')
     
     try:
-        # 查找价格配置
+        # 查找价格配置，不加行锁，并发修改由版本号（乐观锁）在提交时检测
         price_config = ProjectPriceConfig.query.filter_by(
             id=id,
             is_deleted=0
-        ).with_for_update().first()
+        ).first()
         
         if not price_config:
             return error_response(ErrorCode.BAD_REQUEST, "价格配置不存在")
+
+        # 客户端携带版本号时，校验删除的是否为最新数据
+        if data.get('version') is not None and int(data['version']) != price_config.version:
+            return error_response(ErrorCode.VERSION_CONFLICT)
         
         # 逻辑删除
         price_config.is_deleted = price_config.id
@@ -667,6 +973,8 @@ def delete_price_config():
 
 @project.route('/profit/export', methods=['POST'])
 @login_required
+@admission_controlled('export')
+@statement_timeout('export')
 def export_project_profit():
     """导出项目利润数据"""
     data = request.get_json()
@@ -701,9 +1009,11 @@ def export_project_profit():
         else:
             select_fields.append(db.literal('全部').label('city'))
             
+        carrier_name = order_carrier_name()
         if 'carrier' in group_by:
-            select_fields.append(Order.carrier_name.label('carrier'))
-            group_by_fields.append(Order.carrier_name)
+            # 承运人名称取自承运人维度表，未回填 carrier_id 的订单取订单上的名称
+            select_fields.append(carrier_name.label('carrier'))
+            group_by_fields.append(carrier_name)
         else:
             select_fields.append(db.literal('全部').label('carrier'))
         
@@ -716,7 +1026,9 @@ def export_project_profit():
         ])
 
         # 构建基础查询
-        query = db.session.query(*select_fields).filter(
+        query = db.session.query(*select_fields).select_from(Order).outerjoin(
+            Carrier, Carrier.id == Order.carrier_id
+        ).filter(
             Order.project_id == project.id,
             Order.carrier_type != None,
             Order.is_deleted == 0
@@ -728,12 +1040,21 @@ def export_project_profit():
         if data.get('destination_city'):
             query = query.filter(Order.destination_city == data['destination_city'])
         if data.get('carriers'):
-            query = query.filter(Order.carrier_name.in_(data['carriers']))
+            query = query.filter(carrier_name.in_(data['carriers']))
+        # 按下单日期筛选，订单表分区后可裁剪到相关分区
+        if data.get('order_date_start'):
+            query = query.filter(Order.order_date >= datetime.strptime(data['order_date_start'], '%Y-%m-%d').date())
+        if data.get('order_date_end'):
+            query = query.filter(Order.order_date <= datetime.strptime(data['order_date_end'], '%Y-%m-%d').date())
 
         # 添加分组
         if group_by_fields:
             query = query.group_by(*group_by_fields)
 
+        # 导出为Excel文件：服务端只写模式生成并流式返回
+        if data.get('format') == 'xlsx':
+            return export_profit_xlsx(project, query, data.get('with_summary', False))
+
         # 获取所有数据
         items = query.all()
         
@@ -753,5 +1074,39 @@ def export_project_profit():
         })
 
     except Exception as e:
+        if is_query_interrupted(e):
+            raise
         print(f"导出项目利润数据失败：{str(e)}")
-        return error_response(ErrorCode.INTERNAL_SERVER_ERROR, str(e)) 
\ No newline at end of file
+        return error_response(ErrorCode.INTERNAL_SERVER_ERROR, str(e))
+
+# 利润导出Excel的表头，与JSON导出字段一致
+PROFIT_EXPORT_HEADERS = ['到达省', '到达市', '承运人', '重量（吨）', '收入（元）', '支出（元）', '利润（元）']
+
+def export_profit_xlsx(project, query, with_summary=False):
+    """
+    以只写模式生成项目利润Excel并流式返回
+    :param project: 项目对象
+    :param query: 已添加筛选和分组的利润聚合查询
+    :param with_summary: 是否在末尾追加合计行
+    :return: Flask流式响应
+    """
+    totals = [0, 0, 0, 0]
+
+    def rows():
+        for item in query.yield_per(1000):
+            check_query_scope()
+            values = [float(item.weight or 0), float(item.income or 0),
+                      float(item.expense or 0), float(item.profit or 0)]
+            totals[:] = [total + value for total, value in zip(totals, values)]
+            yield [item.province, item.city, item.carrier or '-'] + values
+
+    def summary():
+        return [['合计', '', '', round(totals[0], 3)] + [round(total, 2) for total in totals[1:]]]
+
+    return xlsx_response(
+        f"{project.project_name}_利润表_{datetime.now().strftime('%Y-%m-%d')}.xlsx",
+        '利润表',
+        PROFIT_EXPORT_HEADERS,
+        rows(),
+        summary if with_summary else None
+    )
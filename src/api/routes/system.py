@@ -0,0 +1,60 @@
+"""
+系统运行状态路由模块
+System status routes
+"""
+import os
+from flask import Blueprint, request, send_from_directory
+from api.enum.error_code import ErrorCode
+from api.utils import success_response, error_response
+from api.utils.admission import admission_metrics
+from api.utils.slow_query import recent_slow_queries, slow_query_report
+from api.utils.profiling import PROFILE_DIR, profile_file, recent_profiles
+from api.routes.auth import login_required
+
+system = Blueprint('system', __name__)
+
+@system.route('/admission', methods=['GET'])
+@login_required
+def get_admission_metrics():
+    """各类重接口的准入状态：当前执行数、排队深度和累计的放行、拒绝、超时次数"""
+    try:
+        return success_response(admission_metrics())
+    except OSError as e:
+        print(f"读取准入状态失败：{str(e)}")
+        return error_response(ErrorCode.INTERNAL_SERVER_ERROR, str(e))
+
+@system.route('/slow_queries', methods=['GET'])
+@login_required
+def get_slow_queries():
+    """
+    慢查询日志
+    查询参数 mode=recent（默认，最近的记录）或 top（按语句形状汇总），limit 为返回条数
+    """
+    try:
+        limit = int(request.args.get('limit', 100))
+        if request.args.get('mode') == 'top':
+            return success_response(slow_query_report(top=limit))
+        return success_response(recent_slow_queries(limit=limit))
+    except ValueError:
+        return error_response(ErrorCode.BAD_REQUEST, 'limit必须为整数')
+    except OSError as e:
+        print(f"读取慢查询日志失败：{str(e)}")
+        return error_response(ErrorCode.INTERNAL_SERVER_ERROR, str(e))
+
+@system.route('/profiles', methods=['GET'])
+@login_required
+def get_profiles():
+    """最近的请求性能分析结果，查询参数 limit 为返回条数"""
+    try:
+        return success_response(recent_profiles(limit=int(request.args.get('limit', 50))))
+    except ValueError:
+        return error_response(ErrorCode.BAD_REQUEST, 'limit必须为整数')
+
+@system.route('/profiles/<profile_id>', methods=['GET'])
+@login_required
+def download_profile(profile_id):
+    """下载性能分析结果（.collapsed 或 .pstats）"""
+    filename = profile_file(profile_id)
+    if filename is None:
+        return error_response(ErrorCode.NOT_FOUND, '分析结果不存在')
+    return send_from_directory(os.path.abspath(PROFILE_DIR), filename, as_attachment=True)
@@ -5,11 +5,18 @@ Utility package initialization file
 
 from .response import success_response, error_response, handle_exceptions, register_error_handlers
 from .sitemap import generate_sitemap
+from .upsert import build_upsert
+from .sequence import allocate_sub_order_seqs
+from .change_counter import mark_tables_changed, conditional_query
 
 __all__ = [
     'success_response',
     'error_response',
     'handle_exceptions',
     'register_error_handlers',
-    'generate_sitemap'
+    'generate_sitemap',
+    'build_upsert',
+    'allocate_sub_order_seqs',
+    'mark_tables_changed',
+    'conditional_query'
 ] 
\ No newline at end of file
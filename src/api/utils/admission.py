@@ -0,0 +1,229 @@
+"""
+准入控制模块
+Admission control for heavy endpoints
+
+导入、导出等重接口按类别限制同时执行的请求数，超出后在有界队列中等待，队列已满或等待超时返回429并带 Retry-After。
+限制在同一台机器的所有gunicorn worker之间共享，状态全部保存在文件锁中（ADMISSION_LOCK_DIR）：
+- 每个类别有 limit 个执行槽文件和 queue 个排队槽文件，请求持有执行槽的独占 flock 期间执行
+- 排队的请求先占一个排队槽，再轮询执行槽；排队槽也占满时立即拒绝
+- 有请求在排队时新到的请求不直接抢执行槽，也进入队列，避免轮询的排队请求被持续插队
+- flock 随文件描述符释放，worker 异常退出不会遗留占用
+- 当前执行数和排队数通过试探各槽位的锁得到，累计计数保存在每个类别的统计文件中
+
+配置（环境变量，<CLASS> 为类别名大写）：
+ADMISSION_<CLASS>_LIMIT、ADMISSION_<CLASS>_QUEUE、ADMISSION_<CLASS>_TIMEOUT（秒），设置 ADMISSION_ENABLED=0 关闭准入控制
+"""
+import fcntl
+import json
+import math
+import os
+import tempfile
+import time
+from functools import wraps
+
+from flask import make_response
+
+from api.enum.error_code import ErrorCode
+from api.utils.response import error_response
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') != '0'
+ADMISSION_LOCK_DIR = os.getenv('ADMISSION_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'logistics-admission'))
+# 排队时轮询执行槽的间隔（秒）
+ADMISSION_POLL_INTERVAL = 0.05
+
+# 类别 -> (同时执行数, 排队长度, 最长等待秒数)
+DEFAULT_ADMISSION_CLASSES = {
+    'import': (2, 4, 30),
+    'export': (2, 4, 30),
+    'report': (4, 8, 10)
+}
+
+
+def _class_config(name, defaults):
+    limit, queue, timeout = defaults
+    prefix = f'ADMISSION_{name.upper()}_'
+    return {
+        'limit': int(os.getenv(prefix + 'LIMIT', limit)),
+        'queue': int(os.getenv(prefix + 'QUEUE', queue)),
+        'timeout': float(os.getenv(prefix + 'TIMEOUT', timeout))
+    }
+
+
+ADMISSION_CLASSES = {name: _class_config(name, defaults) for name, defaults in DEFAULT_ADMISSION_CLASSES.items()}
+
+STAT_FIELDS = ('admitted', 'queued', 'rejected', 'timed_out', 'total_wait_ms', 'max_wait_ms')
+
+
+def _slot_path(name, kind, index):
+    return os.path.join(ADMISSION_LOCK_DIR, f'{name}.{kind}.{index}.lock')
+
+
+def _try_lock(path):
+    """
+    以非阻塞方式独占锁定槽位文件
+    :return: 成功时返回文件描述符，槽位已被占用时返回None
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+
+def _release(fd):
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+
+def _try_slots(name, kind, count):
+    for index in range(count):
+        fd = _try_lock(_slot_path(name, kind, index))
+        if fd is not None:
+            return fd
+    return None
+
+
+def _busy_slots(name, kind, count):
+    busy = 0
+    for index in range(count):
+        fd = _try_lock(_slot_path(name, kind, index))
+        if fd is None:
+            busy += 1
+        else:
+            _release(fd)
+    return busy
+
+
+def _any_busy(name, kind, count):
+    """
+    是否有槽位被占用，用共享锁试探，多个请求同时试探互不影响
+    """
+    for index in range(count):
+        fd = os.open(_slot_path(name, kind, index), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+    return False
+
+
+def _update_stats(name, **increments):
+    """在统计文件锁内累加计数，wait_ms 同时计入总等待时长和最长等待时长"""
+    path = os.path.join(ADMISSION_LOCK_DIR, f'{name}.stats.json')
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd), 'r+') as f:
+            content = f.read()
+            stats = dict.fromkeys(STAT_FIELDS, 0)
+            if content:
+                stats.update(json.loads(content))
+            wait_ms = increments.pop('wait_ms', None)
+            if wait_ms is not None:
+                stats['total_wait_ms'] += wait_ms
+                stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+            for field, value in increments.items():
+                stats[field] += value
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(stats))
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _read_stats(name):
+    path = os.path.join(ADMISSION_LOCK_DIR, f'{name}.stats.json')
+    stats = dict.fromkeys(STAT_FIELDS, 0)
+    try:
+        with open(path) as f:
+            content = f.read()
+        if content:
+            stats.update(json.loads(content))
+    except (FileNotFoundError, ValueError):
+        pass
+    return stats
+
+
+def _rejected(config, message):
+    response = make_response(error_response(ErrorCode.TOO_MANY_REQUESTS, message), 429)
+    response.headers['Retry-After'] = str(max(1, math.ceil(config['timeout'])))
+    return response
+
+
+def acquire_slot(name):
+    """
+    获取类别的执行槽，必要时排队等待
+    :return: (执行槽文件描述符, None) 或 (None, 429响应)
+    """
+    config = ADMISSION_CLASSES[name]
+    os.makedirs(ADMISSION_LOCK_DIR, exist_ok=True)
+    # 已有请求排队时直接排到队列中，执行槽留给排队的请求
+    if not _any_busy(name, 'queue', config['queue']):
+        slot = _try_slots(name, 'run', config['limit'])
+        if slot is not None:
+            _update_stats(name, admitted=1, wait_ms=0)
+            return slot, None
+
+    queue_slot = _try_slots(name, 'queue', config['queue'])
+    if queue_slot is None:
+        _update_stats(name, rejected=1)
+        return None, _rejected(config, '服务繁忙，同类请求排队已满，请稍后重试')
+
+    start = time.monotonic()
+    try:
+        _update_stats(name, queued=1)
+        deadline = start + config['timeout']
+        while time.monotonic() < deadline:
+            time.sleep(ADMISSION_POLL_INTERVAL)
+            slot = _try_slots(name, 'run', config['limit'])
+            if slot is not None:
+                _update_stats(name, admitted=1, wait_ms=int((time.monotonic() - start) * 1000))
+                return slot, None
+    finally:
+        _release(queue_slot)
+    _update_stats(name, timed_out=1)
+    return None, _rejected(config, '服务繁忙，排队等待超时，请稍后重试')
+
+
+def admission_controlled(name):
+    """
+    重接口的准入控制装饰器
+    :param name: 接口类别，见 ADMISSION_CLASSES
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not ADMISSION_ENABLED:
+                return f(*args, **kwargs)
+            slot, rejected = acquire_slot(name)
+            if rejected is not None:
+                print(f"[准入控制] {name} 类请求被拒绝")
+                return rejected
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _release(slot)
+        return decorated_function
+    return decorator
+
+
+def admission_metrics():
+    """
+    各类别的准入状态：配置、当前执行数、排队数和累计计数
+    :return: {类别: {...}}
+    """
+    os.makedirs(ADMISSION_LOCK_DIR, exist_ok=True)
+    metrics = {}
+    for name, config in ADMISSION_CLASSES.items():
+        metrics[name] = {
+            **config,
+            'running': _busy_slots(name, 'run', config['limit']),
+            'waiting': _busy_slots(name, 'queue', config['queue']),
+            **_read_stats(name)
+        }
+    return metrics
@@ -0,0 +1,111 @@
+"""
+运费分摊计算模块
+Carrier fee allocation module
+
+以"分"为单位的整数运算，按重量、数量或平均方式把每笔运费分摊到订单上，
+使用最大余数法取整，保证每组分摊结果之和严格等于运费总额。
+所有计算基于 NumPy 数组向量化完成，可一次处理多个送货批次。
+"""
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+
+# 分摊依据
+BASIS_WEIGHT = 'weight'
+BASIS_QUANTITY = 'quantity'
+BASIS_EQUAL = 'equal'
+ALLOCATION_BASES = (BASIS_WEIGHT, BASIS_QUANTITY, BASIS_EQUAL)
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """
+    把金额转换为整数"分"
+    :param amount: 金额（数字、字符串或Decimal）
+    :return: 以分为单位的整数
+    """
+    return int((Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100).to_integral_value())
+
+
+def from_cents(cents):
+    """
+    把整数"分"转换为保留两位小数的Decimal
+    :param cents: 以分为单位的整数
+    :return: Decimal金额
+    """
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def allocate_cents(totals, group_index, bases):
+    """
+    向量化的最大余数法分摊
+    Largest-remainder allocation over many groups at once
+
+    :param totals: 每组待分摊的总额（分），长度为组数
+    :param group_index: 每个分摊对象所属的组下标，长度为对象数
+    :param bases: 每个分摊对象的分摊基数（重量、数量等），长度为对象数；
+                  某组基数之和不大于0时该组改为平均分摊
+    :return: 每个分摊对象分得的金额（分），int64数组，每组之和等于该组总额
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    group_index = np.asarray(group_index, dtype=np.intp)
+    bases = np.asarray(bases, dtype=np.float64)
+    n_groups = len(totals)
+    n_items = len(group_index)
+    if n_items == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # 基数之和不大于0的组退化为平均分摊
+    counts = np.bincount(group_index, minlength=n_groups)
+    base_sums = np.bincount(group_index, weights=bases, minlength=n_groups)
+    degenerate = base_sums <= 0
+    bases = np.where(degenerate[group_index], 1.0, bases)
+    base_sums = np.where(degenerate, counts, base_sums)
+
+    # 先按比例向下取整，再把剩余的分按小数部分从大到小逐个补齐
+    exact = totals[group_index] * (bases / base_sums[group_index])
+    shares = np.floor(exact).astype(np.int64)
+    remainders = exact - shares
+    leftover = totals - np.bincount(group_index, weights=shares, minlength=n_groups).astype(np.int64)
+
+    # 组内按余数降序排名，余数相同时按原顺序
+    order = np.lexsort((np.arange(n_items), -remainders, group_index))
+    sorted_groups = group_index[order]
+    group_start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(n_items) - group_start[sorted_groups]
+    reverse_rank = counts[sorted_groups] - 1 - rank
+
+    # 浮点误差可能使向下取整之和略大于总额，此时从余数最小的对象扣回
+    group_leftover = leftover[sorted_groups]
+    shares[order[rank < group_leftover]] += 1
+    shares[order[reverse_rank < -group_leftover]] -= 1
+    return shares
+
+
+def allocate_fee(fee, bases):
+    """
+    分摊单笔运费
+    Allocate one fee across items
+
+    :param fee: 运费总额（元）
+    :param bases: 各对象的分摊基数列表
+    :return: 各对象分得的运费（Decimal，元），之和等于运费总额
+    """
+    shares = allocate_cents([to_cents(fee)], np.zeros(len(bases), dtype=np.intp), bases)
+    return [from_cents(share) for share in shares]
+
+
+def allocation_bases(orders, basis=BASIS_WEIGHT):
+    """
+    按分摊依据取出订单的分摊基数
+    :param orders: 订单对象列表（需有 weight / quantity 属性）
+    :param basis: 分摊依据，weight-按重量，quantity-按数量，equal-平均
+    :return: 基数列表
+    """
+    if basis == BASIS_WEIGHT:
+        return [float(order.weight or 0) for order in orders]
+    if basis == BASIS_QUANTITY:
+        return [float(order.quantity or 0) for order in orders]
+    if basis == BASIS_EQUAL:
+        return [1.0] * len(orders)
+    raise ValueError(f'不支持的分摊依据: {basis}')
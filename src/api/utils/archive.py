@@ -0,0 +1,109 @@
+"""
+数据归档模块
+Archive module
+
+把已逻辑删除的数据（is_deleted > 0）和已失效的送货记录（status > 0）
+分批从业务表移动到对应的归档表，缩小热表及其索引；支持按ID恢复
+"""
+from sqlalchemy import select, text
+from api.models import db, User, ProjectInfo, ProjectPriceConfig, Order, DeliveryImportRecord, ARCHIVE_TABLES
+
+# 归档规则：(业务表模型, 需要归档的数据条件)
+ARCHIVE_RULES = {
+    Order.__tablename__: (Order, Order.is_deleted > 0),
+    ProjectPriceConfig.__tablename__: (ProjectPriceConfig, ProjectPriceConfig.is_deleted > 0),
+    ProjectInfo.__tablename__: (ProjectInfo, ProjectInfo.is_deleted > 0),
+    User.__tablename__: (User, User.is_deleted > 0),
+    DeliveryImportRecord.__tablename__: (DeliveryImportRecord, DeliveryImportRecord.status > 0),
+}
+
+
+def _move_rows(source, target, ids):
+    """在当前事务内把指定ID的行从source表复制到target表并从source表删除"""
+    column_names = [column.name for column in source.columns]
+    db.session.execute(target.insert().from_select(
+        column_names,
+        select(*[source.c[name] for name in column_names]).where(source.c.id.in_(ids))
+    ))
+    return db.session.execute(source.delete().where(source.c.id.in_(ids))).rowcount
+
+
+def archive_table(table_name, batch_size=1000, max_batches=None):
+    """
+    分批归档一张业务表中满足归档条件的数据，每批单独提交，避免长事务和大范围锁
+    :param table_name: 业务表名
+    :param batch_size: 每批移动的行数
+    :param max_batches: 最多执行的批数，None表示直到没有可归档数据
+    :return: 移动的行数
+    """
+    model, condition = ARCHIVE_RULES[table_name]
+    source = model.__table__
+    target = ARCHIVE_TABLES[model]
+    moved = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        ids = [row.id for row in db.session.query(model.id).filter(condition)
+               .order_by(model.id).limit(batch_size)]
+        if not ids:
+            break
+        moved += _move_rows(source, target, ids)
+        db.session.commit()
+        batches += 1
+
+    return moved
+
+
+def restore_rows(table_name, ids):
+    """
+    把归档表中指定ID的数据移回业务表（保持原删除标记/状态不变）
+    :param table_name: 业务表名
+    :param ids: 要恢复的行ID列表
+    :return: 恢复的行数
+    """
+    model, _ = ARCHIVE_RULES[table_name]
+    source = ARCHIVE_TABLES[model]
+    target = model.__table__
+    column_names = [column.name for column in target.columns]
+    try:
+        db.session.execute(target.insert().from_select(
+            column_names,
+            select(*[source.c[name] for name in column_names]).where(source.c.id.in_(ids))
+        ))
+        restored = db.session.execute(source.delete().where(source.c.id.in_(ids))).rowcount
+        db.session.commit()
+        return restored
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def table_sizes(table_names):
+    """
+    查询表的数据和索引占用空间（仅支持MySQL）
+    :param table_names: 表名列表
+    :return: {表名: (数据字节数, 索引字节数)}，不支持的数据库返回None
+    """
+    if db.session.get_bind().dialect.name != 'mysql':
+        return None
+
+    # 刷新统计信息，information_schema 中的大小默认有缓存
+    for name in table_names:
+        db.session.execute(text(f'ANALYZE TABLE `{name}`'))
+    rows = db.session.execute(text(
+        'SELECT TABLE_NAME, DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES '
+        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :names'
+    ).bindparams(db.bindparam('names', expanding=True)), {'names': list(table_names)}).all()
+    return {row[0]: (int(row[1] or 0), int(row[2] or 0)) for row in rows}
+
+
+def optimize_tables(table_names):
+    """
+    重建表以回收已删除行占用的空间（仅MySQL，InnoDB在OPTIMIZE后才会缩小表空间）
+    :param table_names: 表名列表
+    """
+    if db.session.get_bind().dialect.name != 'mysql':
+        return
+    for name in table_names:
+        db.session.execute(text(f'OPTIMIZE TABLE `{name}`'))
+    db.session.commit()
@@ -0,0 +1,135 @@
+"""
+承运人维度模块
+Carrier dimension module
+
+送货信息导入时把承运人写入 carrier 维度表（按名称+联系方式唯一），并登记到项目；
+订单通过 carrier_id 引用承运人，承运人下拉列表和按承运人统计利润都从维度表查找。
+"""
+from sqlalchemy import tuple_
+from api.models import db, Carrier, ProjectCarrier, Order, DeliveryImportRecord
+from api.utils.upsert import build_upsert
+
+# 每条语句包含的承运人数量上限
+CARRIER_BATCH_SIZE = 500
+
+
+def upsert_carriers(carriers):
+    """
+    批量写入承运人，已存在的更新承运类型和车牌
+    :param carriers: 承运人字典列表，包含 carrier_type、carrier_name、carrier_phone、carrier_plate
+    :return: {(承运人名称, 联系方式): 承运人ID}
+    """
+    table = Carrier.__table__
+    # 同一承运人多次出现时以最后一次为准
+    rows = {}
+    for carrier in carriers:
+        key = (carrier['carrier_name'], carrier['carrier_phone'])
+        rows[key] = {
+            'carrier_type': carrier['carrier_type'],
+            'carrier_name': carrier['carrier_name'],
+            'carrier_phone': carrier['carrier_phone'],
+            'carrier_plate': carrier.get('carrier_plate')
+        }
+
+    keys = sorted(rows)
+    carrier_ids = {}
+    for start in range(0, len(keys), CARRIER_BATCH_SIZE):
+        batch = keys[start:start + CARRIER_BATCH_SIZE]
+        db.session.execute(build_upsert(
+            table, [rows[key] for key in batch], ['carrier_name', 'carrier_phone'],
+            lambda new: {'carrier_type': new.carrier_type, 'carrier_plate': new.carrier_plate}
+        ))
+        found = db.session.query(Carrier.id, Carrier.carrier_name, Carrier.carrier_phone).filter(
+            tuple_(Carrier.carrier_name, Carrier.carrier_phone).in_(batch)
+        ).all()
+        carrier_ids.update({(row.carrier_name, row.carrier_phone): row.id for row in found})
+    return carrier_ids
+
+
+def link_project_carriers(project_id, carrier_ids):
+    """
+    登记项目使用过的承运人，已登记的忽略
+    :param project_id: 项目ID
+    :param carrier_ids: 承运人ID集合
+    """
+    if not carrier_ids:
+        return
+    table = ProjectCarrier.__table__
+    db.session.execute(build_upsert(
+        table, [{'project_id': project_id, 'carrier_id': carrier_id} for carrier_id in sorted(carrier_ids)],
+        ['project_id', 'carrier_id'],
+        lambda new: {'carrier_id': new.carrier_id}
+    ))
+
+
+def project_carriers(project_id):
+    """
+    查询项目下有未删除订单的承运人
+    从项目关联表出发，每个承运人按 idx_order_carrier 索引探测是否仍有订单，不扫描订单表
+    :return: 承运人对象列表，按名称排序
+    """
+    has_orders = db.session.query(Order.id).filter(
+        Order.carrier_id == Carrier.id,
+        Order.project_id == project_id,
+        Order.is_deleted == 0
+    ).exists()
+    return Carrier.query.join(
+        ProjectCarrier, ProjectCarrier.carrier_id == Carrier.id
+    ).filter(
+        ProjectCarrier.project_id == project_id,
+        has_orders
+    ).order_by(Carrier.carrier_name).all()
+
+
+def order_carrier_name():
+    """
+    订单的承运人名称表达式，查询需 outerjoin Carrier
+    优先取维度表中的名称，尚未回填 carrier_id 的历史订单取订单上的名称，与按名称汇总的日报表口径一致
+    """
+    return db.func.coalesce(Carrier.carrier_name, Order.carrier_name)
+
+
+def backfill_carrier_ids(batch_size=5000):
+    """
+    为历史订单和送货记录建立承运人维度并回填 carrier_id，按主键分批处理并逐批提交
+    :param batch_size: 每批处理的行数
+    :return: {表名: 回填行数}
+    """
+    filled = {}
+    for model, project_column in ((Order, Order.project_id), (DeliveryImportRecord, None)):
+        table = model.__table__
+        update = table.update().where(table.c.id == db.bindparam('_id')).values(
+            carrier_id=db.bindparam('_carrier_id')
+        )
+        count = 0
+        last_id = 0
+        while True:
+            columns = [model.id, model.carrier_type, model.carrier_name, model.carrier_phone, model.carrier_plate]
+            if project_column is not None:
+                columns.append(project_column)
+            rows = db.session.query(*columns).filter(
+                model.id > last_id,
+                model.carrier_id.is_(None),
+                model.carrier_name.isnot(None),
+                model.carrier_phone.isnot(None)
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            carrier_ids = upsert_carriers([row._asdict() for row in rows])
+            if project_column is not None:
+                for project_id in {row.project_id for row in rows}:
+                    link_project_carriers(project_id, {
+                        carrier_ids[(row.carrier_name, row.carrier_phone)]
+                        for row in rows if row.project_id == project_id
+                    })
+            # 不修改版本号：只补充维度引用，业务数据本身没有变化
+            db.session.execute(update, [{
+                '_id': row.id,
+                '_carrier_id': carrier_ids[(row.carrier_name, row.carrier_phone)]
+            } for row in rows])
+            db.session.commit()
+            count += len(rows)
+            last_id = rows[-1].id
+        filled[model.__tablename__] = count
+    return filled
@@ -0,0 +1,154 @@
+"""
+数据表变更计数与条件请求模块
+Table change counters and conditional POST queries
+
+写事务提交后，用一个单独的短事务把本事务写过的表在 table_change_counter 中的计数加一；
+列表/报表接口用所依赖表的计数和请求参数生成ETag，数据未变化时直接返回304。
+计数行只在这个短事务内加锁，不会让并发的写事务在提交前排队等待同一计数行，
+代价是提交与计数加一之间有一个很短的窗口，此时的条件请求可能仍返回304，下一次请求即可得到新数据。
+只监听 db.session，其他会话（如 statement_timeout 取消查询用的连接）的写入不计数。
+
+写入的表按以下方式收集：
+- ORM对象的增删改：在flush后按对象所属的表收集
+- Query.update/delete、session.execute(insert/update/delete)：在执行时收集
+- bulk_save_objects / bulk_insert_mappings / bulk_update_mappings 不触发任何会话事件，
+  需要在调用后使用 mark_tables_changed 显式登记
+
+条件请求约定（查询接口均为POST，浏览器不会自动处理，需要前端显式携带）：
+- 成功的响应带 ETag 响应头，前端按"接口 + 请求体"缓存响应内容和ETag
+- 再次发起相同的查询时在请求头 If-None-Match 中带上缓存的ETag
+- 数据未变化时返回 304 Not Modified（无响应体），前端使用缓存的内容
+"""
+import hashlib
+import json
+from functools import wraps
+
+from flask import Response, make_response, request
+from sqlalchemy import event
+
+from api.models import db, TableChangeCounter
+from api.utils.upsert import build_upsert
+
+# session.info 中记录本事务写过的表名的键
+CHANGED_TABLES_KEY = 'changed_tables'
+
+COUNTER_TABLE = TableChangeCounter.__tablename__
+
+
+def _changed_tables(session):
+    return session.info.setdefault(CHANGED_TABLES_KEY, set())
+
+
+def mark_tables_changed(*models, session=None):
+    """
+    登记当前事务写过的表（用于不触发会话事件的批量写入）
+    :param models: 模型类或表对象
+    """
+    tables = _changed_tables(session or db.session())
+    for model in models:
+        tables.add(getattr(model, '__tablename__', None) or model.name)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    tables = _changed_tables(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table_name = getattr(obj, '__tablename__', None)
+        if table_name:
+            tables.add(table_name)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _collect_executed_tables(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and table.name != COUNTER_TABLE:
+        _changed_tables(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(db.session, 'before_commit')
+def _flush_before_commit(session):
+    # 先把未写出的修改刷到数据库，保证 after_flush 已登记完所有表
+    session.flush()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_counters(session):
+    tables = session.info.pop(CHANGED_TABLES_KEY, None)
+    if not tables:
+        return
+    table = TableChangeCounter.__table__
+    # 固定顺序加锁，避免并发的计数事务互相等待对方的计数行
+    rows = [{'table_name': name, 'version': 1} for name in sorted(tables)]
+    try:
+        # 数据已经提交，在单独的连接上加计数；build_upsert 按 session 的数据库类型生成语句
+        with db.engine.begin() as conn:
+            conn.execute(build_upsert(
+                table, rows, ['table_name'],
+                lambda new: {'version': table.c.version + 1}
+            ))
+    except Exception as e:
+        # 计数失败不影响已提交的数据，只会让对应表的条件请求在下次写入前返回旧的ETag
+        print(f"[变更计数] 更新 {', '.join(sorted(tables))} 的计数失败：{str(e)}")
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _reset_changed_tables(session):
+    session.info.pop(CHANGED_TABLES_KEY, None)
+
+
+def table_versions(models):
+    """
+    读取表的变更计数
+    :param models: 模型类列表
+    :return: {表名: 计数}，从未写过的表计数为0
+    """
+    names = [model.__tablename__ for model in models]
+    rows = db.session.query(TableChangeCounter.table_name, TableChangeCounter.version).filter(
+        TableChangeCounter.table_name.in_(names)
+    ).all()
+    versions = dict.fromkeys(names, 0)
+    versions.update({row.table_name: row.version for row in rows})
+    return versions
+
+
+def build_etag(models, payload):
+    """
+    根据请求路径、请求参数和依赖表的变更计数生成ETag
+    :param models: 接口依赖的模型类列表
+    :param payload: 请求参数（可JSON序列化）
+    """
+    content = json.dumps({
+        'path': request.path,
+        'payload': payload,
+        'versions': table_versions(models)
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def conditional_query(*models):
+    """
+    POST查询接口的条件请求装饰器
+    计数在执行查询之前读取：查询期间若有新的写入，生成的ETag偏旧，下次请求会重新查询，不会返回过期数据
+    :param models: 接口返回的数据所依赖的模型类
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = build_etag(models, request.get_json(silent=True))
+            # 按弱比较匹配：压缩后的响应带弱ETag（见 api.utils.compression）
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(f(*args, **kwargs))
+            # 只缓存成功的响应，业务错误（success=False）不带ETag
+            body = response.get_json(silent=True) if response.is_json else None
+            if response.status_code == 200 and not (isinstance(body, dict) and body.get('success') is False):
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,172 @@
+"""
+请求/响应压缩模块
+Compressed request and response bodies for the JSON API
+
+导入请求（orders、deliveries、upload_list）和导出响应是高度重复的JSON（每行相同的省市、产品名称），压缩率很高。
+- 请求：WSGI中间件解压 Content-Encoding 为 gzip / br 的请求体，解压后的大小超过
+  MAX_DECOMPRESSED_REQUEST_SIZE 时返回413，不支持的编码返回415，数据损坏返回400
+- 响应：JSON响应体超过 COMPRESSION_MIN_SIZE 字节时按 Accept-Encoding 压缩，优先br，其次gzip；
+  压缩后强ETag改为弱ETag（条件请求按弱比较匹配）
+
+br 需要安装 Brotli（>=1.2），未安装时只支持 gzip。
+"""
+import gzip
+import io
+import json
+import os
+import zlib
+
+from flask import request
+from werkzeug.wrappers import Response
+
+from api.enum.error_code import ErrorCode
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+# 解压后的请求体大小上限（字节）
+MAX_DECOMPRESSED_REQUEST_SIZE = int(os.getenv('MAX_DECOMPRESSED_REQUEST_SIZE', 200 * 1024 * 1024))
+# 响应体达到该大小才压缩（字节），小响应压缩后节省的字节抵不上CPU开销
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1400))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+# br 默认质量11压缩很慢，接口响应使用较低的质量
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+
+# 解压时每次送入的压缩数据字节数
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+class DecompressionError(Exception):
+    """请求体解压失败"""
+
+    def __init__(self, error_code, message=None):
+        super().__init__(message or error_code['message'])
+        self.error_code = error_code
+        self.message = message or error_code['message']
+
+
+def _gunzip(data, limit):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    output = decompressor.decompress(data, limit + 1)
+    if len(output) > limit:
+        raise DecompressionError(ErrorCode.PAYLOAD_TOO_LARGE)
+    if not decompressor.eof:
+        raise DecompressionError(ErrorCode.BAD_REQUEST, 'gzip请求体不完整')
+    return output
+
+
+def _unbrotli(data, limit):
+    decompressor = brotli.Decompressor()
+    output = io.BytesIO()
+    for start in range(0, len(data), DECOMPRESS_CHUNK_SIZE):
+        chunk = data[start:start + DECOMPRESS_CHUNK_SIZE]
+        while True:
+            output.write(decompressor.process(chunk, output_buffer_limit=limit + 1 - output.tell()))
+            if output.tell() > limit:
+                raise DecompressionError(ErrorCode.PAYLOAD_TOO_LARGE)
+            if decompressor.can_accept_more_data():
+                break
+            chunk = b''
+    if not decompressor.is_finished():
+        raise DecompressionError(ErrorCode.BAD_REQUEST, 'br请求体不完整')
+    return output.getvalue()
+
+
+DECODERS = {'gzip': _gunzip, 'x-gzip': _gunzip}
+DECODE_ERRORS = (zlib.error, EOFError)
+if brotli is not None:
+    DECODERS['br'] = _unbrotli
+    DECODE_ERRORS += (brotli.error,)
+
+
+def decompress_body(encoding, data, limit=MAX_DECOMPRESSED_REQUEST_SIZE):
+    """
+    解压请求体
+    :raises DecompressionError: 编码不支持、数据损坏或解压后超过大小上限
+    """
+    decoder = DECODERS.get(encoding)
+    if decoder is None:
+        raise DecompressionError(ErrorCode.UNSUPPORTED_MEDIA_TYPE, f'不支持的请求体编码：{encoding}')
+    try:
+        return decoder(data, limit)
+    except DECODE_ERRORS as e:
+        raise DecompressionError(ErrorCode.BAD_REQUEST, f'请求体解压失败：{e}')
+
+
+class RequestDecompressionMiddleware:
+    """解压 gzip / br 编码请求体的WSGI中间件，解压后的请求对Flask视图透明"""
+
+    def __init__(self, wsgi_app, max_size=MAX_DECOMPRESSED_REQUEST_SIZE):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding in ('', 'identity'):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            if not length and environ.get('wsgi.input_terminated'):
+                # 分块传输的请求没有 Content-Length，由服务器保证输入流在请求体结束处终止
+                length = self.max_size + 1
+            # 压缩数据本身不会超过解压后的上限
+            if length > self.max_size + 1:
+                raise DecompressionError(ErrorCode.PAYLOAD_TOO_LARGE)
+            data = environ['wsgi.input'].read(length)
+            if len(data) > self.max_size:
+                raise DecompressionError(ErrorCode.PAYLOAD_TOO_LARGE)
+            body = decompress_body(encoding, data, self.max_size)
+        except DecompressionError as e:
+            response = Response(json.dumps({
+                'success': False,
+                'result': {},
+                'error_code': e.error_code['code'],
+                'error_message': e.message
+            }, ensure_ascii=False), status=e.error_code['code'], mimetype='application/json')
+            return response(environ, start_response)
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+
+def _compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    """after_request：按 Accept-Encoding 压缩较大的JSON响应"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if not encoding:
+        return response
+
+    response.set_data(_compress(encoding, data))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # 压缩后的内容与未压缩的字节不同，强ETag不再成立
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def setup_compression(app):
+    """
+    为应用启用请求体解压和响应压缩
+    :param app: Flask应用实例
+    """
+    app.wsgi_app = RequestDecompressionMiddleware(app.wsgi_app)
+    app.after_request(compress_response)
@@ -0,0 +1,66 @@
+"""
+导入预校验模块
+Dry-run validation for imports
+
+订单导入、送货信息导入和价格配置上传支持 dry_run 参数：只做校验和计算，不写入任何数据。
+预校验在只读的 REPEATABLE READ 事务中执行，所有查询都是一致性快照读，不使用 FOR UPDATE 等加锁读，
+不会阻塞正在进行的导入；返回全部错误和计算结果预览（订单金额、运费分摊、价格配置的新增/更新/停用），
+数据无误后再去掉 dry_run 正式提交。
+
+约定：
+- JSON 接口在请求体中传 "dry_run": true，文件上传接口在表单中传 dry_run=1
+- 接口函数用 dry_run_supported 标记，transactional 据此为预校验请求开启只读事务
+- 预校验的结果放在成功响应中，通过 valid 字段区分数据是否可以导入
+"""
+import os
+
+from flask import request
+
+from api.enum.error_code import ErrorCode
+from api.utils.response import success_response, error_response
+
+# 预校验响应中返回的预览行数上限，超出部分只计入 preview_total
+DRY_RUN_PREVIEW_LIMIT = int(os.getenv('DRY_RUN_PREVIEW_LIMIT', 1000))
+
+READ_ONLY_ISOLATION_SQL = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+
+
+def dry_run_supported(f):
+    """标记接口支持预校验，需写在 transactional 之下"""
+    f.dry_run_supported = True
+    return f
+
+
+def is_dry_run():
+    """当前请求是否为预校验：JSON请求体或表单中的 dry_run 为真"""
+    data = request.get_json(silent=True)
+    value = data.get('dry_run') if isinstance(data, dict) else request.form.get('dry_run')
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def dry_run_response(errors, preview=None, preview_total=None, **summary):
+    """
+    生成预校验响应
+    :param errors: 错误信息列表
+    :param preview: 计算结果预览行列表
+    :param preview_total: 预览行总数，分块处理时调用方只保留前若干行，默认为 preview 的长度
+    :param summary: 其他汇总字段
+    """
+    preview = preview or []
+    return success_response({
+        'dry_run': True,
+        'valid': not errors,
+        'errors': errors,
+        'preview': preview[:DRY_RUN_PREVIEW_LIMIT],
+        'preview_total': len(preview) if preview_total is None else preview_total,
+        **summary
+    })
+
+
+def validation_error_response(errors):
+    """校验失败的响应：预校验返回错误列表，正式导入返回合并后的错误信息"""
+    if is_dry_run():
+        return dry_run_response(errors)
+    return error_response(ErrorCode.BAD_REQUEST, '\n'.join(errors))
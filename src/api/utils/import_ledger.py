@@ -0,0 +1,170 @@
+"""
+导入幂等模块
+Idempotent imports backed by an import ledger
+
+响应较慢时用户常会重复提交同一份表格：订单导入会再生成一组 -2 子订单，送货信息导入会生成新批次并失效上一批。
+导入接口用 idempotent_import 装饰后：
+- 幂等键优先使用请求头 Idempotency-Key，未提供时使用请求内容（JSON请求体，或表单字段和上传文件）的SHA-256
+- 窗口期（IMPORT_IDEMPOTENCY_WINDOW 秒，默认600）内相同幂等键的导入：
+  已成功的直接返回原响应（带 Idempotent-Replayed: true 响应头），不再校验和写入；
+  仍在处理中的返回 IMPORT_IN_PROGRESS；同一 Idempotency-Key 对应的内容不同时返回 IDEMPOTENCY_KEY_REUSED
+- 导入失败（业务错误或异常）时删除台账记录，修正数据后可以重新提交
+- 预校验（dry_run）请求不经过台账
+
+台账读写使用独立的数据库连接和短事务，不进入导入事务，也不计入表变更计数。
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, make_response, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from api.enum.error_code import ErrorCode
+from api.models import db, ImportLedger
+from api.utils.dry_run import is_dry_run
+from api.utils.response import error_response
+
+IMPORT_IDEMPOTENCY_WINDOW = int(os.getenv('IMPORT_IDEMPOTENCY_WINDOW', 600))
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# 读取上传文件计算哈希时每次读取的字节数
+HASH_READ_SIZE = 1024 * 1024
+
+
+def request_payload_hash():
+    """
+    计算请求内容的SHA-256
+    JSON请求直接使用原始请求体；表单上传使用排序后的表单字段和文件内容（multipart 分隔符每次提交都不同）
+    """
+    digest = hashlib.sha256()
+    if request.is_json:
+        digest.update(request.get_data(cache=True))
+        return digest.hexdigest()
+
+    for name, value in sorted(request.form.items(multi=True)):
+        digest.update(f'{name}={value}\n'.encode('utf-8'))
+    for name, upload in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+        digest.update(f'{name}:{upload.filename}\n'.encode('utf-8'))
+        for block in iter(lambda: upload.stream.read(HASH_READ_SIZE), b''):
+            digest.update(block)
+        upload.stream.seek(0)
+    return digest.hexdigest()
+
+
+def _replay(row, payload_hash):
+    """窗口期内已有台账记录时的响应"""
+    if row.payload_hash != payload_hash:
+        return error_response(ErrorCode.IDEMPOTENCY_KEY_REUSED)
+    if row.status != ImportLedger.STATUS_DONE:
+        return error_response(ErrorCode.IMPORT_IN_PROGRESS)
+    print(f"[导入幂等] 重复的导入请求，返回{row.finish_time}的处理结果")
+    return Response(row.response, mimetype='application/json', headers={REPLAYED_HEADER: 'true'})
+
+
+def claim_import(import_type, request_key, payload_hash):
+    """
+    登记一次导入：窗口期内已有记录时返回重放响应，否则占用幂等键
+    先插入再处理冲突，避免并发的相同请求对不存在的行加间隙锁而互相死锁
+    :return: (重放响应, None) 或 (None, 台账ID)
+    """
+    table = ImportLedger.__table__
+    now = datetime.now()
+    values = {
+        'payload_hash': payload_hash,
+        'status': ImportLedger.STATUS_PROCESSING,
+        'response': None,
+        'create_time': now,
+        'finish_time': None
+    }
+    # 冲突的记录可能在插入和查询之间被失败的导入删除，此时重新插入一次
+    for _ in range(2):
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(table.insert().values(import_type=import_type, request_key=request_key, **values))
+                return None, result.inserted_primary_key[0]
+        except IntegrityError:
+            pass
+
+        with db.engine.begin() as conn:
+            row = conn.execute(select(table).where(
+                table.c.import_type == import_type,
+                table.c.request_key == request_key
+            ).with_for_update()).first()
+            if row is None:
+                # 占用幂等键的导入刚刚失败并删除了记录
+                continue
+            if row.create_time >= now - timedelta(seconds=IMPORT_IDEMPOTENCY_WINDOW):
+                return _replay(row, payload_hash), None
+            # 超出窗口期的记录（包括处理进程异常退出遗留的）重新占用
+            conn.execute(table.update().where(table.c.id == row.id).values(**values))
+            return None, row.id
+
+    # 重试后仍与其他并发的相同请求冲突
+    return error_response(ErrorCode.IMPORT_IN_PROGRESS), None
+
+
+def finish_import(ledger_id, response_body):
+    """记录导入成功的响应"""
+    table = ImportLedger.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.update().where(table.c.id == ledger_id).values(
+            status=ImportLedger.STATUS_DONE, response=response_body, finish_time=datetime.now()
+        ))
+
+
+def release_import(ledger_id):
+    """导入失败时删除台账记录，允许重新提交"""
+    table = ImportLedger.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.id == ledger_id))
+
+
+def idempotent_import(import_type):
+    """
+    导入接口的幂等装饰器，需写在 transactional 之上，使导入事务提交后再记录结果
+    :param import_type: 导入类型，不同类型的接口幂等键互不影响
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if is_dry_run():
+                return f(*args, **kwargs)
+
+            payload_hash = request_payload_hash()
+            idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            request_key = f'key:{idempotency_key[:150]}' if idempotency_key else f'hash:{payload_hash}'
+            replay, ledger_id = claim_import(import_type, request_key, payload_hash)
+            if replay is not None:
+                return replay
+
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                release_import(ledger_id)
+                raise
+            body = response.get_json(silent=True) if response.is_json else None
+            if response.status_code == 200 and isinstance(body, dict) and body.get('success'):
+                finish_import(ledger_id, response.get_data(as_text=True))
+            else:
+                release_import(ledger_id)
+            return response
+        return decorated_function
+    return decorator
+
+
+def purge_import_ledger(days):
+    """
+    删除早于指定天数的台账记录
+    :return: 删除的行数
+    """
+    table = ImportLedger.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(table.delete().where(
+            table.c.create_time < datetime.now() - timedelta(days=days)
+        ))
+    return result.rowcount
@@ -0,0 +1,235 @@
+"""
+订单行校验模块
+Order row validation, serial or on a process pool
+
+订单导入的逐行校验（必填字段、线路价格查找、日期解析、金额计算）是纯Python计算，与数据库无关。
+校验结果是订单字段值元组，由调用方构建订单对象；开启进程池时按块提交给每个服务进程常驻的进程池并行校验，
+结果按块顺序返回，错误保持行号顺序。文件导入按整个文件的行数判断是否并行，逐块流式提交，同时在途的块数有上限。
+
+配置（环境变量）：
+- IMPORT_VALIDATION_WORKERS：并行校验的进程数，默认为1即不使用进程池；
+  开启前先用 benchmarks/parallel_validation.py 在部署机器上确认有加速，gevent 模式下不要开启
+- IMPORT_VALIDATION_MIN_ROWS：整个导入的行数达到该值才并行校验，默认20000
+- IMPORT_VALIDATION_CHUNK_SIZE：JSON导入时每个任务校验的行数，默认10000；文件导入按写入的分块提交
+- IMPORT_VALIDATION_START_METHOD：工作进程启动方式，默认forkserver，避免在多线程的服务进程中直接fork
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import chain, islice
+
+IMPORT_VALIDATION_WORKERS = int(os.getenv('IMPORT_VALIDATION_WORKERS', 1))
+IMPORT_VALIDATION_MIN_ROWS = int(os.getenv('IMPORT_VALIDATION_MIN_ROWS', 20000))
+IMPORT_VALIDATION_CHUNK_SIZE = int(os.getenv('IMPORT_VALIDATION_CHUNK_SIZE', 10000))
+IMPORT_VALIDATION_START_METHOD = os.getenv('IMPORT_VALIDATION_START_METHOD', 'forkserver')
+
+# 校验结果元组的字段顺序，与 Order 的列名一致
+ORDER_FIELDS = (
+    'project_id', 'project_name', 'order_number', 'order_date', 'delivery_date', 'product_name',
+    'quantity', 'weight', 'departure_province', 'departure_city', 'destination_province',
+    'destination_city', 'departure_region_id', 'destination_region_id', 'destination_address',
+    'remark', 'amount'
+)
+
+REQUIRED_FIELDS = {'departure_province', 'departure_city', 'destination_province', 'destination_city'}
+
+
+def validate_order_rows(project_id, project_name, price_table, regions, indexed_rows):
+    """
+    校验订单数据并计算金额
+    :param project_id: 项目ID
+    :param project_name: 项目名称
+    :param price_table: 线路阶梯价格表
+    :param regions: 地区索引，省市名称在这里规范为地区ID
+    :param indexed_rows: 可迭代的 (行号, 订单数据字典)
+    :return: ([(行号, 按 ORDER_FIELDS 排列的字段值元组)], 错误信息列表)
+    """
+    valid_rows = []
+    errors = []
+
+    for index, order_data in indexed_rows:
+        # 快速验证必填字段
+        missing_fields = REQUIRED_FIELDS - set(filter(None, order_data.keys()))
+        if missing_fields:
+            errors.append(f"第{index}行：{', '.join(missing_fields)}不能为空")
+            continue
+
+        departure_id = regions.city_id(order_data['departure_province'], order_data['departure_city'])
+        destination_id = regions.city_id(order_data['destination_province'], order_data['destination_city'])
+        route = (departure_id, destination_id)
+
+        if route not in price_table:
+            errors.append(f"第{index}行：出发地（{order_data['departure_province']}{order_data['departure_city']}）到达地（{order_data['destination_province']}{order_data['destination_city']}）的价格配置不存在")
+            continue
+
+        try:
+            weight = float(order_data['weight'])
+        except (KeyError, ValueError, TypeError):
+            errors.append(f"第{index}行：重量必须是有效的数字")
+            continue
+
+        # 按重量查找所在吨位区间的单价并计算金额
+        unit_price = price_table.unit_price(route, weight)
+        if unit_price is None:
+            errors.append(f"第{index}行：重量{weight}吨不在出发地（{order_data['departure_province']}{order_data['departure_city']}）到达地（{order_data['destination_province']}{order_data['destination_city']}）已配置的吨位区间内")
+            continue
+        amount = weight * unit_price
+
+        try:
+            valid_rows.append((index, (
+                project_id,
+                project_name,
+                str(order_data['order_number']),
+                datetime.strptime(order_data['order_date'], '%Y-%m-%d').date(),
+                datetime.strptime(order_data['delivery_date'], '%Y-%m-%d').date(),
+                order_data['product_name'],
+                order_data['quantity'],
+                order_data['weight'],
+                order_data['departure_province'],
+                order_data['departure_city'],
+                order_data['destination_province'],
+                order_data['destination_city'],
+                departure_id,
+                destination_id,
+                order_data.get('destination_address'),
+                order_data.get('remark'),
+                amount
+            )))
+        except KeyError as e:
+            errors.append(f"第{index}行：缺少字段 {e.args[0]}")
+        except (ValueError, TypeError) as e:
+            errors.append(f"第{index}行：数据格式错误 - {str(e)}")
+
+    return valid_rows, errors
+
+
+# 每个服务进程常驻一个进程池，首次并行校验时创建，各请求线程共用
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """
+    返回当前进程的校验进程池，进程数变化或在 fork 出的子进程中时重新创建
+    校验上下文随任务传入，工作进程不绑定某个项目
+    """
+    global _pool, _pool_key
+    key = (os.getpid(), workers)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            if _pool is not None and _pool_key[0] == key[0]:
+                _pool.shutdown(wait=False)
+            context = multiprocessing.get_context(IMPORT_VALIDATION_START_METHOD)
+            if IMPORT_VALIDATION_START_METHOD == 'forkserver':
+                # forkserver 进程预先导入校验和地区模块，工作进程从它fork，不必各自导入
+                context.set_forkserver_preload([__name__, 'api.utils.region'])
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_key = key
+        return _pool
+
+
+def _discard_pool(pool):
+    """工作进程异常退出后进程池不可再用，丢弃后下次使用时重新创建"""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_key = None
+    pool.shutdown(wait=False)
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None and _pool_key[0] == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _validate_chunk(context, indexed_rows):
+    return validate_order_rows(*context, indexed_rows)
+
+
+def _chunks(indexed_rows, size):
+    iterator = iter(indexed_rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _validate_on_pool(context, chunks, workers):
+    """在进程池中逐块校验，在途的块数不超过进程数的2倍，按提交顺序产出结果"""
+    pool = _get_pool(workers)
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(_validate_chunk, context, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # 调用方提前结束迭代或出错时，取消尚未开始的任务
+        for future in pending:
+            future.cancel()
+
+
+def validate_order_chunks(project_id, project_name, price_table, regions, chunks,
+                          workers=IMPORT_VALIDATION_WORKERS, min_rows=IMPORT_VALIDATION_MIN_ROWS):
+    """
+    逐块校验订单数据，按块的顺序产出 validate_order_rows 的结果
+    先读取不超过 min_rows 行的块：整个导入不足 min_rows 行时在当前进程校验，否则全部交给进程池
+    :param chunks: 可迭代的块，每块为 (行号, 订单数据字典) 列表，可以是流式读取的生成器
+    :param workers: 进程数，为1时不使用进程池
+    :param min_rows: 使用进程池的最少行数
+    :return: 生成器，产出 ([(行号, 字段值元组)], 错误信息列表)
+    """
+    context = (project_id, project_name, price_table, regions)
+    chunks = iter(chunks)
+    head = []
+    if workers > 1:
+        row_count = 0
+        for chunk in chunks:
+            head.append(chunk)
+            row_count += len(chunk)
+            if row_count >= min_rows:
+                yield from _validate_on_pool(context, chain(head, chunks), workers)
+                return
+    for chunk in chain(head, chunks):
+        yield validate_order_rows(*context, chunk)
+
+
+def validate_order_rows_parallel(project_id, project_name, price_table, regions, indexed_rows,
+                                 workers=IMPORT_VALIDATION_WORKERS, chunk_size=IMPORT_VALIDATION_CHUNK_SIZE):
+    """
+    在进程池中分块校验订单数据，不判断行数，参数和返回值与 validate_order_rows 相同
+    :param indexed_rows: 可迭代的 (行号, 订单数据字典)
+    :param workers: 进程数
+    :param chunk_size: 每个任务校验的行数
+    """
+    valid_rows = []
+    errors = []
+    context = (project_id, project_name, price_table, regions)
+    for chunk_rows, chunk_errors in _validate_on_pool(context, _chunks(indexed_rows, chunk_size), workers):
+        valid_rows.extend(chunk_rows)
+        errors.extend(chunk_errors)
+    return valid_rows, errors
+
+
+def validate_orders(project_id, project_name, price_table, regions, indexed_rows):
+    """
+    校验订单数据，开启进程池且行数达到 IMPORT_VALIDATION_MIN_ROWS 时并行校验
+    :param indexed_rows: (行号, 订单数据字典) 列表
+    """
+    if IMPORT_VALIDATION_WORKERS > 1 and len(indexed_rows) >= IMPORT_VALIDATION_MIN_ROWS:
+        return validate_order_rows_parallel(project_id, project_name, price_table, regions, indexed_rows)
+    return validate_order_rows(project_id, project_name, price_table, regions, indexed_rows)
@@ -0,0 +1,150 @@
+"""
+订单表分区管理模块
+Order table partition management
+
+在MySQL上按下单日期（order_date）对 order 表做 RANGE COLUMNS 分区（按月或按年），
+并提供追加未来分区、查看分区的工具。
+MySQL要求分区列包含在每个主键/唯一键中，因此启用分区时会把主键改为 (id, order_date)，
+订单号/子订单号的唯一索引改为包含 order_date 的联合唯一索引；
+子订单号的全局唯一由 order_seq_counter 计数表的序号分配保证。
+Order 模型仍按未分区的表声明（单列主键、单列唯一），分区后的实际约束以这里的 ALTER 为准。
+这些键由分区命令维护，数据库迁移的自动生成（flask db migrate）通过 include_migration_object 跳过它们，
+否则会在分区表上重建单列唯一索引，MySQL 会拒绝。
+"""
+from datetime import date
+from sqlalchemy import text
+from api.models import db, Order
+
+GRANULARITY_MONTH = 'month'
+GRANULARITY_YEAR = 'year'
+
+# 兜底分区，存放超出已建分区范围的数据
+MAX_PARTITION = 'pmax'
+
+
+# 分区时改写的订单号/子订单号唯一键涉及的列
+PARTITION_KEY_COLUMNS = {'order_number', 'sub_order_number', 'order_date'}
+
+
+def include_migration_object(obj, name, type_, reflected, compare_to):
+    """
+    Alembic 自动生成迁移时的对象过滤（Migrate 的 include_object 参数）
+    order 表上订单号/子订单号的唯一键由分区命令维护，不参与比对：
+    未分区的库上模型与数据库一致，跳过不影响结果；分区后的库上避免生成重建单列唯一索引的迁移
+    """
+    if type_ in ('index', 'unique_constraint') and obj.table.name == Order.__tablename__:
+        columns = {column.name for column in obj.columns}
+        if columns and columns <= PARTITION_KEY_COLUMNS and (type_ == 'unique_constraint' or obj.unique):
+            return False
+    return True
+
+
+def _next_boundary(day, granularity):
+    """返回 day 所在月/年的下一个月/年的第一天"""
+    if granularity == GRANULARITY_YEAR:
+        return date(day.year + 1, 1, 1)
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def partition_name(day, granularity):
+    """分区名：按月为 pYYYYMM，按年为 pYYYY"""
+    return f"p{day.year}" if granularity == GRANULARITY_YEAR else f"p{day.year}{day.month:02d}"
+
+
+def partition_ranges(start, end, granularity):
+    """
+    生成覆盖 [start, end] 的分区列表
+    :return: [(分区名, 上界日期(不含))]
+    """
+    ranges = []
+    day = date(start.year, 1 if granularity == GRANULARITY_YEAR else start.month, 1)
+    while day <= end:
+        upper = _next_boundary(day, granularity)
+        ranges.append((partition_name(day, granularity), upper))
+        day = upper
+    return ranges
+
+
+def _partition_clause(ranges):
+    parts = [f"PARTITION {name} VALUES LESS THAN ('{upper.isoformat()}')" for name, upper in ranges]
+    parts.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return ',\n    '.join(parts)
+
+
+def _require_mysql():
+    if db.session.get_bind().dialect.name != 'mysql':
+        raise RuntimeError('订单表分区仅支持MySQL')
+
+
+def list_partitions():
+    """
+    查询 order 表当前的分区
+    :return: [(分区名, 上界表达式, 行数估计)]，未分区时返回空列表
+    """
+    _require_mysql()
+    rows = db.session.execute(text(
+        'SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS '
+        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL '
+        'ORDER BY PARTITION_ORDINAL_POSITION'
+    ), {'table': Order.__tablename__}).all()
+    return [(row[0], row[1], row[2]) for row in rows]
+
+
+def partition_order_table(granularity, ahead):
+    """
+    把 order 表改为按 order_date 的范围分区
+    分区从现有最早的下单日期开始，一直建到当前日期之后 ahead 个月/年
+    :param granularity: month 或 year
+    :param ahead: 预建的未来分区数量
+    :return: 创建的分区列表
+    """
+    _require_mysql()
+    if list_partitions():
+        raise RuntimeError('order 表已经分区，如需追加分区请使用 add-order-partitions')
+
+    earliest = db.session.query(db.func.min(Order.order_date)).scalar() or date.today()
+    end = date.today()
+    for _ in range(ahead):
+        end = _next_boundary(end, granularity)
+    ranges = partition_ranges(earliest, end, granularity)
+
+    # 分区列必须包含在所有主键/唯一键中
+    db.session.execute(text(
+        'ALTER TABLE `order` '
+        'DROP PRIMARY KEY, ADD PRIMARY KEY (id, order_date), '
+        'DROP INDEX order_number, ADD UNIQUE KEY uk_order_number (order_number, order_date), '
+        'DROP INDEX sub_order_number, ADD UNIQUE KEY uk_sub_order_number (sub_order_number, order_date)'
+    ))
+    db.session.execute(text(
+        f"ALTER TABLE `order` PARTITION BY RANGE COLUMNS(order_date) (\n    {_partition_clause(ranges)}\n)"
+    ))
+    db.session.commit()
+    return ranges
+
+
+def add_future_partitions(granularity, ahead):
+    """
+    从兜底分区中拆分出新的分区，保证当前日期之后至少有 ahead 个月/年的分区
+    :param granularity: month 或 year，需与建表时一致
+    :param ahead: 需要保证的未来分区数量
+    :return: 新增的分区列表
+    """
+    _require_mysql()
+    existing = {name for name, _, _ in list_partitions()}
+    if not existing:
+        raise RuntimeError('order 表尚未分区，请先执行 partition-order-table')
+
+    end = date.today()
+    for _ in range(ahead):
+        end = _next_boundary(end, granularity)
+    ranges = [item for item in partition_ranges(date.today(), end, granularity) if item[0] not in existing]
+    if not ranges:
+        return []
+
+    db.session.execute(text(
+        f"ALTER TABLE `order` REORGANIZE PARTITION {MAX_PARTITION} INTO (\n    {_partition_clause(ranges)}\n)"
+    ))
+    db.session.commit()
+    return ranges
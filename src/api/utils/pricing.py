@@ -0,0 +1,92 @@
+"""
+吨位阶梯价格查找模块
+Tonnage-tiered price lookup
+
+同一线路可按重量区间配置不同的单价，区间为 [吨位下限, 吨位上限)。
+按项目把价格配置整理为 线路 -> 按下限排序的区间边界，订单按重量二分查找所在区间。
+"""
+from bisect import bisect_right
+
+# 未分档的价格配置覆盖的吨位区间
+DEFAULT_TONNAGE_LOWER_LIMIT = 0
+DEFAULT_TONNAGE_UPPER_LIMIT = 999999
+
+
+class PriceTable:
+    """
+    线路阶梯价格表
+    线路为任意可哈希的键（如 (出发市地区ID, 到达市地区ID)）
+    """
+
+    def __init__(self, tiers):
+        """
+        :param tiers: 可迭代的 (线路, 吨位下限, 吨位上限, 单价)，同一线路的区间不能重叠
+        """
+        grouped = {}
+        for route, lower, upper, price in tiers:
+            grouped.setdefault(route, []).append((lower, upper, price))
+
+        # 线路 -> (下限列表, 上限列表, 单价列表)，均按下限升序
+        self._routes = {}
+        for route, items in grouped.items():
+            items.sort()
+            self._routes[route] = (
+                [item[0] for item in items],
+                [item[1] for item in items],
+                [item[2] for item in items]
+            )
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, route):
+        return route in self._routes
+
+    def unit_price(self, route, weight):
+        """
+        查找线路上重量所在区间的单价
+        :return: 单价，线路不存在或重量不在任何区间内时返回None
+        """
+        tiers = self._routes.get(route)
+        if tiers is None:
+            return None
+        lowers, uppers, prices = tiers
+        position = bisect_right(lowers, weight) - 1
+        if position < 0 or weight >= uppers[position]:
+            return None
+        return prices[position]
+
+
+def parse_tonnage_limits(item):
+    """
+    读取价格配置行的吨位区间，未填写时使用默认区间
+    :return: (吨位下限, 吨位上限, 错误信息)
+    """
+    lower = item.get('tonnage_lower_limit')
+    upper = item.get('tonnage_upper_limit')
+    try:
+        lower = DEFAULT_TONNAGE_LOWER_LIMIT if lower in (None, '') else int(lower)
+        upper = DEFAULT_TONNAGE_UPPER_LIMIT if upper in (None, '') else int(upper)
+    except (ValueError, TypeError):
+        return None, None, '吨位上下限必须是整数'
+    if lower < 0 or lower >= upper:
+        return None, None, '吨位下限必须不小于0且小于吨位上限'
+    return lower, upper, None
+
+
+def tier_errors(route_tiers):
+    """
+    校验每条线路的吨位区间既不重叠也不间断
+    :param route_tiers: {线路描述: [(行号, 吨位下限, 吨位上限)]}
+    :return: 错误信息列表
+    """
+    errors = []
+    for route, tiers in route_tiers.items():
+        tiers = sorted(tiers, key=lambda tier: tier[1])
+        for previous, current in zip(tiers, tiers[1:]):
+            if current[1] < previous[2]:
+                errors.append(f"第{current[0]}行：线路{route}的吨位区间[{current[1]}, {current[2]})"
+                              f"与第{previous[0]}行[{previous[1]}, {previous[2]})重叠")
+            elif current[1] > previous[2]:
+                errors.append(f"第{current[0]}行：线路{route}的吨位区间在{previous[2]}到{current[1]}之间不连续")
+    return errors
@@ -0,0 +1,224 @@
+"""
+按需请求性能分析模块
+On-demand per-request profiling
+
+生产环境中某个接口变慢时，对单个请求做Python层面的性能分析：
+- 请求头 X-Profile-Token 与环境变量 PROFILE_TOKEN 一致时分析该请求（未配置 PROFILE_TOKEN 时不接受请求头触发），
+  X-Profile-Mode 选择分析方式：sample（默认，采样）或 cprofile（确定性）
+- PROFILE_SAMPLE_RATE（0~1，默认0）按比例随机分析请求，使用采样方式
+- 采样方式：后台线程每 PROFILE_SAMPLE_INTERVAL 秒记录一次请求线程的调用栈，输出 collapsed stacks（.collapsed），
+  可直接用 flamegraph.pl / speedscope 生成火焰图，开销与请求耗时无关
+- 确定性方式：cProfile 输出 .pstats，可用 snakeviz / gprof2dot 查看
+- gevent 模式下采样线程是协程，只在请求让出时运行，采样不准，统一使用 cProfile；
+  所有协程共用一个线程，结果中会包含请求让出期间其他协程的调用
+- 同一进程同时只做一个 cProfile 分析（Python 3.12+ 重复 enable 会报错，gevent 下多个分析会互相替换钩子），
+  已有分析进行时其他请求不做 cProfile 分析，照常处理
+
+分析结果保存在 PROFILE_DIR 下，每个结果另有一个 .json 元数据文件，超过 PROFILE_RETENTION 个时删除最旧的。
+响应头 X-Profile-Id 为结果ID，GET /api/system/profiles 列出最近的结果，GET /api/system/profiles/<ID> 下载。
+"""
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_RETENTION = int(os.getenv('PROFILE_RETENTION', 200))
+
+MODE_SAMPLE = 'sample'
+MODE_CPROFILE = 'cprofile'
+PROFILE_EXTENSIONS = {MODE_SAMPLE: '.collapsed', MODE_CPROFILE: '.pstats'}
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}-[0-9]{9}-[0-9a-f]{4}$')
+
+# 进程内正在进行的 cProfile 分析
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """定时采集一个线程的调用栈，按 collapsed stacks 格式计数"""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def _new_profile_id():
+    # 时间精确到毫秒，按文件名排序即按时间排序
+    now = datetime.now()
+    return f"{now.strftime('%Y%m%d-%H%M%S')}{now.microsecond // 1000:03d}-{random.getrandbits(16):04x}"
+
+
+def _enforce_retention(profile_dir):
+    metas = sorted(name for name in os.listdir(profile_dir) if name.endswith('.json'))
+    for name in metas[:max(0, len(metas) - PROFILE_RETENTION)]:
+        profile_id = name[:-len('.json')]
+        for extension in ['.json'] + list(PROFILE_EXTENSIONS.values()):
+            try:
+                os.remove(os.path.join(profile_dir, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """按请求头或采样率对请求做性能分析的WSGI中间件"""
+
+    def __init__(self, wsgi_app, profile_dir=PROFILE_DIR, async_mode=None):
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+        # gevent 下采样线程无法抢占请求协程
+        self.default_mode = MODE_CPROFILE if async_mode == 'gevent' else MODE_SAMPLE
+
+    def _requested_mode(self, environ):
+        token = environ.get('HTTP_X_PROFILE_TOKEN')
+        if token and PROFILE_TOKEN and hmac.compare_digest(token, PROFILE_TOKEN):
+            mode = environ.get('HTTP_X_PROFILE_MODE', '').lower()
+            return MODE_CPROFILE if mode == MODE_CPROFILE else self.default_mode
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return self.default_mode
+        return None
+
+    def __call__(self, environ, start_response):
+        mode = self._requested_mode(environ)
+        if mode is None:
+            return self.wsgi_app(environ, start_response)
+        if mode == MODE_CPROFILE and not _cprofile_lock.acquire(blocking=False):
+            print(f"[性能分析] 已有请求正在分析，{environ.get('PATH_INFO')} 不做分析")
+            return self.wsgi_app(environ, start_response)
+
+        profile_id = _new_profile_id()
+        status_holder = []
+
+        def profiled_start_response(status, headers, exc_info=None):
+            status_holder.append(status)
+            headers = list(headers) + [('X-Profile-Id', profile_id)]
+            return start_response(status, headers, exc_info)
+
+        if mode == MODE_CPROFILE:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Python 3.12+ 其他工具已占用性能分析钩子
+                _cprofile_lock.release()
+                print(f"[性能分析] 无法启用cProfile：{str(e)}")
+                return self.wsgi_app(environ, start_response)
+        else:
+            profiler = StackSampler(threading.get_ident())
+            profiler.start()
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, profiled_start_response)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if mode == MODE_CPROFILE:
+                profiler.disable()
+                _cprofile_lock.release()
+            else:
+                profiler.stop()
+            try:
+                self._save(profile_id, mode, profiler, environ, status_holder, duration_ms)
+            except OSError as e:
+                print(f"[性能分析] 保存分析结果失败：{str(e)}")
+
+    def _save(self, profile_id, mode, profiler, environ, status_holder, duration_ms):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, profile_id + PROFILE_EXTENSIONS[mode])
+        if mode == MODE_CPROFILE:
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path)
+        with open(os.path.join(self.profile_dir, profile_id + '.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'id': profile_id,
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'method': environ.get('REQUEST_METHOD'),
+                'path': environ.get('PATH_INFO'),
+                'status': status_holder[0] if status_holder else None,
+                'duration_ms': round(duration_ms, 1),
+                'mode': mode,
+                'file': os.path.basename(path),
+                'samples': sum(profiler.stacks.values()) if mode == MODE_SAMPLE else None
+            }, f, ensure_ascii=False)
+        _enforce_retention(self.profile_dir)
+        print(f"[性能分析] {environ.get('PATH_INFO')} 耗时{duration_ms:.0f}ms，结果 {path}")
+
+
+def recent_profiles(limit=50, profile_dir=PROFILE_DIR):
+    """最近的分析结果元数据，最新的在前"""
+    if not os.path.isdir(profile_dir):
+        return []
+    metas = sorted((name for name in os.listdir(profile_dir) if name.endswith('.json')), reverse=True)
+    profiles = []
+    for name in metas[:limit]:
+        try:
+            with open(os.path.join(profile_dir, name), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (FileNotFoundError, ValueError):
+            # 可能刚被保留策略删除或正在写入
+            continue
+    return profiles
+
+
+def profile_file(profile_id, profile_dir=PROFILE_DIR):
+    """
+    分析结果文件名
+    :return: 文件名，ID无效或结果不存在时返回None
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    for extension in PROFILE_EXTENSIONS.values():
+        if os.path.exists(os.path.join(profile_dir, profile_id + extension)):
+            return profile_id + extension
+    return None
+
+
+def setup_profiling(app, async_mode=None):
+    """
+    启用按需性能分析
+    :param app: Flask应用实例
+    :param async_mode: 部署模式（ASYNC_MODE），gevent 下只使用 cProfile
+    """
+    if not PROFILE_TOKEN and PROFILE_SAMPLE_RATE <= 0:
+        return
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, async_mode=async_mode)
@@ -0,0 +1,87 @@
+"""
+项目利润日汇总维护模块
+Daily profit summary maintenance
+
+写入订单或送货信息后，按受影响的 (项目ID, 下单日期) 从订单表重新聚合对应日期的汇总行。
+重新计算是幂等的，与写操作处于同一事务，回滚时汇总一起回滚。
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import select
+from api.models import db, Order, ProjectProfitDaily
+
+# 单条语句中包含的日期数量上限
+DAYS_BATCH_SIZE = 500
+
+
+def order_days(*criteria):
+    """
+    查询满足条件的订单涉及的 (项目ID, 下单日期)
+    :param criteria: 订单筛选条件
+    :return: {(项目ID, 下单日期)}
+    """
+    rows = db.session.query(Order.project_id, Order.order_date).filter(*criteria).distinct().all()
+    return {(row.project_id, row.order_date) for row in rows}
+
+
+def refresh_profit_days(keys):
+    """
+    重新计算指定项目日期的利润日汇总
+    :param keys: 可迭代的 (项目ID, 下单日期)
+    """
+    # 先把会话中未写出的订单修改刷到数据库，聚合查询才能看到
+    db.session.flush()
+    days_by_project = defaultdict(set)
+    for project_id, stat_date in keys:
+        days_by_project[project_id].add(stat_date)
+
+    table = ProjectProfitDaily.__table__
+    carrier = db.func.coalesce(Order.carrier_name, '')
+    for project_id, days in days_by_project.items():
+        days = sorted(days)
+        for start in range(0, len(days), DAYS_BATCH_SIZE):
+            batch = days[start:start + DAYS_BATCH_SIZE]
+            db.session.execute(table.delete().where(
+                table.c.project_id == project_id,
+                table.c.stat_date.in_(batch)
+            ))
+            db.session.execute(table.insert().from_select(
+                ['project_id', 'stat_date', 'destination_province', 'destination_city', 'carrier_name',
+                 'order_count', 'weight', 'income', 'expense'],
+                select(
+                    Order.project_id,
+                    Order.order_date,
+                    Order.destination_province,
+                    Order.destination_city,
+                    carrier,
+                    db.func.count(Order.id),
+                    db.func.coalesce(db.func.sum(Order.weight), 0),
+                    db.func.coalesce(db.func.sum(Order.amount), 0),
+                    db.func.coalesce(db.func.sum(Order.carrier_fee), 0)
+                ).where(
+                    Order.project_id == project_id,
+                    Order.order_date.in_(batch),
+                    Order.is_deleted == 0
+                ).group_by(
+                    Order.project_id, Order.order_date, Order.destination_province,
+                    Order.destination_city, carrier
+                )
+            ))
+
+
+def drop_project_profit(project_id):
+    """删除项目的全部利润日汇总（项目删除时使用）"""
+    ProjectProfitDaily.query.filter_by(project_id=project_id).delete(synchronize_session=False)
+
+
+def period_start(day, granularity):
+    """
+    返回日期所在统计周期的起始日期
+    :param granularity: day-按日，week-按周（周一开始），month-按月
+    """
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
@@ -0,0 +1,241 @@
+"""
+地区字典模块
+Region dictionary module
+
+把省市名称规范化为 region 表中市级地区的整数ID。
+地区字典整表加载到进程内存（全国省市约四百行），通过 table_change_counter 中 region 表的计数判断是否需要重新加载，
+导入订单时每行只做字典查找，线路索引使用 (出发市ID, 到达市ID) 整数元组。
+订单和价格配置上的 *_region_id 是冗余的查找键（没有外键），筛选、导出和利润统计仍按省市名称进行；
+新地区只在上传价格配置、load-regions 和 backfill-region-ids 时写入字典，订单导入和编辑不新增地区。
+"""
+import copy
+
+from api.models import db, Region
+from api.utils.change_counter import CHANGED_TABLES_KEY, table_versions
+
+# 按顺序尝试去掉的名称后缀，"江苏省"、"南京市"、"新疆维吾尔自治区" 分别规范为 "江苏"、"南京"、"新疆"
+REGION_SUFFIXES = (
+    '维吾尔自治区', '壮族自治区', '回族自治区', '特别行政区', '自治区', '自治州', '地区', '盟', '省', '市'
+)
+
+# (region表计数, RegionIndex)
+_cache = None
+
+
+def short_region_name(name):
+    """去掉行政区划后缀得到简称，去掉后为空或只剩一个字时保留原名"""
+    name = (name or '').strip()
+    for suffix in REGION_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 2:
+            return name[:-len(suffix)]
+    return name
+
+
+class RegionIndex:
+    """地区名称到ID的内存索引"""
+
+    def __init__(self, regions):
+        self.provinces = {}
+        self.cities = {}
+        self.children = {}
+        for region in regions:
+            if region.level == Region.LEVEL_PROVINCE:
+                self.provinces.setdefault(region.name, region.id)
+                self.provinces.setdefault(region.short_name, region.id)
+        for region in regions:
+            if region.level == Region.LEVEL_CITY:
+                self.cities.setdefault((region.parent_id, region.name), region.id)
+                self.cities.setdefault((region.parent_id, region.short_name), region.id)
+                self.children.setdefault(region.parent_id, []).append(region.id)
+
+    def province_id(self, province):
+        province = (province or '').strip()
+        return self.provinces.get(province) or self.provinces.get(short_region_name(province))
+
+    def city_id(self, province, city):
+        """
+        查找市级地区ID
+        直辖市在字典中只有一个下级地区（如"北京市-市辖区"）时，"北京-北京"也能匹配
+        :return: 地区ID，找不到时返回None
+        """
+        province_id = self.province_id(province)
+        if province_id is None:
+            return None
+        city = (city or '').strip()
+        city_id = self.cities.get((province_id, city)) or self.cities.get((province_id, short_region_name(city)))
+        if city_id is None and short_region_name(city) == short_region_name(province):
+            children = self.children.get(province_id, [])
+            if len(children) == 1:
+                city_id = children[0]
+        return city_id
+
+    def preview_copy(self):
+        """复制索引，在副本中为尚未写入字典的地区分配临时ID，不影响缓存"""
+        index = copy.copy(self)
+        index.provinces = dict(self.provinces)
+        index.cities = dict(self.cities)
+        index.children = {parent_id: list(ids) for parent_id, ids in self.children.items()}
+        index._placeholder_id = getattr(self, '_placeholder_id', 0)
+        return index
+
+    def _next_placeholder(self):
+        self._placeholder_id -= 1
+        return self._placeholder_id
+
+    def add_placeholder(self, province, city):
+        """
+        加入字典中不存在的省市并分配负数临时ID，匹配规则与 ensure_region_ids 新增后的地区一致
+        只用于 preview_copy 得到的副本，临时ID不写入数据库（见 stored_region_id）
+        :return: 市级地区临时ID
+        """
+        province_name, city_name = province.strip(), city.strip()
+        province_id = self.province_id(province_name)
+        if province_id is None:
+            province_id = self._next_placeholder()
+            self.provinces.setdefault(province_name, province_id)
+            self.provinces.setdefault(short_region_name(province_name), province_id)
+        city_id = self.cities.get((province_id, city_name))
+        if city_id is None:
+            city_id = self._next_placeholder()
+            self.cities.setdefault((province_id, city_name), city_id)
+            self.cities.setdefault((province_id, short_region_name(city_name)), city_id)
+            self.children.setdefault(province_id, []).append(city_id)
+        return city_id
+
+
+def stored_region_id(region_id):
+    """写入数据库的地区ID：临时ID（负数）改为空，由 backfill_region_ids 回填"""
+    return region_id if region_id and region_id > 0 else None
+
+
+def region_index():
+    """
+    获取地区内存索引，region 表有写入时重新加载
+    :return: RegionIndex
+    """
+    global _cache
+    if Region.__tablename__ in db.session.info.get(CHANGED_TABLES_KEY, ()):
+        # 本事务新增了尚未提交的地区，只在本次使用，不放入缓存
+        return RegionIndex(Region.query.all())
+    version = table_versions([Region])[Region.__tablename__]
+    if _cache is None or _cache[0] != version:
+        _cache = (version, RegionIndex(Region.query.all()))
+    return _cache[1]
+
+
+def ensure_region_ids(pairs):
+    """
+    返回省市名称对应的市级地区ID，字典中不存在的省市会被新增
+    只用于上传价格配置和回填地区ID，订单导入和编辑只查找不新增（见 RegionIndex.add_placeholder）
+    :param pairs: 可迭代的 (省, 市)
+    :return: {(省, 市): 地区ID}
+    """
+    index = region_index()
+    result = {}
+    missing = []
+    for province, city in set(pairs):
+        city_id = index.city_id(province, city)
+        if city_id is None:
+            missing.append((province, city))
+        else:
+            result[(province, city)] = city_id
+    if not missing:
+        return result
+
+    # 同一省市的不同写法（如前后空格）只新增一次
+    created_provinces = {}
+    created_cities = {}
+    for province, city in missing:
+        province_name, city_name = province.strip(), city.strip()
+        province_id = index.province_id(province_name) or created_provinces.get(province_name)
+        if province_id is None:
+            region = Region(parent_id=0, level=Region.LEVEL_PROVINCE,
+                            name=province_name, short_name=short_region_name(province_name))
+            db.session.add(region)
+            db.session.flush()
+            province_id = created_provinces[province_name] = region.id
+
+        city_key = (province_id, city_name)
+        if city_key not in created_cities:
+            region = Region(parent_id=province_id, level=Region.LEVEL_CITY,
+                            name=city_name, short_name=short_region_name(city_name))
+            db.session.add(region)
+            db.session.flush()
+            created_cities[city_key] = region.id
+        result[(province, city)] = created_cities[city_key]
+    return result
+
+
+def load_regions(divisions):
+    """
+    导入行政区划数据，已存在的同名地区只补充代码
+    :param divisions: [{"code": "32", "name": "江苏省", "children": [{"code": "3201", "name": "南京市"}, ...]}, ...]
+    :return: (新增省数量, 新增市数量)
+    """
+    existing = {}
+    for region in Region.query.all():
+        existing.setdefault((region.parent_id, region.name), region)
+        existing.setdefault((region.parent_id, region.short_name), region)
+    province_count = 0
+    city_count = 0
+    for province in divisions:
+        region = existing.get((0, province['name'])) or existing.get((0, short_region_name(province['name'])))
+        if region is None:
+            region = Region(parent_id=0, level=Region.LEVEL_PROVINCE, name=province['name'],
+                            short_name=short_region_name(province['name']))
+            db.session.add(region)
+            db.session.flush()
+            province_count += 1
+        region.code = province.get('code') or region.code
+
+        for city in province.get('children', []):
+            child = existing.get((region.id, city['name'])) or existing.get((region.id, short_region_name(city['name'])))
+            if child is None:
+                child = Region(parent_id=region.id, level=Region.LEVEL_CITY, name=city['name'],
+                               short_name=short_region_name(city['name']))
+                db.session.add(child)
+                city_count += 1
+            child.code = city.get('code') or child.code
+    return province_count, city_count
+
+
+def backfill_region_ids(model, batch_size=5000):
+    """
+    为尚未关联地区的行回填出发/到达市地区ID，按主键分批处理并逐批提交
+    字典中不存在的省市会被新增
+    :param model: Order 或 ProjectPriceConfig
+    :param batch_size: 每批处理的行数
+    :return: 回填的行数
+    """
+    table = model.__table__
+    update = table.update().where(table.c.id == db.bindparam('_id')).values(
+        departure_region_id=db.bindparam('_departure_region_id'),
+        destination_region_id=db.bindparam('_destination_region_id')
+    )
+    filled = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            model.id, model.departure_province, model.departure_city,
+            model.destination_province, model.destination_city
+        ).filter(
+            model.id > last_id,
+            db.or_(model.departure_region_id.is_(None), model.destination_region_id.is_(None))
+        ).order_by(model.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        region_ids = ensure_region_ids(
+            [(row.departure_province, row.departure_city) for row in rows] +
+            [(row.destination_province, row.destination_city) for row in rows]
+        )
+        # 不修改版本号：只补充冗余的地区ID，业务数据本身没有变化
+        db.session.execute(update, [{
+            '_id': row.id,
+            '_departure_region_id': region_ids[(row.departure_province, row.departure_city)],
+            '_destination_region_id': region_ids[(row.destination_province, row.destination_city)]
+        } for row in rows])
+        db.session.commit()
+        filled += len(rows)
+        last_id = rows[-1].id
+    return filled
@@ -0,0 +1,76 @@
+"""
+已有数据库的结构升级模块
+Schema upgrades for existing databases
+
+db.create_all() 只创建不存在的表，不会修改已有表上的约束；
+模型中唯一键发生变化时，已有数据库需要通过这里的函数（对应的 flask 命令）升级。
+"""
+from sqlalchemy import inspect, text
+from api.models import db, ProjectPriceConfig
+
+PRICE_CONFIG_KEY_NAME = 'idx_unique'
+# 同一线路按吨位下限区分不同的价格档位
+PRICE_CONFIG_KEY_COLUMNS = ['project_id', 'departure_province', 'departure_city',
+                            'destination_province', 'destination_city', 'tonnage_lower_limit']
+
+
+def price_config_key_columns():
+    """
+    读取数据库中 project_price_config 表 idx_unique 的列
+    :return: 列名列表，唯一键不存在时返回None
+    """
+    inspector = inspect(db.session.connection())
+    table_name = ProjectPriceConfig.__tablename__
+    # MySQL 的唯一键同时出现在索引中，PostgreSQL / SQLite 为表上的唯一约束
+    for key in inspector.get_unique_constraints(table_name) + inspector.get_indexes(table_name):
+        if key['name'] == PRICE_CONFIG_KEY_NAME:
+            return list(key['column_names'])
+    return None
+
+
+def _rebuild_sqlite_price_config_table():
+    """SQLite 不能修改表上的约束，按模型重建表并复制数据"""
+    table = ProjectPriceConfig.__table__
+    old_name = f'{table.name}_old'
+    conn = db.session.connection()
+    old_columns = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    columns = ', '.join(column.name for column in table.columns if column.name in old_columns)
+    conn.execute(text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+    table.create(bind=conn)
+    conn.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}'))
+    conn.execute(text(f'DROP TABLE {old_name}'))
+
+
+def upgrade_price_config_key():
+    """
+    把 project_price_config 的唯一键 idx_unique 从 (项目, 出发省市, 到达省市) 改为包含 tonnage_lower_limit，
+    与上传价格配置的UPSERT冲突目标一致；已是新唯一键时不做修改，可重复执行。
+    旧唯一键下每条线路最多一行，数据一定满足新唯一键
+    :return: 升级前的唯一键列，无需升级（已是新唯一键或表不存在）时返回None
+    """
+    if not inspect(db.session.connection()).has_table(ProjectPriceConfig.__tablename__):
+        # 表尚未创建，db.create_all() 会按模型建出新唯一键
+        return None
+    old_columns = price_config_key_columns()
+    if old_columns == PRICE_CONFIG_KEY_COLUMNS:
+        return None
+
+    dialect = db.session.get_bind().dialect.name
+    table_name = ProjectPriceConfig.__tablename__
+    columns = ', '.join(PRICE_CONFIG_KEY_COLUMNS)
+    if dialect == 'mysql':
+        drop = f'DROP INDEX {PRICE_CONFIG_KEY_NAME}, ' if old_columns is not None else ''
+        db.session.execute(text(
+            f'ALTER TABLE {table_name} {drop}ADD UNIQUE KEY {PRICE_CONFIG_KEY_NAME} ({columns})'
+        ))
+    elif dialect == 'postgresql':
+        drop = f'DROP CONSTRAINT {PRICE_CONFIG_KEY_NAME}, ' if old_columns is not None else ''
+        db.session.execute(text(
+            f'ALTER TABLE {table_name} {drop}ADD CONSTRAINT {PRICE_CONFIG_KEY_NAME} UNIQUE ({columns})'
+        ))
+    elif dialect == 'sqlite':
+        _rebuild_sqlite_price_config_table()
+    else:
+        raise RuntimeError(f'不支持的数据库类型: {dialect}')
+    db.session.commit()
+    return old_columns or []
@@ -0,0 +1,68 @@
+"""
+子订单序号分配模块
+Sub-order sequence allocator
+
+通过 order_seq_counter 计数表按订单号原子地分配子订单序号区间，
+只锁定本次涉及的计数行，不同订单号的并发导入互不阻塞。
+计数行首次创建时从订单表中该订单号已使用的最大序号开始，不依赖 backfill-order-seq 预先回填
+"""
+from sqlalchemy import select
+
+from api.models import db, Order, OrderSeqCounter
+from .upsert import build_insert_ignore_from_select, build_upsert
+
+# 单条UPSERT语句包含的最大行数
+BATCH_SIZE = 1000
+
+
+def allocate_sub_order_seqs(counts):
+    """
+    为每个订单号分配连续的子订单序号区间
+    Allocate a contiguous seq range per order number
+
+    :param counts: {订单号: 需要分配的子订单数量}
+    :return: {订单号: 区间起始序号}，区间为 [起始序号, 起始序号 + 数量 - 1]
+    """
+    if not counts:
+        return {}
+
+    table = OrderSeqCounter.__table__
+    items = list(counts.items())
+
+    for start in range(0, len(items), BATCH_SIZE):
+        order_numbers = [order_number for order_number, _ in items[start:start + BATCH_SIZE]]
+        # 已有订单但还没有计数行的订单号，按订单表中的最大序号（包含已删除的订单）创建计数行
+        db.session.execute(build_insert_ignore_from_select(
+            table, ['order_number', 'last_seq'],
+            select(Order.order_number, db.func.coalesce(db.func.max(Order.seq), 0)).where(
+                Order.order_number.in_(order_numbers),
+                Order.order_number.notin_(select(table.c.order_number).where(table.c.order_number.in_(order_numbers)))
+            ).group_by(Order.order_number),
+            ['order_number']
+        ))
+
+        # 计数行不存在时插入，存在时 last_seq = last_seq + n，计数行在事务结束前保持锁定
+        rows = [
+            {'order_number': order_number, 'last_seq': count}
+            for order_number, count in items[start:start + BATCH_SIZE]
+        ]
+        db.session.execute(build_upsert(
+            table, rows, ['order_number'],
+            lambda new: {'last_seq': table.c.last_seq + new.last_seq}
+        ))
+
+    # 读取分配后的最大序号，反推区间起始序号
+    last_seqs = {}
+    for start in range(0, len(items), BATCH_SIZE):
+        order_numbers = [order_number for order_number, _ in items[start:start + BATCH_SIZE]]
+        last_seqs.update(db.session.query(
+            OrderSeqCounter.order_number,
+            OrderSeqCounter.last_seq
+        ).filter(
+            OrderSeqCounter.order_number.in_(order_numbers)
+        ).all())
+
+    return {
+        order_number: last_seqs[order_number] - count + 1
+        for order_number, count in items
+    }
@@ -0,0 +1,209 @@
+"""
+慢查询日志模块
+Slow-query log with EXPLAIN capture and statement-shape aggregation
+
+执行时间超过 SLOW_QUERY_THRESHOLD_MS（默认500毫秒）的语句以JSON行写入 SLOW_QUERY_LOG_FILE（按大小轮转），
+每条记录包含语句、绑定参数、发起请求的Flask端点、耗时、语句形状指纹和 EXPLAIN 结果：
+- 只对 SELECT / WITH 语句执行 EXPLAIN（SQLite 为 EXPLAIN QUERY PLAN），在同一连接的新游标上执行，不影响原语句的结果
+- 流式读取（yield_per / stream_results）的语句结果尚未读完，连接上不能执行其他语句，不做 EXPLAIN
+- 指纹把字面量替换为 ?、IN 列表和多行 VALUES 折叠为一项，参数不同的同一查询聚合到一起
+
+日志文件由所有worker共享，最近的记录通过管理后台的“慢查询”页面和 GET /api/system/slow_queries 查看，
+按指纹聚合的 Top N 报告通过 `flask slow-query-report` 输出。设置 SLOW_QUERY_LOG=0 关闭。
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_LOG_ENABLED = os.getenv('SLOW_QUERY_LOG', '1') != '0'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 500))
+SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', 'logs/slow_query.log')
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+SLOW_QUERY_LOG_BACKUP_COUNT = int(os.getenv('SLOW_QUERY_LOG_BACKUP_COUNT', 5))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1') != '0'
+
+# 记录中语句和参数的最大长度，批量写入的参数可能很大
+MAX_STATEMENT_LENGTH = 4000
+MAX_PARAMETERS_LENGTH = 2000
+
+# conn.info 中记录语句开始时间的键
+START_TIMES_KEY = 'slow_query_start_times'
+
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_COMMENTS = re.compile(r'/\*.*?\*/', re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|:\w+|\?')
+_IN_LISTS = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_VALUES_ROWS = re.compile(r'(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+slow_query_logger = logging.getLogger('slow_query')
+
+
+def statement_shape(statement):
+    """去掉注释和字面量后的语句形状，参数不同的同一查询形状相同"""
+    shape = _COMMENTS.sub('', statement)
+    shape = _STRINGS.sub('?', shape)
+    shape = _NUMBERS.sub('?', shape)
+    shape = _PLACEHOLDERS.sub('?', shape)
+    shape = _WHITESPACE.sub(' ', shape).strip()
+    shape = _IN_LISTS.sub('IN (?)', shape)
+    return _VALUES_ROWS.sub(r'\1', shape)
+
+
+def statement_fingerprint(statement):
+    return hashlib.md5(statement_shape(statement).encode('utf-8')).hexdigest()[:16]
+
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit] + f'...（共{len(text)}字符）'
+
+
+def _explain(conn, statement, parameters):
+    """在同一连接的新游标上执行 EXPLAIN，返回结果行"""
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        columns = [column[0] for column in cursor.description or []]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(START_TIMES_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get(START_TIMES_KEY)
+    if not start_times:
+        return
+    duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    explain = None
+    streaming = context is not None and context.execution_options.get('stream_results')
+    if SLOW_QUERY_EXPLAIN and not executemany and not streaming and _EXPLAINABLE.match(statement):
+        try:
+            explain = _explain(conn, statement, parameters)
+        except Exception as e:
+            explain = f'EXPLAIN失败：{str(e)}'
+
+    slow_query_logger.warning(json.dumps({
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'duration_ms': round(duration_ms, 1),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'path': request.path if has_request_context() else None,
+        'fingerprint': statement_fingerprint(statement),
+        'statement': _truncate(statement, MAX_STATEMENT_LENGTH),
+        'parameters': _truncate(repr(parameters), MAX_PARAMETERS_LENGTH),
+        'executemany': executemany,
+        'explain': explain
+    }, ensure_ascii=False, default=str))
+
+
+def _handle_error(exception_context):
+    # 出错的语句不会触发 after_cursor_execute，丢弃其开始时间
+    conn = exception_context.connection
+    if conn is not None and conn.info.get(START_TIMES_KEY):
+        conn.info[START_TIMES_KEY].pop()
+
+
+def setup_slow_query_log(app):
+    """
+    启用慢查询日志
+    :param app: Flask应用实例
+    """
+    if not SLOW_QUERY_LOG_ENABLED or slow_query_logger.handlers:
+        return
+    log_dir = os.path.dirname(SLOW_QUERY_LOG_FILE)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    handler = RotatingFileHandler(
+        SLOW_QUERY_LOG_FILE, maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=SLOW_QUERY_LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.WARNING)
+    # 不再传给应用日志
+    slow_query_logger.propagate = False
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    app.logger.info(f'Slow query log enabled: threshold {SLOW_QUERY_THRESHOLD_MS:g}ms, file {SLOW_QUERY_LOG_FILE}')
+
+
+def _log_files():
+    """当前日志文件和轮转的旧文件，按从旧到新排列"""
+    backups = sorted(glob.glob(SLOW_QUERY_LOG_FILE + '.*'),
+                     key=lambda path: int(path.rsplit('.', 1)[1]) if path.rsplit('.', 1)[1].isdigit() else 0,
+                     reverse=True)
+    return [path for path in backups + [SLOW_QUERY_LOG_FILE] if os.path.exists(path)]
+
+
+def _iter_records(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def recent_slow_queries(limit=100):
+    """
+    最近的慢查询记录，最新的在前
+    :param limit: 返回的记录数
+    """
+    recent = deque(_iter_records(_log_files()), maxlen=limit)
+    return list(reversed(recent))
+
+
+def slow_query_report(top=20, since_hours=None):
+    """
+    按语句形状聚合慢查询
+    :param top: 返回总耗时最高的前N个形状
+    :param since_hours: 只统计最近若干小时的记录
+    :return: [{fingerprint, count, total_ms, avg_ms, max_ms, endpoints, statement, explain}]
+    """
+    since = (datetime.now() - timedelta(hours=since_hours)).strftime('%Y-%m-%d %H:%M:%S') if since_hours else None
+    shapes = {}
+    for record in _iter_records(_log_files()):
+        if since and record['time'] < since:
+            continue
+        shape = shapes.setdefault(record['fingerprint'], {
+            'fingerprint': record['fingerprint'], 'count': 0, 'total_ms': 0, 'max_ms': 0,
+            'endpoints': set(), 'statement': record['statement'], 'explain': None
+        })
+        shape['count'] += 1
+        shape['total_ms'] += record['duration_ms']
+        if record['duration_ms'] >= shape['max_ms']:
+            # 保留最慢一次的语句和执行计划作为样例
+            shape['max_ms'] = record['duration_ms']
+            shape['statement'] = record['statement']
+            shape['explain'] = record.get('explain')
+        shape['endpoints'].add(record.get('endpoint') or '(非请求)')
+
+    report = sorted(shapes.values(), key=lambda shape: shape['total_ms'], reverse=True)[:top]
+    for shape in report:
+        shape['total_ms'] = round(shape['total_ms'], 1)
+        shape['avg_ms'] = round(shape['total_ms'] / shape['count'], 1)
+        shape['endpoints'] = sorted(shape['endpoints'])
+    return report
@@ -0,0 +1,126 @@
+"""
+表格文件流式读取模块
+Streaming spreadsheet reader module
+
+以生成器方式逐行读取上传的 .xlsx / .csv 文件，按列映射把表头转换为接口字段，
+避免整个文件在浏览器转成JSON后再整体提交、整体解析
+"""
+import codecs
+import csv
+from datetime import date, datetime
+from itertools import islice
+
+from openpyxl import load_workbook
+
+# 订单导入默认列映射：表头 -> 字段，与前端订单导入模板一致
+DEFAULT_ORDER_COLUMNS = {
+    '订单号': 'order_number',
+    '下单日期': 'order_date',
+    '送货日期': 'delivery_date',
+    '产品名称': 'product_name',
+    '数量': 'quantity',
+    '重量(吨)': 'weight',
+    '出发省': 'departure_province',
+    '出发市': 'departure_city',
+    '送达省': 'destination_province',
+    '送达市': 'destination_city',
+    '送达详细地址': 'destination_address',
+    '备注': 'remark'
+}
+
+# 送货信息导入默认列映射，与前端送货信息导入模板一致
+DEFAULT_DELIVERY_COLUMNS = {
+    '子订单号': 'sub_order_numbers',
+    '承运人名称': 'carrier_name',
+    '承运人联系方式': 'carrier_phone',
+    '承运人车牌': 'carrier_plate',
+    '承运类型（1：司机直送/2：承运商）': 'carrier_type',
+    '运费': 'carrier_fee',
+    '分摊依据': 'allocation_basis'
+}
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.csv')
+
+
+def _normalize_cell(value):
+    """统一单元格取值：日期转为YYYY-MM-DD，整数值的浮点数转为整数，字符串去除首尾空白"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _iter_xlsx(stream):
+    """只读模式逐行读取第一个工作表"""
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(cell).strip() if cell is not None else None for cell in header]
+        for row_number, row in enumerate(rows, 2):
+            yield row_number, dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+def _iter_csv(stream):
+    """逐行读取CSV，兼容带BOM的UTF-8"""
+    reader = csv.reader(codecs.getreader('utf-8-sig')(stream))
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [cell.strip() for cell in header]
+    for row_number, row in enumerate(reader, 2):
+        yield row_number, dict(zip(header, row))
+
+
+def iter_sheet_rows(file_storage, column_mapping):
+    """
+    逐行读取上传文件并按列映射转换为字段字典
+    Yield (sheet row number, {field: value}) for each non-empty row
+
+    :param file_storage: 上传的文件（werkzeug FileStorage）
+    :param column_mapping: 列映射 {表头: 字段}，未映射的列被忽略
+    :return: 生成器，产出 (表格行号, 字段字典)，空单元格不会出现在字段字典中
+    """
+    filename = (file_storage.filename or '').lower()
+    if filename.endswith('.xlsx'):
+        # werkzeug 把上传文件保存在可随机读取的临时文件中，openpyxl 只读模式可直接使用
+        rows = _iter_xlsx(file_storage.stream)
+    elif filename.endswith('.csv'):
+        rows = _iter_csv(file_storage.stream)
+    else:
+        raise ValueError(f"不支持的文件类型，仅支持{'、'.join(SUPPORTED_EXTENSIONS)}")
+
+    for row_number, raw in rows:
+        item = {}
+        for header, value in raw.items():
+            field = column_mapping.get(header)
+            value = _normalize_cell(value)
+            if field and value is not None:
+                item[field] = value
+        if item:
+            yield row_number, item
+
+
+def iter_chunks(iterable, size):
+    """
+    把可迭代对象按固定大小切块
+    :param iterable: 可迭代对象
+    :param size: 每块大小
+    :return: 生成器，产出列表
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
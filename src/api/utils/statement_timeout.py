@@ -0,0 +1,225 @@
+"""
+查询超时与取消模块
+Statement timeouts and cancellation for long-running queries
+
+导出和报表接口用 statement_timeout 装饰后：
+- 请求内执行的语句共享一个截止时间（STATEMENT_TIMEOUT_<CLASS> 秒），每条语句按剩余时间设置数据库端超时：
+  MySQL 在 SELECT 中加 MAX_EXECUTION_TIME 提示（只对只读 SELECT 生效），PostgreSQL 设置 SET LOCAL statement_timeout，
+  SQLite 用 progress handler 在超时后中断
+- 后台线程轮询客户端连接（gunicorn.socket / werkzeug.socket），客户端断开时取消正在执行的查询：
+  MySQL 通过另一个连接执行 KILL QUERY，PostgreSQL 调用 cancel()，SQLite 调用 interrupt()
+- 取消只能中断正在执行的语句：客户端在两条语句之间断开、或结果已被驱动读完时，之后的每条语句执行前
+  （以及导出逐行写入时，见 check_query_scope）检查取消状态和截止时间，直接中止请求
+- 查询超时或被取消时回滚会话，返回 QUERY_TIMEOUT / CLIENT_CLOSED_REQUEST
+"""
+import os
+import re
+import select
+import socket
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from api.enum.error_code import ErrorCode
+from api.models import db
+from api.utils.response import error_response
+
+# 类别 -> 默认超时秒数
+DEFAULT_STATEMENT_TIMEOUTS = {
+    'export': 120,
+    'report': 60
+}
+STATEMENT_TIMEOUTS = {
+    name: float(os.getenv(f'STATEMENT_TIMEOUT_{name.upper()}', seconds))
+    for name, seconds in DEFAULT_STATEMENT_TIMEOUTS.items()
+}
+
+# 检查客户端连接是否断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+# SQLite 每执行多少条虚拟机指令检查一次截止时间
+SQLITE_PROGRESS_STEPS = 10000
+
+# MySQL：3024 超过 MAX_EXECUTION_TIME，1317 被 KILL QUERY 中断；PostgreSQL：57014 query_canceled
+MYSQL_INTERRUPTED_CODES = (3024, 1317)
+POSTGRES_QUERY_CANCELED = '57014'
+
+_SELECT_PREFIX = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+
+
+class QueryInterrupted(Exception):
+    """客户端已断开或已超过截止时间，不再执行后续语句"""
+
+    def __init__(self, cancelled):
+        super().__init__('客户端已断开' if cancelled else '查询超时')
+        self.cancelled = cancelled
+
+
+class QueryScope:
+    """一个请求内的查询截止时间、取消状态和用到的数据库连接"""
+
+    def __init__(self, engine, timeout):
+        self.engine = engine
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.cancelled = False
+        self.closed = False
+        # 最近执行语句的连接：(方言名, DBAPI连接)
+        self.active = None
+        self.sqlite_connections = []
+        self.lock = threading.Lock()
+
+    def remaining_ms(self):
+        return max(1, int((self.deadline - time.monotonic()) * 1000))
+
+    def expired(self):
+        return self.cancelled or time.monotonic() >= self.deadline
+
+    def check(self):
+        """已取消或已超时时抛出 QueryInterrupted"""
+        if self.cancelled:
+            raise QueryInterrupted(True)
+        if time.monotonic() >= self.deadline:
+            raise QueryInterrupted(False)
+
+    def cancel(self):
+        """客户端断开时取消正在执行的查询（在轮询线程中调用）"""
+        with self.lock:
+            if self.closed or self.active is None:
+                self.cancelled = True
+                return
+            self.cancelled = True
+            dialect, dbapi_connection = self.active
+            if dialect == 'mysql':
+                # KILL 只能在另一个连接上执行
+                with self.engine.connect() as conn:
+                    conn.exec_driver_sql(f'KILL QUERY {int(dbapi_connection.thread_id())}')
+            elif dialect == 'postgresql':
+                dbapi_connection.cancel()
+            elif dialect == 'sqlite':
+                dbapi_connection.interrupt()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for dbapi_connection in self.sqlite_connections:
+                try:
+                    dbapi_connection.set_progress_handler(None, 0)
+                except sqlite3.ProgrammingError:
+                    # 中断后连接池已关闭并丢弃该连接
+                    pass
+
+
+def current_scope():
+    return g.get('query_scope') if has_app_context() else None
+
+
+def check_query_scope():
+    """在不执行语句的长循环中（如逐行写入导出文件）检查当前请求是否已取消或超时"""
+    scope = current_scope()
+    if scope is not None and not scope.closed:
+        scope.check()
+
+
+@event.listens_for(Engine, 'before_cursor_execute', retval=True)
+def _apply_statement_timeout(conn, cursor, statement, parameters, context, executemany):
+    scope = current_scope()
+    if scope is None or scope.closed:
+        return statement, parameters
+    scope.check()
+
+    dialect = conn.dialect.name
+    dbapi_connection = cursor.connection
+    with scope.lock:
+        scope.active = (dialect, dbapi_connection)
+    if dialect == 'mysql':
+        match = _SELECT_PREFIX.match(statement)
+        if match:
+            statement = f'{match.group(0)} /*+ MAX_EXECUTION_TIME({scope.remaining_ms()}) */' + statement[match.end():]
+    elif dialect == 'postgresql':
+        cursor.execute(f'SET LOCAL statement_timeout = {scope.remaining_ms()}')
+    elif dialect == 'sqlite' and dbapi_connection not in scope.sqlite_connections:
+        dbapi_connection.set_progress_handler(lambda: 1 if scope.expired() else 0, SQLITE_PROGRESS_STEPS)
+        scope.sqlite_connections.append(dbapi_connection)
+    return statement, parameters
+
+
+def is_query_interrupted(error):
+    """判断异常是否为查询超时或被取消"""
+    if isinstance(error, QueryInterrupted):
+        return True
+    if not isinstance(error, DBAPIError) or error.orig is None:
+        return False
+    orig = error.orig
+    if getattr(orig, 'pgcode', None) == POSTGRES_QUERY_CANCELED:
+        return True
+    if orig.args and orig.args[0] in MYSQL_INTERRUPTED_CODES:
+        return True
+    return str(orig) == 'interrupted'
+
+
+def _client_socket():
+    raw = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    return raw if isinstance(raw, socket.socket) else None
+
+
+def _client_disconnected(sock):
+    """连接可读且读到EOF表示客户端已关闭连接；请求体已读完，正常情况下此时不会有数据可读"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+def _watch_disconnect(sock, scope, stopped):
+    while not stopped.wait(DISCONNECT_POLL_INTERVAL):
+        if _client_disconnected(sock):
+            print("[查询取消] 客户端已断开，取消正在执行的查询")
+            try:
+                scope.cancel()
+            except Exception as e:
+                print(f"[查询取消] 取消查询失败：{str(e)}")
+            return
+
+
+def statement_timeout(name):
+    """
+    导出/报表接口的查询超时与取消装饰器
+    :param name: 接口类别，见 STATEMENT_TIMEOUTS
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            timeout = STATEMENT_TIMEOUTS[name]
+            scope = QueryScope(db.engine, timeout)
+            g.query_scope = scope
+            sock = _client_socket()
+            stopped = threading.Event()
+            watcher = None
+            if sock is not None:
+                watcher = threading.Thread(target=_watch_disconnect, args=(sock, scope, stopped), daemon=True)
+                watcher.start()
+            try:
+                return f(*args, **kwargs)
+            except (DBAPIError, QueryInterrupted) as e:
+                if not is_query_interrupted(e):
+                    raise
+                db.session.rollback()
+                if scope.cancelled:
+                    return error_response(ErrorCode.CLIENT_CLOSED_REQUEST)
+                print(f"[查询超时] {request.path} 超过{timeout:g}秒")
+                return error_response(ErrorCode.QUERY_TIMEOUT, f'查询超过{timeout:g}秒未完成，请缩小查询范围后重试')
+            finally:
+                stopped.set()
+                if watcher is not None:
+                    watcher.join()
+                scope.close()
+                g.pop('query_scope', None)
+        return decorated_function
+    return decorator
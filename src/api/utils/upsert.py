@@ -0,0 +1,63 @@
+"""
+数据库原生UPSERT工具模块
+Native upsert helper module
+
+根据当前数据库类型生成 INSERT ... ON DUPLICATE KEY UPDATE（MySQL）
+或 INSERT ... ON CONFLICT DO UPDATE（SQLite / PostgreSQL）语句，
+以及跳过已存在行的 INSERT IGNORE ... SELECT / INSERT ... SELECT ... ON CONFLICT DO NOTHING
+"""
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from api.models import db
+
+
+def build_upsert(table, rows, conflict_columns, build_set):
+    """
+    生成批量UPSERT语句
+    Build a multi-row upsert statement for the current dialect
+
+    :param table: 表对象（Model.__table__）
+    :param rows: 要插入的行字典列表
+    :param conflict_columns: 唯一约束包含的列名列表（MySQL依赖表上的唯一索引，无需指定）
+    :param build_set: 回调函数，参数为"待插入行"的引用，返回冲突时要更新的 {列名: 表达式}
+    :return: 可执行的UPSERT语句
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(rows)
+        return stmt.on_duplicate_key_update(**build_set(stmt.inserted))
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_=build_set(stmt.excluded)
+        )
+
+    raise ValueError(f'不支持的数据库类型: {dialect}')
+
+
+def build_insert_ignore_from_select(table, column_names, select_stmt, conflict_columns):
+    """
+    生成 INSERT ... SELECT 语句，唯一键冲突的行跳过
+    Build an INSERT ... SELECT that skips rows conflicting on a unique key
+
+    :param table: 表对象（Model.__table__）
+    :param column_names: 插入的列名列表，与 select_stmt 的列一一对应
+    :param select_stmt: 提供插入数据的 select
+    :param conflict_columns: 唯一约束包含的列名列表（MySQL无需指定）
+    :return: 可执行的INSERT语句
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        return mysql.insert(table).from_select(column_names, select_stmt).prefix_with('IGNORE')
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        return insert(table).from_select(column_names, select_stmt).on_conflict_do_nothing(
+            index_elements=conflict_columns
+        )
+
+    raise ValueError(f'不支持的数据库类型: {dialect}')
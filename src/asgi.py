@@ -0,0 +1,22 @@
+"""
+ASGI配置文件 - 用于使用uvicorn等ASGI服务器部署应用
+ASGI Configuration File - Used for deploying the application with an ASGI server such as uvicorn
+
+Flask视图仍是同步函数，由 a2wsgi 放到线程池中执行：事件循环负责连接、慢客户端和流式响应（如Excel导出），
+视图中的数据库访问占用线程池中的一个线程，不阻塞事件循环。
+线程池大小由 ASGI_THREADS 控制，应与数据库连接池大小（DB_POOL_SIZE + DB_MAX_OVERFLOW）相匹配。
+
+使用方法（在 src 目录下）：
+    uvicorn asgi:application --host 0.0.0.0 --port 3001 --workers 2
+
+需要大量并发且以数据库IO为主的场景，优先使用 gevent 模式（gunicorn_gevent.conf.py）。
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app import app
+
+# 导入Flask应用实例并包装为ASGI应用
+# Wrap the Flask app as an ASGI application
+application = WSGIMiddleware(app, workers=int(os.getenv('ASGI_THREADS', 10)))
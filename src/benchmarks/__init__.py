@@ -0,0 +1,6 @@
+"""
+性能基准测试脚本包
+Benchmark scripts package
+
+在 src 目录下以模块方式运行，例如：python -m benchmarks.concurrent_edit
+"""
@@ -0,0 +1,140 @@
+"""
+部署模式负载基准测试：对比同步worker、gevent worker和ASGI（uvicorn）在并发请求下的吞吐、延迟和内存
+Deployment mode load benchmark: sync vs gevent vs ASGI workers
+
+依次以三种模式启动服务，用固定并发数反复请求同一个接口，报告吞吐、P50/P95延迟和服务进程树的常驻内存。
+默认请求 /api/order/list；需要登录的接口可通过 --username/--password 先登录再请求。
+
+使用方法（在 src 目录下，DATABASE_URL 指向测试库，需安装 gunicorn、gevent、uvicorn、a2wsgi）：
+    python -m benchmarks.async_load --concurrency 50 --requests 2000 --workers 2
+    python -m benchmarks.async_load --path /api/project/profit/list --body '{"project_name": "项目1"}' \\
+        --username admin --password 123456 --modes sync gevent
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_command(mode, port, workers):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', 'wsgi', '-w', str(workers), '-b', f'127.0.0.1:{port}']
+    if mode == 'gevent':
+        return [sys.executable, '-m', 'gunicorn', 'wsgi', '-c', 'gunicorn_gevent.conf.py',
+                '-w', str(workers), '-b', f'127.0.0.1:{port}']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--host', '127.0.0.1',
+            '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+
+
+def tree_rss(pid):
+    """进程及其全部子进程的常驻内存（字节），读取 /proc，仅支持Linux"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'{base_url}/api/docs', timeout=1)
+            return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.3)
+    return False
+
+
+def build_opener(base_url, username, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    if username:
+        request = urllib.request.Request(
+            f'{base_url}/api/auth/login',
+            data=json.dumps({'username': username, 'password': password}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        opener.open(request, timeout=10).read()
+    return opener
+
+
+def run_load(opener, url, body, concurrency, total):
+    payload = json.dumps(body).encode('utf-8')
+
+    def one(_):
+        request = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            opener.open(request, timeout=120).read()
+            ok = True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    failures = sum(1 for _, ok in results if not ok)
+    return elapsed, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='部署模式负载基准测试')
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gevent', 'asgi'], choices=['sync', 'gevent', 'asgi'])
+    parser.add_argument('--workers', type=int, default=2, help='每种模式的worker进程数')
+    parser.add_argument('--concurrency', type=int, default=50, help='并发请求数')
+    parser.add_argument('--requests', type=int, default=2000, help='每种模式的请求总数')
+    parser.add_argument('--path', default='/api/order/list')
+    parser.add_argument('--body', default='{"page": 1, "per_page": 50}', help='请求体JSON')
+    parser.add_argument('--username', default=None)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--port', type=int, default=18461)
+    args = parser.parse_args()
+
+    body = json.loads(args.body)
+    base_url = f'http://127.0.0.1:{args.port}'
+    for mode in args.modes:
+        server = subprocess.Popen(server_command(mode, args.port, args.workers), cwd=SRC_DIR,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(base_url):
+                print(f"{mode:<7} 服务启动失败")
+                continue
+            opener = build_opener(base_url, args.username, args.password)
+            # 预热：建立数据库连接、加载缓存
+            run_load(opener, f'{base_url}{args.path}', body, args.concurrency, args.concurrency)
+            elapsed, latencies, failures = run_load(
+                opener, f'{base_url}{args.path}', body, args.concurrency, args.requests
+            )
+            rss = tree_rss(server.pid)
+            print(f"{mode:<7} 吞吐{args.requests / elapsed:8.1f}请求/秒  "
+                  f"P50 {latencies[len(latencies) // 2] * 1000:7.1f}ms  "
+                  f"P95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f}ms  "
+                  f"失败{failures}  内存{rss / 1024 / 1024:.0f}MB")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+请求/响应压缩基准测试：对比不压缩、gzip和br下订单导入与导出的传输字节数和端到端延迟
+Compression benchmark: bytes on the wire and latency for a large import and export
+
+对运行中的服务发起请求（DATABASE_URL 指向测试库）：
+- 导入：合成指定行数的订单，按三种编码压缩请求体后以 dry_run 方式调用 /api/order/import（只校验不写入，可重复执行）
+- 导出：按三种 Accept-Encoding 调用 /api/order/export 导出项目订单
+本机回环网络几乎没有传输耗时，另外按 --bandwidth-mbps 估算在受限带宽链路上的延迟（实测延迟 + 传输字节 / 带宽）。
+
+使用方法（在 src 目录下，先启动服务，项目需配置好 --route 指定线路的价格）：
+    python -m benchmarks.compression --project-id 1 --project-name 项目1 --route 江苏,南京,浙江,杭州 --seed
+    python -m benchmarks.compression --project-id 1 --project-name 项目1 --rows 50000 --bandwidth-mbps 20
+--seed 先正式导入一次合成订单，使导出有数据可读。
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+import urllib.request
+from http.cookiejar import CookieJar
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+def compress(encoding, data):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(data, quality=4)
+    return data
+
+
+def decompress(encoding, data):
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    if encoding == 'br':
+        return brotli.decompress(data)
+    return data
+
+
+def synthetic_orders(rows, route, seed):
+    rnd = random.Random(seed)
+    departure_province, departure_city, destination_province, destination_city = route
+    return [{
+        'order_number': f'CMP{seed}{i:07d}', 'order_date': '2024-03-01', 'delivery_date': '2024-03-02',
+        'product_name': '钢材', 'quantity': rnd.randint(1, 20), 'weight': round(rnd.uniform(0.5, 30), 3),
+        'departure_province': departure_province, 'departure_city': departure_city,
+        'destination_province': destination_province, 'destination_city': destination_city,
+        'destination_address': f'{destination_city}市工业园区{rnd.randint(1, 200)}号', 'remark': ''
+    } for i in range(rows)]
+
+
+def post(opener, url, body, headers):
+    request = urllib.request.Request(url, data=body, headers=headers)
+    start = time.perf_counter()
+    with opener.open(request, timeout=600) as response:
+        raw = response.read()
+        encoding = response.headers.get('Content-Encoding') or 'identity'
+    return time.perf_counter() - start, raw, encoding
+
+
+def median_run(repeat, run):
+    results = [run() for _ in range(repeat)]
+    results.sort(key=lambda result: result[0])
+    return results[len(results) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='请求/响应压缩基准测试')
+    parser.add_argument('--base-url', default='http://127.0.0.1:3001')
+    parser.add_argument('--username', default=None)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--project-id', type=int, required=True)
+    parser.add_argument('--project-name', required=True)
+    parser.add_argument('--route', default='江苏,南京,浙江,杭州', help='出发省,出发市,到达省,到达市')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取中位数')
+    parser.add_argument('--bandwidth-mbps', type=float, default=20, help='估算受限链路延迟使用的带宽')
+    parser.add_argument('--seed', action='store_true', help='先正式导入一次合成订单')
+    args = parser.parse_args()
+
+    encodings = ENCODINGS if brotli is not None else ENCODINGS[:2]
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    if args.username:
+        post(opener, f'{args.base_url}/api/auth/login',
+             json.dumps({'username': args.username, 'password': args.password}).encode('utf-8'),
+             {'Content-Type': 'application/json'})
+
+    orders = synthetic_orders(args.rows, args.route.split(','), int(time.time()))
+    payload = {'project_id': args.project_id, 'project_name': args.project_name, 'orders': orders}
+    if args.seed:
+        elapsed, raw, _ = post(opener, f'{args.base_url}/api/order/import',
+                               json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json'})
+        print(f"正式导入{args.rows}行，耗时{elapsed:.2f}s：{json.loads(raw).get('error_message')}")
+
+    bytes_per_second = args.bandwidth_mbps * 1000 * 1000 / 8
+    raw_body = json.dumps(dict(payload, dry_run=True)).encode('utf-8')
+    print(f"导入 {args.rows}行（dry_run），原始请求体{len(raw_body) / 1024 / 1024:.2f}MB")
+    for encoding in encodings:
+        start = time.perf_counter()
+        body = compress(encoding, raw_body)
+        compress_time = time.perf_counter() - start
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': encoding}
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        elapsed, raw, _ = median_run(args.repeat, lambda: post(
+            opener, f'{args.base_url}/api/order/import', body, headers
+        ))
+        wire = len(body) + len(raw)
+        print(f"  {encoding:<8} 请求{len(body) / 1024:10.1f}KB  响应{len(raw) / 1024:8.1f}KB  "
+              f"客户端压缩{compress_time * 1000:7.1f}ms  延迟{elapsed * 1000:8.1f}ms  "
+              f"{args.bandwidth_mbps:g}Mbps估算{(compress_time + elapsed + wire / bytes_per_second) * 1000:8.1f}ms")
+
+    export_body = json.dumps({'project_name': args.project_name}).encode('utf-8')
+    print("导出 /api/order/export")
+    for encoding in encodings:
+        elapsed, raw, actual = median_run(args.repeat, lambda: post(
+            opener, f'{args.base_url}/api/order/export', export_body,
+            {'Content-Type': 'application/json', 'Accept-Encoding': encoding}
+        ))
+        start = time.perf_counter()
+        item_count = len(json.loads(decompress(actual, raw))['result'].get('items', []))
+        decode_time = time.perf_counter() - start
+        print(f"  {encoding:<8} 响应{len(raw) / 1024:10.1f}KB（{item_count}行）  "
+              f"延迟{elapsed * 1000:8.1f}ms  客户端解压解析{decode_time * 1000:7.1f}ms  "
+              f"{args.bandwidth_mbps:g}Mbps估算{(elapsed + decode_time + len(raw) / bytes_per_second) * 1000:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+运费分摊基准测试：对比逐条浮点计算与向量化整数分摊
+Carrier fee allocation benchmark: per-row float rounding vs vectorized cents
+
+使用方法（在 src 目录下）：
+    python -m benchmarks.fee_allocation --orders 100000 --batch-size 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from api.utils.allocation import allocate_cents
+
+
+def legacy_allocate(fees, group_index, weights):
+    """原 import_delivery 中的逐条分摊：round(重量 / 总重量 * 运费, 2)"""
+    totals = {}
+    for group, weight in zip(group_index, weights):
+        totals[group] = totals.get(group, 0) + weight
+    return [
+        round(weight / totals[group] * fees[group], 2)
+        for group, weight in zip(group_index, weights)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运费分摊基准测试')
+    parser.add_argument('--orders', type=int, default=100000, help='分摊的订单数量')
+    parser.add_argument('--batch-size', type=int, default=20, help='每个送货批次的平均订单数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    n_groups = max(1, args.orders // args.batch_size)
+    group_index = np.sort(rng.integers(0, n_groups, args.orders))
+    # 保证每个批次至少有一个订单
+    group_index[:n_groups] = np.arange(n_groups)
+    group_index.sort()
+    weights = np.round(rng.uniform(0.1, 30, args.orders), 3)
+    fee_cents = rng.integers(10000, 2000000, n_groups)
+    fees = (fee_cents / 100).tolist()
+
+    start = time.perf_counter()
+    legacy = legacy_allocate(fees, group_index.tolist(), weights.tolist())
+    legacy_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shares = allocate_cents(fee_cents, group_index, weights)
+    vector_elapsed = time.perf_counter() - start
+
+    legacy_sums = np.round(np.bincount(group_index, weights=legacy, minlength=n_groups) * 100).astype(np.int64)
+    vector_sums = np.bincount(group_index, weights=shares, minlength=n_groups).astype(np.int64)
+
+    print(f"订单数{args.orders}，批次数{n_groups}")
+    print(f"逐条浮点分摊  耗时{legacy_elapsed * 1000:.1f}ms  合计不等于运费的批次{int((legacy_sums != fee_cents).sum())}个")
+    print(f"向量化整数分摊 耗时{vector_elapsed * 1000:.1f}ms  合计不等于运费的批次{int((vector_sums != fee_cents).sum())}个")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+订单表分区基准测试：对比按下单日期筛选的列表查询在分区表与普通表上的耗时（仅MySQL）
+Order partitioning benchmark: filtered list latency on a partitioned vs plain table
+
+在测试库中创建两张结构相同的合成表 bench_order_plain / bench_order_part，
+写入相同的数据后执行与订单列表接口相同形式的查询（计数 + 分页）。
+
+使用方法（在 src 目录下，DATABASE_URL 指向MySQL测试库）：
+    python -m benchmarks.order_partition --rows 10000000 --years 4
+    python -m benchmarks.order_partition --skip-load   # 复用已生成的数据
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app import app
+from api.models import db
+from api.utils.partition import GRANULARITY_MONTH, partition_ranges
+
+TABLES = ('bench_order_plain', 'bench_order_part')
+
+COLUMNS = '''
+    id BIGINT NOT NULL,
+    project_name VARCHAR(255) NOT NULL,
+    order_number VARCHAR(50) NOT NULL,
+    sub_order_number VARCHAR(60) NOT NULL,
+    order_date DATE NOT NULL,
+    delivery_date DATE NOT NULL,
+    destination_province VARCHAR(20) NOT NULL,
+    destination_city VARCHAR(20) NOT NULL,
+    weight DECIMAL(10,3) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    is_deleted BIGINT NOT NULL DEFAULT 0
+'''
+
+PROVINCES = [('江苏', '南京'), ('浙江', '杭州'), ('广东', '深圳'), ('北京', '北京'), ('四川', '成都')]
+
+
+def create_tables(start, end):
+    for name in TABLES:
+        db.session.execute(text(f'DROP TABLE IF EXISTS {name}'))
+    db.session.execute(text(
+        f'CREATE TABLE bench_order_plain ({COLUMNS}, PRIMARY KEY (id), '
+        f'UNIQUE KEY uk_sub_order_number (sub_order_number), KEY idx_order_date (order_date))'
+    ))
+    partitions = ',\n'.join(
+        f"PARTITION {name} VALUES LESS THAN ('{upper.isoformat()}')"
+        for name, upper in partition_ranges(start, end, GRANULARITY_MONTH)
+    )
+    db.session.execute(text(
+        f'CREATE TABLE bench_order_part ({COLUMNS}, PRIMARY KEY (id, order_date), '
+        f'UNIQUE KEY uk_sub_order_number (sub_order_number, order_date), KEY idx_order_date (order_date)) '
+        f'PARTITION BY RANGE COLUMNS(order_date) ({partitions}, PARTITION pmax VALUES LESS THAN (MAXVALUE))'
+    ))
+    db.session.commit()
+
+
+def load_rows(rows, start, days, batch_size=10000):
+    rnd = random.Random(0)
+    insert_sql = (
+        'INSERT INTO {table} (id, project_name, order_number, sub_order_number, order_date, delivery_date, '
+        'destination_province, destination_city, weight, amount) VALUES '
+        '(:id, :project_name, :order_number, :sub_order_number, :order_date, :delivery_date, '
+        ':destination_province, :destination_city, :weight, :amount)'
+    )
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for i in range(offset, min(offset + batch_size, rows)):
+            order_date = start + timedelta(days=rnd.randrange(days))
+            province, city = rnd.choice(PROVINCES)
+            batch.append({
+                'id': i + 1, 'project_name': f'项目{i % 20}',
+                'order_number': f'JD{i // 2}', 'sub_order_number': f'JD{i // 2}-{i % 2 + 1}',
+                'order_date': order_date, 'delivery_date': order_date + timedelta(days=1),
+                'destination_province': province, 'destination_city': city,
+                'weight': round(rnd.uniform(0.1, 30), 3), 'amount': round(rnd.uniform(10, 5000), 2)
+            })
+        for name in TABLES:
+            db.session.execute(text(insert_sql.format(table=name)), batch)
+        db.session.commit()
+        print(f"\r已写入{min(offset + batch_size, rows)}/{rows}行", end='', flush=True)
+    print()
+
+
+def time_query(table, date_start, date_end, repeat):
+    """与订单列表接口相同形式的查询：按项目和下单日期筛选，计数并取第一页"""
+    where = ('WHERE is_deleted = 0 AND project_name = :project_name '
+             'AND order_date >= :date_start AND order_date <= :date_end')
+    params = {'project_name': '项目1', 'date_start': date_start, 'date_end': date_end}
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.session.execute(text(f'SELECT COUNT(*) FROM {table} {where}'), params).scalar()
+        db.session.execute(text(
+            f'SELECT * FROM {table} {where} ORDER BY order_number DESC LIMIT 10'
+        ), params).all()
+        elapsed.append(time.perf_counter() - start)
+    plan = db.session.execute(text(f'EXPLAIN SELECT COUNT(*) FROM {table} {where}'), params).mappings().first()
+    return sorted(elapsed)[len(elapsed) // 2], plan.get('partitions')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='订单表分区基准测试（MySQL）')
+    parser.add_argument('--rows', type=int, default=10000000, help='合成订单行数')
+    parser.add_argument('--years', type=int, default=4, help='数据覆盖的年数')
+    parser.add_argument('--repeat', type=int, default=5, help='每个查询的重复次数，取中位数')
+    parser.add_argument('--skip-load', action='store_true', help='跳过建表和写入，复用已有数据')
+    args = parser.parse_args()
+
+    start = date(date.today().year - args.years, 1, 1)
+    end = date(date.today().year, 12, 31)
+    with app.app_context():
+        if db.session.get_bind().dialect.name != 'mysql':
+            print('该基准测试仅支持MySQL')
+            return
+        if not args.skip_load:
+            create_tables(start, end)
+            load_rows(args.rows, start, (end - start).days)
+            for name in TABLES:
+                db.session.execute(text(f'ANALYZE TABLE {name}'))
+
+        windows = [('1个月', 30), ('3个月', 91), ('1年', 365)]
+        for label, days in windows:
+            date_end = end - timedelta(days=180)
+            date_start = date_end - timedelta(days=days)
+            for table in TABLES:
+                latency, partitions = time_query(table, date_start, date_end, args.repeat)
+                print(f"{label:<4} {table:<18} 中位耗时{latency * 1000:.1f}ms 访问分区：{partitions or '-'}")
+
+
+if __name__ == '__main__':
+    main()
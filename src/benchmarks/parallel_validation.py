@@ -0,0 +1,94 @@
+"""
+订单并行校验基准测试：对比单进程校验与不同进程数的进程池分块校验
+Parallel order validation benchmark: serial vs process pool by worker count
+
+不访问数据库：地区索引和价格表由合成数据构建。计时覆盖完整的校验阶段。
+服务进程中进程池常驻复用，并行的耗时取预热后的中位数，包含价格表随任务下发和结果回传的开销；
+首次调用（含进程池启动）单独列出。IMPORT_VALIDATION_WORKERS 默认不开启，加速比大于1时再在部署中开启。
+
+使用方法（在 src 目录下）：
+    python -m benchmarks.parallel_validation --orders 200000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import time
+
+from api.utils.order_validation import (
+    IMPORT_VALIDATION_CHUNK_SIZE, validate_order_rows, validate_order_rows_parallel
+)
+from api.utils.pricing import PriceTable
+from api.utils.region import RegionIndex
+from benchmarks.tier_pricing import synthetic_regions, tier_bounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='订单并行校验基准测试')
+    parser.add_argument('--orders', type=int, default=200000, help='导入的订单行数')
+    parser.add_argument('--routes', type=int, default=300, help='项目的线路数')
+    parser.add_argument('--tiers', type=int, default=4, help='每条线路的吨位档位数')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='并行进程数列表，默认 1 2 4 ... 直到CPU核数')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_VALIDATION_CHUNK_SIZE)
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取中位数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    workers_list = args.workers
+    if not workers_list:
+        workers_list = []
+        workers = 2
+        while workers < cpu_count:
+            workers_list.append(workers)
+            workers *= 2
+        workers_list.append(cpu_count)
+        workers_list = [w for w in dict.fromkeys(workers_list) if w > 1]
+
+    rnd = random.Random(args.seed)
+    regions = RegionIndex(synthetic_regions(34, 12))
+    cities = [(f'省{p}', f'市{p}_{c}') for p in range(34) for c in range(12)]
+    routes = set()
+    while len(routes) < args.routes:
+        routes.add((rnd.choice(cities), rnd.choice(cities)))
+    routes = list(routes)
+    price_table = PriceTable(
+        ((regions.city_id(*route[0]), regions.city_id(*route[1])), lower, upper, rnd.randint(50, 300))
+        for route in routes for lower, upper in tier_bounds(args.tiers, 40)
+    )
+    rows = []
+    for i in range(args.orders):
+        (dp, dc), (tp, tc) = rnd.choice(routes)
+        rows.append((i + 1, {
+            'order_number': f'JD{i}', 'order_date': '2024-03-01', 'delivery_date': '2024-03-02',
+            'product_name': '钢材', 'quantity': 1, 'weight': round(rnd.uniform(0.1, 40), 3),
+            'departure_province': dp, 'departure_city': dc,
+            'destination_province': tp, 'destination_city': tc
+        }))
+
+    def timed(validate):
+        elapsed = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            valid_rows, errors = validate()
+            elapsed.append(time.perf_counter() - start)
+            assert not errors and len(valid_rows) == len(rows), errors[:3]
+        return sorted(elapsed)[len(elapsed) // 2]
+
+    serial = timed(lambda: validate_order_rows(1, '基准项目', price_table, regions, rows))
+    print(f"订单数{args.orders}，CPU核数{cpu_count}，每块{args.chunk_size}行")
+    print(f"单进程   耗时{serial * 1000:8.1f}ms  吞吐{args.orders / serial:>10,.0f}行/秒")
+    for workers in workers_list:
+        validate = lambda: validate_order_rows_parallel(
+            1, '基准项目', price_table, regions, rows, workers=workers, chunk_size=args.chunk_size
+        )
+        start = time.perf_counter()
+        validate()
+        cold = time.perf_counter() - start
+        parallel = timed(validate)
+        print(f"{workers:>2}进程   耗时{parallel * 1000:8.1f}ms  吞吐{args.orders / parallel:>10,.0f}行/秒"
+              f"  加速比{serial / parallel:.2f}  首次{cold * 1000:8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
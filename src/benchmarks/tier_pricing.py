@@ -0,0 +1,110 @@
+"""
+吨位阶梯价格基准测试：对比按线路字典直接取单价与按吨位区间二分查找的订单构建吞吐
+Tiered pricing benchmark: build_orders throughput with flat vs tiered price tables
+
+不访问数据库：地区索引和价格表由合成数据构建，计时覆盖 build_orders 的完整校验与订单对象构建。
+
+使用方法（在 src 目录下）：
+    python -m benchmarks.tier_pricing --orders 100000 --routes 300 --tiers 8
+"""
+import argparse
+import importlib
+import random
+import time
+from types import SimpleNamespace
+
+from api.models import Region
+from api.utils.pricing import DEFAULT_TONNAGE_LOWER_LIMIT, DEFAULT_TONNAGE_UPPER_LIMIT, PriceTable
+from api.utils.region import RegionIndex
+
+
+def synthetic_regions(provinces, cities_per_province):
+    regions = []
+    region_id = 0
+    for p in range(provinces):
+        region_id += 1
+        province_id = region_id
+        regions.append(SimpleNamespace(id=province_id, parent_id=0, level=Region.LEVEL_PROVINCE,
+                                       name=f'省{p}', short_name=f'省{p}'))
+        for c in range(cities_per_province):
+            region_id += 1
+            regions.append(SimpleNamespace(id=region_id, parent_id=province_id, level=Region.LEVEL_CITY,
+                                           name=f'市{p}_{c}', short_name=f'市{p}_{c}'))
+    return regions
+
+
+def tier_bounds(tiers, max_weight):
+    """把 [0, max_weight) 等分为 tiers 段，最后一段延伸到默认上限"""
+    step = max(1, max_weight // tiers)
+    bounds = [DEFAULT_TONNAGE_LOWER_LIMIT + step * i for i in range(tiers)]
+    return list(zip(bounds, bounds[1:] + [DEFAULT_TONNAGE_UPPER_LIMIT]))
+
+
+def time_build(project, price_table, regions, rows, repeat):
+    # 蓝图对象与模块同名，通过 importlib 取得模块本身
+    order_routes = importlib.import_module('api.routes.order')
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        orders, errors = order_routes.build_orders(project, price_table, regions, enumerate(rows, 1))
+        elapsed.append(time.perf_counter() - start)
+        assert not errors, errors[:3]
+    return sorted(elapsed)[len(elapsed) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='吨位阶梯价格基准测试')
+    parser.add_argument('--orders', type=int, default=100000, help='每次构建的订单数')
+    parser.add_argument('--routes', type=int, default=300, help='项目的线路数')
+    parser.add_argument('--tiers', type=int, default=8, help='阶梯价格每条线路的档位数')
+    parser.add_argument('--max-weight', type=int, default=40, help='订单重量上限（吨）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取中位数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    index = RegionIndex(synthetic_regions(34, 12))
+    cities = [(f'省{p}', f'市{p}_{c}') for p in range(34) for c in range(12)]
+    routes = set()
+    while len(routes) < args.routes:
+        routes.add((rnd.choice(cities), rnd.choice(cities)))
+    routes = list(routes)
+
+    def route_key(route):
+        return index.city_id(*route[0]), index.city_id(*route[1])
+
+    flat = PriceTable(
+        (route_key(route), DEFAULT_TONNAGE_LOWER_LIMIT, DEFAULT_TONNAGE_UPPER_LIMIT, rnd.randint(50, 300))
+        for route in routes
+    )
+    tiered = PriceTable(
+        (route_key(route), lower, upper, rnd.randint(50, 300))
+        for route in routes for lower, upper in tier_bounds(args.tiers, args.max_weight)
+    )
+
+    rows = []
+    for i in range(args.orders):
+        (dp, dc), (tp, tc) = rnd.choice(routes)
+        rows.append({
+            'order_number': f'JD{i}', 'order_date': '2024-03-01', 'delivery_date': '2024-03-02',
+            'product_name': '钢材', 'quantity': 1, 'weight': round(rnd.uniform(0.1, args.max_weight), 3),
+            'departure_province': dp, 'departure_city': dc,
+            'destination_province': tp, 'destination_city': tc
+        })
+
+    # 在函数内创建应用，其他基准测试复用本模块的合成数据函数时不必连接数据库
+    from app import app
+
+    project = SimpleNamespace(id=1, project_name='基准项目')
+    with app.app_context():
+        flat_elapsed = time_build(project, flat, index, rows, args.repeat)
+        tiered_elapsed = time_build(project, tiered, index, rows, args.repeat)
+
+    print(f"订单数{args.orders}，线路数{args.routes}")
+    print(f"单一价格     耗时{flat_elapsed * 1000:.1f}ms  吞吐{args.orders / flat_elapsed:,.0f}行/秒")
+    print(f"{args.tiers}档阶梯价格 耗时{tiered_elapsed * 1000:.1f}ms  吞吐{args.orders / tiered_elapsed:,.0f}行/秒"
+          f"  相对单一价格{(tiered_elapsed / flat_elapsed - 1) * 100:+.1f}%")
+
+
+if __name__ == '__main__':
+    main()
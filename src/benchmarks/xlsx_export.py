@@ -0,0 +1,82 @@
+"""
+Excel导出内存基准测试：对比JSON整体序列化、普通工作簿与只写模式工作簿的峰值内存
+XLSX export memory benchmark: JSON payload vs regular workbook vs write-only workbook
+
+使用方法（在 src 目录下）：
+    python -m benchmarks.xlsx_export --rows 500000
+    python -m benchmarks.xlsx_export --rows 500000 --modes json write_only
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from openpyxl import Workbook
+
+from api.routes.order import ORDER_EXPORT_COLUMNS
+
+HEADERS = [header for header, _ in ORDER_EXPORT_COLUMNS]
+
+
+def synthetic_rows(count):
+    """生成与订单导出列一致的合成数据"""
+    start = date(2023, 1, 1)
+    for i in range(count):
+        order_date = start + timedelta(days=i % 365)
+        yield [
+            f'JD{20230000000 + i // 3}', f'JD{20230000000 + i // 3}-{i % 3 + 1}',
+            order_date.isoformat(), (order_date + timedelta(days=1)).isoformat(),
+            '变压器配件', 20, 1.234, '江苏省', '南京市', '浙江省', '杭州市',
+            '西湖区文三路xx号', '', 123.45
+        ]
+
+
+def run_json(count):
+    """原方案：整体构建结果列表并序列化为JSON"""
+    items = [dict(zip(HEADERS, row)) for row in synthetic_rows(count)]
+    return len(json.dumps({'items': items}, ensure_ascii=False).encode('utf-8'))
+
+
+def run_workbook(count, write_only):
+    workbook = Workbook(write_only=write_only)
+    sheet = workbook.create_sheet('订单列表') if write_only else workbook.active
+    sheet.append(HEADERS)
+    for row in synthetic_rows(count):
+        sheet.append(row)
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+MODES = {
+    'json': run_json,
+    'regular': lambda count: run_workbook(count, write_only=False),
+    'write_only': lambda count: run_workbook(count, write_only=True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Excel导出内存基准测试')
+    parser.add_argument('--rows', type=int, default=500000, help='导出行数')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = MODES[mode](args.rows)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{mode:<11} {args.rows}行 耗时{elapsed:.1f}s 峰值内存{peak / 1024 / 1024:.1f}MB 输出{size / 1024 / 1024:.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+gunicorn gevent 异步worker配置
+gunicorn config for gevent async workers
+
+gevent worker 会在加载应用前对标准库做 monkey patch，每个请求运行在一个协程中，
+等待数据库或网络IO时让出执行权，一个进程即可同时处理大量慢请求（导出、利润查询）。
+数据库驱动在 ASYNC_MODE=gevent 时自动切换为纯Python的PyMySQL（见 app.py）。
+
+使用方法：
+    gunicorn wsgi --chdir ./src/ -c ./src/gunicorn_gevent.conf.py
+
+可通过环境变量调整：
+    WEB_CONCURRENCY          worker进程数，默认2
+    GEVENT_CONNECTIONS       每个worker的最大并发连接数，默认200
+    DB_POOL_SIZE / DB_MAX_OVERFLOW  每个worker的数据库连接池，同时访问数据库的请求数上限
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3001')}"
+worker_class = 'gevent'
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_connections = int(os.getenv('GEVENT_CONNECTIONS', 200))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+# 应用在worker进程中加载，此时已完成monkey patch
+raw_env = ['ASYNC_MODE=gevent']